@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""背景画像の事前加工（アセットパック）
+
+1.png～10.pngを回転・解像度（標準の1080x1920とlayout_cache.jsonに記録された画面サイズ）ごとに加工済みの生RGBデータとして書き出しておき、
+実行時はデコードやリサイズなしでメモリマップして読み込む。
+加工済みデータは元画像の内容のハッシュで管理し、画像が変わった時だけ作り直す。
+
+使い方:
+    python3 asset_pack.py            # 足りないフレームを作成
+    python3 asset_pack.py --force    # すべて作り直す
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sys
+from PIL import Image
+
+from background import IMAGE_COUNT, SCREEN_SIZE, load_frame
+from layout import known_screen_sizes
+
+logger = logging.getLogger(__name__)
+
+PACK_DIR = 'asset_pack'
+MANIFEST_NAME = 'manifest.json'
+ROTATIONS = (0, 1)
+
+
+def source_hash(path):
+    """元画像の内容のハッシュ"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def frame_name(digest, rotation, size):
+    return f"{digest}_r{rotation}_{size[0]}x{size[1]}.rgb"
+
+
+def source_images(directory='.'):
+    """パックの対象になる背景画像"""
+    paths = [os.path.join(directory, f"{i}.png") for i in range(1, IMAGE_COUNT + 1)]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def read_manifest(pack_dir=PACK_DIR):
+    try:
+        with open(os.path.join(pack_dir, MANIFEST_NAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(manifest, pack_dir=PACK_DIR):
+    """マニフェストを一時ファイル経由で置き換え（書き込み途中で壊れないように）"""
+    path = os.path.join(pack_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def target_sizes(screen_size=None):
+    """作成対象の解像度（標準の画面サイズ、これまでに使われた画面サイズ、実際の画面サイズ）"""
+    sizes = {tuple(SCREEN_SIZE)} | set(known_screen_sizes())
+    if screen_size:
+        sizes.add(tuple(screen_size))
+    return sorted(sizes)
+
+
+def build_pack(directory='.', pack_dir=PACK_DIR, rotations=ROTATIONS, sizes=(SCREEN_SIZE,), force=False):
+    """足りない加工済みフレームを作成し、使われなくなったものを削除（作成した数を返す）"""
+    os.makedirs(pack_dir, exist_ok=True)
+    manifest = {}
+    wanted = set()
+    built = 0
+
+    for path in source_images(directory):
+        stat = os.stat(path)
+        digest = source_hash(path)
+        manifest[os.path.basename(path)] = {
+            'hash': digest,
+            'mtime': stat.st_mtime,
+            'bytes': stat.st_size,
+        }
+        for rotation in rotations:
+            for size in sizes:
+                name = frame_name(digest, rotation, tuple(size))
+                wanted.add(name)
+                frame_path = os.path.join(pack_dir, name)
+                if os.path.exists(frame_path) and not force:
+                    continue
+                frame = load_frame(path, rotation, tuple(size))
+                with open(frame_path + '.tmp', 'wb') as f:
+                    f.write(frame.tobytes())
+                os.replace(frame_path + '.tmp', frame_path)
+                built += 1
+                logger.info(f"加工済みフレームを作成: {name}")
+
+    # 元画像が変わって使われなくなったフレームを削除
+    for name in os.listdir(pack_dir):
+        if name.endswith('.rgb') and name not in wanted:
+            os.remove(os.path.join(pack_dir, name))
+            logger.info(f"古いフレームを削除: {name}")
+
+    write_manifest(manifest, pack_dir)
+    return built
+
+
+def packed_frame_path(path, rotation, size, pack_dir=PACK_DIR, manifest=None):
+    """元画像に対応する加工済みフレームのパス（元画像が変わっている・未作成の場合はNone）"""
+    if manifest is None:
+        manifest = read_manifest(pack_dir)
+    entry = manifest.get(os.path.basename(path))
+    if entry is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    # 元画像のサイズと更新時刻がマニフェストと一致する場合のみ使う（内容のハッシュは作成時に計算済み）
+    if stat.st_size != entry['bytes'] or stat.st_mtime != entry['mtime']:
+        return None
+    frame_path = os.path.join(pack_dir, frame_name(entry['hash'], rotation, tuple(size)))
+    if not os.path.exists(frame_path):
+        return None
+    return frame_path
+
+
+def load_packed_frame(frame_path, size):
+    """加工済みフレームをメモリマップで読み込み（デコード・リサイズなし）"""
+    with open(frame_path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return Image.frombuffer('RGB', tuple(size), mapped, 'raw', 'RGB', 0, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='背景画像のアセットパックを作成')
+    parser.add_argument('--force', action='store_true', help='すべてのフレームを作り直す')
+    parser.add_argument('--dir', default='.', help='背景画像のディレクトリ')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    built = build_pack(args.dir, os.path.join(args.dir, PACK_DIR), sizes=target_sizes(), force=args.force)
+    print(f"アセットパック作成完了: {built}フレームを作成")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""背景画像の読み込みと、加工済み画像のキャッシュ"""
+
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+# 画面サイズ（縦画面）
+SCREEN_SIZE = (1080, 1920)
+# 背景画像の枚数（1.png～10.png）
+IMAGE_COUNT = 10
+# 加工済み画像のキャッシュに保持する枚数。ローテーションでは毎回別の画像に切り替わり、
+# 一巡（IMAGE_COUNT枚、約60MB）を保持しても1時間に1回しか当たらないため、表示中と次の画像だけを保持する
+CACHE_FRAMES = 2
+# 加工済み画像のキャッシュに使うメモリの上限（バイト）。1080x1920のRGBで約6MB/枚
+CACHE_BUDGET_BYTES = CACHE_FRAMES * SCREEN_SIZE[0] * SCREEN_SIZE[1] * 3
+
+
+def frame_bytes(image):
+    """加工済み画像のおおよそのメモリ使用量"""
+    return image.width * image.height * len(image.getbands())
+
+
+class FrameCache:
+    """メモリ上限付きのLRUキャッシュ（上限を超えたら古いものから破棄）"""
+
+    def __init__(self, budget_bytes=CACHE_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self.lock = threading.Lock()
+        self.frames = OrderedDict()  # キー -> (画像, バイト数)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.frames.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.frames.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, image):
+        size = frame_bytes(image)
+        with self.lock:
+            if key in self.frames:
+                self.total_bytes -= self.frames.pop(key)[1]
+            if size > self.budget_bytes:
+                return  # 上限より大きい画像はキャッシュしない
+            self.frames[key] = (image, size)
+            self.total_bytes += size
+            while self.total_bytes > self.budget_bytes:
+                _, (_, evicted_size) = self.frames.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'frames': len(self.frames),
+                'bytes': self.total_bytes,
+                'budget_bytes': self.budget_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def load_frame(path, rotation, size=SCREEN_SIZE):
+    """背景画像を読み込み、回転・リサイズして表示用に加工"""
+    with Image.open(path) as source:
+        image = source.convert('RGB')
+    # rotate.txtが1の時のみ180度回転（通常時は元画像が縦画面対応）
+    if rotation == 1:
+        image = image.rotate(180, expand=True)
+    return image.resize(size, Image.Resampling.LANCZOS)
+
+
+class BackgroundLibrary:
+    """時刻に対応する背景画像を加工済みで返す"""
+
+    def __init__(self, rotation=0, size=SCREEN_SIZE, directory='.', cache=None, use_pack=True):
+        self.rotation = rotation
+        self.size = size
+        self.directory = directory
+        self.cache = cache if cache is not None else FrameCache()
+        self.use_pack = use_pack
+        self.packed_loads = 0
+        self.decoded_loads = 0
+        self.reload_pack()
+
+    def reload_pack(self):
+        """アセットパックのマニフェストを読み直す"""
+        from asset_pack import PACK_DIR, read_manifest
+
+        self.pack_dir = os.path.join(self.directory, PACK_DIR)
+        self.manifest = read_manifest(self.pack_dir) if self.use_pack else {}
+
+    def load(self, path):
+        """加工済みフレームがあればそれを、なければ元画像を加工して返す"""
+        from asset_pack import load_packed_frame, packed_frame_path
+
+        if self.use_pack and not self.manifest:
+            # 起動後にパックが作成された場合に備えて読み直す
+            self.reload_pack()
+        if self.manifest:
+            frame_path = packed_frame_path(path, self.rotation, self.size, self.pack_dir, self.manifest)
+            if frame_path:
+                self.packed_loads += 1
+                return load_packed_frame(frame_path, self.size)
+        self.decoded_loads += 1
+        return load_frame(path, self.rotation, self.size)
+
+    def image_path(self, hour):
+        """時刻に対応する画像ファイル（1-10の画像をローテーション）"""
+        image_number = (hour % IMAGE_COUNT) + 1
+        return os.path.join(self.directory, f"{image_number}.png")
+
+    def frame(self, path):
+        """加工済みの画像を返す（キャッシュがなければ読み込み）"""
+        key = (path, self.rotation, self.size)
+        image = self.cache.get(key)
+        if image is None:
+            image = self.load(path)
+            self.cache.put(key, image)
+        return image
+
+    def frame_for_name(self, image_name):
+        """画像ファイル名に対応する加工済みの画像（ファイルがない場合はNone）"""
+        path = os.path.join(self.directory, image_name)
+        if not os.path.exists(path):
+            return None
+        return self.frame(path)
+
+    def frame_for_hour(self, hour):
+        """時刻に対応する加工済みの画像（ファイルがない場合はNone）"""
+        path = self.image_path(hour)
+        if not os.path.exists(path):
+            return None
+        return self.frame(path)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""取得元（grpc / rest）の起動時間とメモリ使用量を比較するベンチマーク
+
+各取得元を新しいインタプリタで起動し、import・初期化・初回取得にかかる時間と
+最大常駐メモリ（ru_maxrss）を計測する。
+
+使い方:
+    python3 bench_data_sources.py            # 各取得元を5回ずつ計測
+    python3 bench_data_sources.py -n 10 --no-fetch
+    python3 bench_data_sources.py --sources local   # Firestoreに接続せずに計測（基準値）
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# 子プロセスで実行する計測コード
+CHILD_CODE = """
+import json, resource, sys, time
+start = time.perf_counter()
+from data_sources import create_data_source
+name, key_path, fetch = sys.argv[1], sys.argv[2], sys.argv[3] == '1'
+source = create_data_source(name, key_path)
+if source is None:
+    raise SystemExit(f"キーファイルが見つかりません: {key_path}")
+init_done = time.perf_counter()
+if fetch:
+    source.get_population()
+    source.get_reservations(time.strftime('%Y-%m-%d'))
+fetch_done = time.perf_counter()
+print(json.dumps({
+    'init_seconds': init_done - start,
+    'first_fetch_seconds': fetch_done - init_done,
+    'total_seconds': fetch_done - start,
+    'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+def run_once(name, key_path, fetch):
+    """新しいインタプリタで1回計測"""
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD_CODE, name, key_path, '1' if fetch else '0'],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Firestore取得元のベンチマーク')
+    parser.add_argument('-n', '--runs', type=int, default=5, help='取得元ごとの計測回数')
+    parser.add_argument('--key', default='Firebase-key.json', help='サービスアカウントキー')
+    parser.add_argument('--no-fetch', action='store_true', help='初回取得を行わずimportと初期化のみ計測')
+    parser.add_argument('--sources', default='grpc,rest', help='計測する取得元（カンマ区切り）')
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.sources.split(','):
+        samples = [run_once(name, args.key, not args.no_fetch) for _ in range(args.runs)]
+        report[name] = {
+            key: statistics.median(sample[key] for sample in samples)
+            for key in samples[0]
+        }
+        print(
+            f"{name}: 起動 {report[name]['init_seconds']:.3f}s, "
+            f"初回取得 {report[name]['first_fetch_seconds']:.3f}s, "
+            f"最大RSS {report[name]['maxrss_kb'] / 1024:.1f}MB (中央値, {args.runs}回)",
+            file=sys.stderr,
+        )
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""SignageDisplay・SetupWindowの描画と長時間動作のベンチマーク（Xvfb上で実行）
+
+計測項目:
+- startup: 起動から初回描画まで（インタプリタの起動とimportを含む）、ウィジェット数、RSS
+- render: update_displayの描画1回と、load_backgroundの背景1枚（キャッシュなし/あり）の所要時間
+- soak: 仮想の時計で数日分を早送りした間のCPU時間（記録1時間あたり）、RSS、ウィジェット数の推移
+
+使い方:
+    python3 bench_display.py                                # すべて計測してJSONを標準出力
+    python3 bench_display.py --only startup,render -n 5 --output bench.json
+    python3 bench_display.py --only soak --soak-days 3 --soak-speed 1440
+    python3 bench_display.py --compare old.json new.json     # 悪化した項目があれば終了コード1
+
+各計測は新しいインタプリタで実行する。表示先は専用に起動したXvfb（--use-displayで
+現在のDISPLAY）、取得元はlocal_firestore（ネットワークなし）。soakは時間を圧縮するため、
+時刻に比例しない処理（Tkの待機など）のCPU時間は実際より小さく出る。
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+SCENARIOS = ('startup', 'render', 'soak')
+SCREEN = '1080x1920x24'
+# Xvfbの起動を待つ時間（秒）
+XVFB_TIMEOUT = 10
+# 生成する予約数（1日あたり）
+RESERVATIONS_PER_DAY = 300
+# soak中に待ち人数・予約を変える間隔（記録の時間、秒）
+SOAK_TRAFFIC_SECONDS = 300
+# soak中に計測する間隔（記録の時間、秒）
+SOAK_SAMPLE_SECONDS = 3600
+# 比較時に悪化とみなす割合
+DEFAULT_THRESHOLD = 0.1
+
+
+# --- 子プロセスで実行する計測 ---
+
+def count_widgets(widget):
+    """widget以下のウィジェット数"""
+    return 1 + sum(count_widgets(child) for child in widget.winfo_children())
+
+
+def current_rss_kb():
+    """現在の常駐メモリ（/proc/self/statmがない場合は最大値）"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def cpu_seconds():
+    times = os.times()
+    return times.user + times.system
+
+
+def make_display(clock=None, data_mode='poll', days=2, today=None):
+    """生成した予約を持つローカルの取得元でサイネージを作成"""
+    from data_sources import LocalSource
+    from local_firestore import LocalFirestore
+    from signage_clock import SystemClock
+    from traffic_replay import ReplayDisplay
+
+    clock = clock or SystemClock()
+    db = LocalFirestore(seed=1)
+    db.seed_synthetic(RESERVATIONS_PER_DAY * days, today=today or clock.now(), days=days)
+    return ReplayDisplay(LocalSource(db=db), clock, data_mode=data_mode), db
+
+
+def child_startup_signage(options):
+    display, _ = make_display(data_mode=options['mode'])
+    display.root.update()
+    first_frame = time.monotonic()
+    return {
+        'first_frame_seconds': first_frame - options['launched'],
+        'widgets': count_widgets(display.root),
+        'rss_kb': current_rss_kb(),
+    }
+
+
+def child_startup_setup(options):
+    from setup_window import SetupWindow
+
+    window = SetupWindow()
+    window.root.update()
+    first_frame = time.monotonic()
+    return {
+        'first_frame_seconds': first_frame - options['launched'],
+        'widgets': count_widgets(window.root),
+        'rss_kb': current_rss_kb(),
+    }
+
+
+def child_render(options):
+    from background import IMAGE_COUNT
+    from signage_display import MAX_SLOTS
+    from traffic_replay import percentiles
+
+    display, _ = make_display(data_mode=options['mode'])
+    root = display.root
+    root.update()
+
+    def timed(action):
+        start = time.perf_counter()
+        action()
+        root.update_idletasks()
+        return (time.perf_counter() - start) * 1000
+
+    updates = []
+    for i in range(options['samples']):
+        snapshot = {
+            'now_population': i % 50,
+            'reservations': [(f"{10 + (i + k) % 10:02d}:00", (i + k) % 7 + 1) for k in range(MAX_SLOTS)],
+            'last_success_at': time.time(),
+        }
+        updates.append(timed(lambda: display.render_display(snapshot)))
+
+    names = [f"{i + 1}.png" for i in range(IMAGE_COUNT)]
+
+    def load(name):
+        display.apply_background(display.prepare_background(name))
+
+    cold = []
+    for name in names:
+        display.backgrounds.cache.clear()
+        cold.append(timed(lambda: load(name)))
+    warm = [timed(lambda: load(name)) for name in names]
+
+    return {
+        'update_display_ms': percentiles(updates),
+        'load_background_cold_ms': percentiles(cold),
+        'load_background_warm_ms': percentiles(warm),
+        'background_sources': {'pack': display.backgrounds.packed_loads, 'decode': display.backgrounds.decoded_loads},
+    }
+
+
+def child_soak(options):
+    import random
+    import threading
+    from signage_clock import VirtualClock
+
+    speed = options['speed']
+    start = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    clock = VirtualClock(start, speed)
+    days = options['days']
+    display, db = make_display(clock, options['mode'], days=int(days) + 1, today=start)
+    root = display.root
+    end = clock.start.timestamp() + days * 86400
+    rng = random.Random(1)
+    samples = []
+
+    def traffic():
+        # 待ち人数の変化と予約の追加・処理済みへの変更を一定間隔で書き込む
+        while True:
+            time.sleep(clock.real_seconds(SOAK_TRAFFIC_SECONDS))
+            now = clock.now()
+            db.collection('now_population').document('signage').set({'now': rng.randint(0, 20)})
+            today = now.strftime("%Y-%m-%d")
+            time_slot = f"{rng.randint(min(now.hour, 21), 21):02d}:{rng.choice(['00', '30'])}"
+            reservations = db.collection('reservations')
+            reservations.add({'date': today, 'Time': time_slot, 'states': 0})
+            docs = reservations.where('date', '==', today).where('states', '==', 0).limit(1).get()
+            for doc in docs:
+                doc.reference.update({'states': 1})
+
+    def sample():
+        samples.append({
+            'trace_hours': (clock.time() - clock.start.timestamp()) / 3600,
+            'cpu_seconds': cpu_seconds(),
+            'rss_kb': current_rss_kb(),
+            'widgets': count_widgets(root),
+            'threads': threading.active_count(),
+            'dispatcher_depth': display.dispatcher.stats()['depth'],
+        })
+        if clock.time() >= end:
+            root.quit()
+        else:
+            root.after(int(clock.real_seconds(SOAK_SAMPLE_SECONDS) * 1000), sample)
+
+    threading.Thread(target=traffic, daemon=True).start()
+    root.after(0, sample)
+    display.run()
+    return dict(summarize_soak(samples), speed=speed, days=days)
+
+
+def summarize_soak(samples):
+    """soakの計測値からCPU時間の割合・メモリの増え方・ウィジェット数をまとめる"""
+    first, last = samples[0], samples[-1]
+    hours = last['trace_hours'] - first['trace_hours']
+    # 起動直後の読み込みを除くため、1時間経過後からの増え方を見る
+    warm = next((s for s in samples if s['trace_hours'] - first['trace_hours'] >= 1), first)
+    warm_days = (last['trace_hours'] - warm['trace_hours']) / 24
+    return {
+        'trace_hours': round(hours, 2),
+        'cpu_seconds_per_trace_hour': (last['cpu_seconds'] - first['cpu_seconds']) / hours if hours else None,
+        'rss_kb': {'start': first['rss_kb'], 'end': last['rss_kb'], 'max': max(s['rss_kb'] for s in samples)},
+        'rss_growth_kb_per_day': (last['rss_kb'] - warm['rss_kb']) / warm_days if warm_days else None,
+        'widgets': {'start': first['widgets'], 'end': last['widgets'], 'max': max(s['widgets'] for s in samples)},
+        'threads_max': max(s['threads'] for s in samples),
+        'dispatcher_depth_max': max(s['dispatcher_depth'] for s in samples),
+        'samples': samples,
+    }
+
+
+CHILDREN = {
+    'startup-signage': child_startup_signage,
+    'startup-setup': child_startup_setup,
+    'render': child_render,
+    'soak': child_soak,
+}
+
+
+def run_child_main(name, options):
+    result = CHILDREN[name](json.loads(options))
+    print(json.dumps(result))
+    sys.stdout.flush()
+    # 監視スレッドやTkの後始末を待たずに終了する
+    os._exit(0)
+
+
+# --- 親プロセス ---
+
+def start_xvfb(screen=SCREEN):
+    """空いている番号でXvfbを起動して (DISPLAY, プロセス) を返す"""
+    if shutil.which('Xvfb') is None:
+        raise RuntimeError("Xvfbが見つかりません（sudo apt install xvfb）")
+    number = next(n for n in range(99, 199)
+                  if not os.path.exists(f'/tmp/.X11-unix/X{n}') and not os.path.exists(f'/tmp/.X{n}-lock'))
+    process = subprocess.Popen(
+        ['Xvfb', f':{number}', '-screen', '0', screen, '-nolisten', 'tcp'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + XVFB_TIMEOUT
+    while not os.path.exists(f'/tmp/.X11-unix/X{number}'):
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            raise RuntimeError(f"Xvfbを起動できません (:{number})")
+        time.sleep(0.05)
+    return f':{number}', process
+
+
+def run_child(name, options, env, timeout=None):
+    """新しいインタプリタで1回計測"""
+    options = dict(options, launched=time.monotonic())
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', name, json.dumps(options)],
+        capture_output=True, text=True, env=env, timeout=timeout,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{name}: {result.stderr.strip()[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median_of(samples):
+    """数値の項目ごとの中央値"""
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(args, env):
+    report = {'meta': {
+        'git': git_revision(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'screen': SCREEN,
+        'data_mode': args.mode,
+        'runs': args.runs,
+    }}
+    options = {'mode': args.mode}
+
+    if 'startup' in args.only:
+        report['startup'] = {}
+        for name in ('signage', 'setup'):
+            samples = [run_child(f'startup-{name}', options, env) for _ in range(args.runs)]
+            report['startup'][name] = median_of(samples)
+            print(f"startup {name}: 初回描画 {report['startup'][name]['first_frame_seconds']:.3f}s "
+                  f"(中央値, {args.runs}回)", file=sys.stderr)
+
+    if 'render' in args.only:
+        report['render'] = run_child('render', dict(options, samples=args.render_samples), env)
+        print(f"render: update_display p95 {report['render']['update_display_ms']['p95']:.2f}ms, "
+              f"load_background p95 {report['render']['load_background_cold_ms']['p95']:.1f}ms", file=sys.stderr)
+
+    if 'soak' in args.only:
+        real_seconds = args.soak_days * 86400 / args.soak_speed
+        report['soak'] = run_child('soak', dict(options, days=args.soak_days, speed=args.soak_speed), env,
+                                   timeout=real_seconds * 2 + 120)
+        print(f"soak: CPU {report['soak']['cpu_seconds_per_trace_hour']:.2f}s/h, "
+              f"RSS増加 {report['soak']['rss_growth_kb_per_day']:.0f}KB/日", file=sys.stderr)
+    return report
+
+
+def flatten(report, prefix=''):
+    """比較用に数値の項目を "a.b.c" の形で取り出す（meta・samplesは除く）"""
+    values = {}
+    for key, value in report.items():
+        if key in ('meta', 'samples'):
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def compare_reports(base, new, threshold=DEFAULT_THRESHOLD):
+    """両方にある項目の変化 [(名前, 基準値, 新しい値, 変化率, 悪化したか)]（値が小さいほど良い）"""
+    base_values, new_values = flatten(base), flatten(new)
+    rows = []
+    for name in sorted(base_values.keys() & new_values.keys()):
+        before, after = base_values[name], new_values[name]
+        ratio = (after - before) / before if before else None
+        rows.append((name, before, after, ratio, ratio is not None and ratio > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='サイネージの描画と長時間動作のベンチマーク')
+    parser.add_argument('--only', default=','.join(SCENARIOS), help='計測する項目（startup,render,soak）')
+    parser.add_argument('-n', '--runs', type=int, default=5, help='startupの計測回数')
+    parser.add_argument('--mode', choices=('poll', 'query', 'listen'), default='poll', help='データ取得モード')
+    parser.add_argument('--render-samples', type=int, default=200, help='update_displayの計測回数')
+    parser.add_argument('--soak-days', type=float, default=3, help='soakで早送りする日数')
+    parser.add_argument('--soak-speed', type=float, default=1440, help='soakの速度（1440で1日が1分）')
+    parser.add_argument('--use-display', action='store_true', help='Xvfbを起動せず現在のDISPLAYを使う')
+    parser.add_argument('--output', help='結果のJSONを書き込むファイル（省略時は標準出力）')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='2つの結果を比較')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='悪化とみなす割合')
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child_main(*args.child)
+
+    if args.compare:
+        with open(args.compare[0], 'r', encoding='utf-8') as f:
+            base = json.load(f)
+        with open(args.compare[1], 'r', encoding='utf-8') as f:
+            new = json.load(f)
+        rows = compare_reports(base, new, args.threshold)
+        for name, before, after, ratio, worse in rows:
+            change = f"{ratio * 100:+.1f}%" if ratio is not None else "-"
+            print(f"{'!' if worse else ' '} {name}: {before:.4g} -> {after:.4g} ({change})")
+        return 1 if any(row[4] for row in rows) else 0
+
+    args.only = [name for name in args.only.split(',') if name]
+    unknown = set(args.only) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"不明な項目: {', '.join(sorted(unknown))}")
+
+    env = dict(os.environ)
+    xvfb = None
+    if not args.use_display:
+        try:
+            env['DISPLAY'], xvfb = start_xvfb()
+        except RuntimeError as e:
+            parser.error(str(e))
+    elif not env.get('DISPLAY'):
+        parser.error("DISPLAYが設定されていません")
+    try:
+        report = run_benchmarks(args, env)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""営業時間に合わせたデータ取得間隔と画面の電源の制御
+
+hours.jsonの例:
+    {
+        "hours": {
+            "mon": ["09:00", "20:00"], "tue": ["09:00", "20:00"], "wed": null,
+            "thu": ["09:00", "20:00"], "fri": ["09:00", "22:00"],
+            "sat": ["10:00", "22:00"], "sun": ["10:00", "18:00"]
+        },
+        "busy": [["11:30", "13:30"], ["17:30", "19:30"]],
+        "wake_before_minutes": 30,
+        "sleep_after_minutes": 30,
+        "poll": {"fast_seconds": 10, "idle_seconds": 60}
+    }
+
+nullの曜日は定休日。閉店時刻が開店時刻より前の場合は日付をまたぐ営業とみなす。
+hours.jsonがない場合は従来通り24時間表示し、10秒ごとに取得する。
+"""
+
+import json
+import logging
+import random
+import subprocess
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+DAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+# 定休日が続く場合でも営業開始を探す日数
+SEARCH_DAYS = 8
+
+
+def parse_time(text):
+    hour, minute = text.split(':')
+    return timedelta(hours=int(hour), minutes=int(minute))
+
+
+class BusinessHours:
+    """営業時間（開店前・閉店後の余裕を含む）の判定"""
+
+    def __init__(self, hours=None, busy=None, wake_before_minutes=30, sleep_after_minutes=30):
+        # hoursがNoneの場合は24時間営業
+        self.hours = hours
+        self.busy = [(parse_time(start), parse_time(end)) for start, end in (busy or [])]
+        self.wake_before = timedelta(minutes=wake_before_minutes)
+        self.sleep_after = timedelta(minutes=sleep_after_minutes)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            hours=config.get('hours'),
+            busy=config.get('busy'),
+            wake_before_minutes=config.get('wake_before_minutes', 30),
+            sleep_after_minutes=config.get('sleep_after_minutes', 30),
+        )
+
+    def windows(self, now):
+        """nowの前日からSEARCH_DAYS日分の表示時間帯 [(開始, 終了), ...]"""
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        result = []
+        for offset in range(-1, SEARCH_DAYS):
+            day = today + timedelta(days=offset)
+            hours = self.hours.get(DAY_NAMES[day.weekday()])
+            if not hours:
+                continue
+            start = day + parse_time(hours[0])
+            end = day + parse_time(hours[1])
+            if end <= start:
+                end += timedelta(days=1)  # 日付をまたぐ営業
+            result.append((start - self.wake_before, end + self.sleep_after))
+        return result
+
+    def is_open(self, now):
+        """画面を表示してデータを取得する時間か"""
+        if self.hours is None:
+            return True
+        return any(start <= now < end for start, end in self.windows(now))
+
+    def seconds_until_open(self, now):
+        """次の表示開始までの秒数（表示中は0、営業日がない場合はNone）"""
+        if self.is_open(now):
+            return 0
+        starts = [start for start, _ in self.windows(now) if start > now]
+        if not starts:
+            return None
+        return (min(starts) - now).total_seconds()
+
+    def is_busy(self, now):
+        """混雑する時間帯か（取得間隔を短くする）"""
+        current = timedelta(hours=now.hour, minutes=now.minute)
+        for start, end in self.busy:
+            if start <= end:
+                if start <= current < end:
+                    return True
+            elif current >= start or current < end:
+                return True
+        return False
+
+
+class PollScheduler:
+    """直近の変化とエラーから次の取得までの秒数を決める
+
+    データが変わった直後や混雑する時間帯はfast_seconds間隔で取得し、変化がない間は
+    idle_secondsまで徐々に間隔を延ばす。失敗した時は上限付きの指数バックオフに
+    ゆらぎを加え、複数台が同時に再試行しないようにする。
+    """
+
+    def __init__(self, fast_seconds=10, idle_seconds=60, growth=1.5,
+                 error_base_seconds=10, error_max_seconds=300, rng=random.random):
+        self.fast_seconds = fast_seconds
+        self.idle_seconds = idle_seconds
+        self.growth = growth
+        self.error_base_seconds = error_base_seconds
+        self.error_max_seconds = error_max_seconds
+        self.rng = rng
+        self.interval = fast_seconds
+        self.failures = 0
+
+    @classmethod
+    def from_config(cls, config):
+        poll = config.get('poll', {})
+        return cls(
+            fast_seconds=poll.get('fast_seconds', 10),
+            idle_seconds=poll.get('idle_seconds', 60),
+        )
+
+    def next_interval(self, changed, failed, busy=False):
+        if failed:
+            self.failures += 1
+            ceiling = min(self.error_max_seconds, self.error_base_seconds * 2 ** (self.failures - 1))
+            return ceiling / 2 + self.rng() * ceiling / 2
+        self.failures = 0
+        if changed or busy:
+            self.interval = self.fast_seconds
+        else:
+            self.interval = min(self.idle_seconds, self.interval * self.growth)
+        return self.interval
+
+    def reset(self):
+        """営業開始時などに短い間隔から始め直す"""
+        self.interval = self.fast_seconds
+        self.failures = 0
+
+
+def load_schedule(path='hours.json'):
+    """hours.jsonから営業時間と取得間隔の設定を読み込み"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        config = {}
+    except Exception as e:
+        logger.error(f"営業時間の読み込みエラー: {e}")
+        config = {}
+    return schedule_from_config(config)
+
+
+def schedule_from_config(config):
+    """hours.jsonと同じ形式の辞書（signage.jsonのschedule）から営業時間と取得間隔を作成"""
+    config = dict(config)
+    if not config.get('hours'):
+        # 営業時間の指定がない場合は従来通り24時間・10秒ごと
+        config.setdefault('poll', {'fast_seconds': 10, 'idle_seconds': 10})
+    return BusinessHours.from_config(config), PollScheduler.from_config(config)
+
+
+def set_display_power(on):
+    """画面の電源を切り替え（表示中は自動消灯を無効にしておく）"""
+    commands = [['xset', 'dpms', 'force', 'on'], ['xset', '-dpms']] if on else \
+        [['xset', '+dpms'], ['xset', 'dpms', 'force', 'off']]
+    for command in commands:
+        try:
+            subprocess.run(command, capture_output=True, timeout=5)
+        except Exception as e:
+            logger.debug("画面の電源切り替えエラー: %s", e)
+    logger.info(f"画面の電源: {'オン' if on else 'オフ'}")
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""1枚のCanvasに背景と文字を合成する描画方式
+
+大きな数字などの文字はフォント・サイズ・色ごとに一度だけ画像化（グリフアトラス）し、
+表示の更新は変わった文字の画像を差し替えるだけにする。
+文字は透過画像のため、背景の上に枠なしで重ねて表示できる。
+"""
+
+import subprocess
+import tkinter as tk
+from PIL import Image, ImageDraw, ImageFont, ImageTk
+
+# 事前に画像化しておく文字（数字・時刻・日付・「名」など表示に使うもの）
+ATLAS_CHARSET = "0123456789:/ 名月日最終更新"
+
+# 日本語フォントの候補（fc-matchで見つからない場合は既知のパスを試す）
+FONT_FAMILIES = ['Noto Sans CJK JP:bold', 'IPAexGothic', 'Takao Gothic', 'DejaVu Sans:bold']
+FONT_PATHS = [
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc',
+    '/usr/share/fonts/truetype/fonts-japanese-gothic.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+]
+
+# 文字の縁取り（背景の上でも読めるようにする）
+STROKE_WIDTH = 4
+STROKE_COLOR = '#000000'
+
+
+def find_font_path():
+    """グリフの画像化に使うフォントファイルを探す（見つからない場合はNone）"""
+    for family in FONT_FAMILIES:
+        try:
+            result = subprocess.run(
+                ['fc-match', '-f', '%{file}', family],
+                capture_output=True, text=True, timeout=5
+            )
+            if result.returncode == 0 and result.stdout.strip():
+                return result.stdout.strip()
+        except Exception:
+            break
+    for path in FONT_PATHS:
+        try:
+            ImageFont.truetype(path, 10)
+            return path
+        except Exception:
+            continue
+    return None
+
+
+def load_font(font_path, pixel_size):
+    if font_path:
+        return ImageFont.truetype(font_path, pixel_size)
+    return ImageFont.load_default(pixel_size)
+
+
+class GlyphAtlas:
+    """1つのフォント・サイズ・色の文字画像をまとめて保持する"""
+
+    def __init__(self, font_path, pixel_size, color, charset=ATLAS_CHARSET):
+        self.font = load_font(font_path, pixel_size)
+        self.color = color
+        ascent, descent = self.font.getmetrics()
+        self.line_height = ascent + descent + STROKE_WIDTH * 2
+        self.glyphs = {}   # 文字 -> (PIL画像, 送り幅)
+        self.photos = {}   # 文字 -> PhotoImage（Tkのメインスレッドで初回使用時に作成）
+        for char in charset:
+            self.glyph(char)
+
+    def glyph(self, char):
+        """文字の画像と送り幅を返す（アトラスにない文字はその場で追加）"""
+        if char not in self.glyphs:
+            advance = int(round(self.font.getlength(char)))
+            image = Image.new('RGBA', (advance + STROKE_WIDTH * 2, self.line_height), (0, 0, 0, 0))
+            ImageDraw.Draw(image).text(
+                (STROKE_WIDTH, STROKE_WIDTH), char, font=self.font, fill=self.color,
+                stroke_width=STROKE_WIDTH, stroke_fill=STROKE_COLOR
+            )
+            self.glyphs[char] = (image, advance)
+        return self.glyphs[char]
+
+    def photo(self, char):
+        """文字のPhotoImage（メインスレッド専用）"""
+        if char not in self.photos:
+            self.photos[char] = ImageTk.PhotoImage(self.glyph(char)[0])
+        return self.photos[char]
+
+    def layout(self, text):
+        """文字ごとの (文字, x位置) と全体の幅を返す"""
+        positions = []
+        x = 0
+        for char in text:
+            positions.append((char, x))
+            x += self.glyph(char)[1]
+        return positions, x
+
+
+class TextRun:
+    """Canvas上の1行分の文字（文字ごとの画像アイテム）"""
+
+    def __init__(self, canvas, atlas, x, y):
+        self.canvas = canvas
+        self.atlas = atlas
+        self.x = x
+        self.y = y
+        self.items = []  # [アイテムID, 表示中の文字, x位置]
+
+    def move(self, x, y):
+        """行の位置を変更"""
+        dx, dy = x - self.x, y - self.y
+        self.x, self.y = x, y
+        for item, _, _ in self.items:
+            self.canvas.move(item, dx, dy)
+
+    def set_text(self, text):
+        """変わった文字の画像だけを差し替える"""
+        positions, _ = self.atlas.layout(text)
+        for i, (char, offset) in enumerate(positions):
+            if i < len(self.items):
+                item, shown_char, shown_offset = self.items[i]
+                if shown_char != char:
+                    self.canvas.itemconfig(item, image=self.atlas.photo(char), state='normal')
+                if shown_offset != offset:
+                    self.canvas.coords(item, self.x + offset, self.y)
+                self.items[i] = [item, char, offset]
+            else:
+                item = self.canvas.create_image(
+                    self.x + offset, self.y, image=self.atlas.photo(char), anchor='nw'
+                )
+                self.items.append([item, char, offset])
+
+        # 余った文字は非表示にして再利用に備える
+        for entry in self.items[len(positions):]:
+            if entry[1] is not None:
+                self.canvas.itemconfig(entry[0], state='hidden')
+                entry[1] = None
+
+
+class CanvasCompositor:
+    """背景画像と文字を1枚のCanvasに合成する"""
+
+    def __init__(self, parent, pixels_per_point=1.0):
+        self.canvas = tk.Canvas(parent, bg='black', highlightthickness=0, bd=0)
+        self.canvas.place(x=0, y=0, relwidth=1, relheight=1)
+        self.background_item = self.canvas.create_image(0, 0, anchor='nw')
+        self.background_photo = None
+        self.pixels_per_point = pixels_per_point
+        self.font_path = find_font_path()
+        self.atlases = {}
+        self.runs = {}
+
+    def atlas(self, point_size, color):
+        """フォントサイズ・色ごとのアトラス（初回のみ作成）"""
+        key = (point_size, color)
+        if key not in self.atlases:
+            pixel_size = int(round(point_size * self.pixels_per_point))
+            self.atlases[key] = GlyphAtlas(self.font_path, pixel_size, color)
+        return self.atlases[key]
+
+    def add_text(self, key, point_size, color, x=0, y=0):
+        """文字の行を追加"""
+        self.runs[key] = TextRun(self.canvas, self.atlas(point_size, color), x, y)
+        return self.runs[key]
+
+    def line_height(self, key):
+        return self.runs[key].atlas.line_height
+
+    def place_text(self, key, x, y):
+        self.runs[key].move(x, y)
+
+    def set_text(self, key, text):
+        self.runs[key].set_text(text)
+
+    def set_background(self, image):
+        """背景画像を差し替え（同じアイテムを再利用する）"""
+        if self.background_photo is not None and (
+                self.background_photo.width(), self.background_photo.height()) == image.size:
+            # 同じサイズなら表示中の画像に上書き
+            self.background_photo.paste(image)
+            return
+        self.background_photo = ImageTk.PhotoImage(image)
+        self.canvas.itemconfig(self.background_item, image=self.background_photo)
+        self.canvas.tag_lower(self.background_item)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""インターネット接続確認
+
+複数の軽量なURLへ並列に問い合わせ、最初に成功した時点で接続ありと判定する。
+結果は短時間キャッシュし、接続はプロセス内で共有するセッションで再利用する。
+
+イベントループのタスクからはcheck_connectivity_asyncを使う（スレッドを使わずに問い合わせる）。
+
+コマンドラインから実行すると接続状態を表示し、接続ありなら終了コード0を返す。
+"""
+
+import asyncio
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+from urllib.request import getproxies
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+
+# 204/200を返す軽量な確認用URL
+PROBE_URLS = [
+    'http://connectivitycheck.gstatic.com/generate_204',
+    'http://cp.cloudflare.com/generate_204',
+    'https://www.google.com/generate_204',
+]
+# 1回の確認にかける最大秒数
+PROBE_TIMEOUT = 3
+# DNS確認に使うホスト名
+DNS_CHECK_HOST = 'connectivitycheck.gstatic.com'
+# 結果のキャッシュ秒数（接続あり / 接続なし）
+CACHE_TTL = 10
+FAILURE_CACHE_TTL = 1
+
+_lock = threading.Lock()
+_session = None
+_executor = ThreadPoolExecutor(max_workers=len(PROBE_URLS) + 1, thread_name_prefix='connectivity')
+_cached_result = None
+_cached_at = 0.0
+
+
+def get_session():
+    """接続を再利用する共有セッション"""
+    global _session
+    with _lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=len(PROBE_URLS), pool_maxsize=2)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def has_default_route():
+    """デフォルトゲートウェイが設定されているか（/proc/net/routeで確認）"""
+    try:
+        with open('/proc/net/route', 'r') as f:
+            for line in f.readlines()[1:]:
+                fields = line.split()
+                if len(fields) > 2 and fields[1] == '00000000':
+                    return True
+        return False
+    except OSError:
+        # 確認できない環境ではHTTPの確認に任せる
+        return True
+
+
+def can_resolve(host=DNS_CHECK_HOST, timeout=1.0):
+    """DNSで名前解決できるか"""
+    future = _executor.submit(socket.getaddrinfo, host, 80)
+    try:
+        future.result(timeout=timeout)
+        return True
+    except Exception:
+        return False
+
+
+def probe_url(url, timeout=PROBE_TIMEOUT):
+    """1つのURLに問い合わせて応答があればTrue"""
+    try:
+        response = get_session().get(url, timeout=timeout, allow_redirects=False)
+        return response.status_code in (200, 204)
+    except Exception:
+        return False
+
+
+def race_probes(urls, timeout=PROBE_TIMEOUT):
+    """全URLへ並列に問い合わせ、最初の成功で打ち切る"""
+    futures = [_executor.submit(probe_url, url, timeout) for url in urls]
+    try:
+        for future in as_completed(futures, timeout=timeout + 0.5):
+            if future.result():
+                return True
+    except FuturesTimeoutError:
+        pass
+    return False
+
+
+def cached_result(use_cache):
+    """キャッシュ期間内の前回の結果（ない場合はNone）"""
+    if use_cache and _cached_result is not None:
+        ttl = CACHE_TTL if _cached_result else FAILURE_CACHE_TTL
+        if time.monotonic() - _cached_at < ttl:
+            return _cached_result
+    return None
+
+
+def store_result(result):
+    global _cached_result, _cached_at
+    _cached_result = result
+    _cached_at = time.monotonic()
+    return result
+
+
+def check_connectivity(use_cache=True, timeout=PROBE_TIMEOUT):
+    """インターネットに接続できるか判定（結果は短時間キャッシュ）"""
+    cached = cached_result(use_cache)
+    if cached is not None:
+        return cached
+
+    # 安価なローカル確認で明らかな未接続を先に判定（プロキシ経由の場合は名前解決をプロキシに任せる）
+    if not has_default_route() or (not getproxies() and not can_resolve()):
+        return store_result(False)
+    return store_result(race_probes(PROBE_URLS, timeout))
+
+
+# --- asyncio版（イベントループのタスクから使う。スレッドを使わずに問い合わせる） ---
+
+async def can_resolve_async(host=DNS_CHECK_HOST, timeout=1.0):
+    """DNSで名前解決できるか"""
+    try:
+        await asyncio.wait_for(asyncio.get_running_loop().getaddrinfo(host, 80), timeout)
+        return True
+    except Exception:
+        return False
+
+
+async def probe_url_async(url, timeout=PROBE_TIMEOUT):
+    """1つのURLに問い合わせて応答があればTrue"""
+    parts = urlsplit(url)
+    secure = parts.scheme == 'https'
+
+    async def probe():
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, parts.port or (443 if secure else 80), ssl=True if secure else None
+        )
+        try:
+            request = f"GET {parts.path or '/'} HTTP/1.1\r\nHost: {parts.hostname}\r\nConnection: close\r\n\r\n"
+            writer.write(request.encode('ascii'))
+            await writer.drain()
+            status_line = await reader.readline()
+        finally:
+            writer.close()
+        fields = status_line.split()
+        return len(fields) >= 2 and fields[1] in (b'200', b'204')
+
+    try:
+        return await asyncio.wait_for(probe(), timeout)
+    except Exception:
+        return False
+
+
+async def race_probes_async(urls, timeout=PROBE_TIMEOUT):
+    """全URLへ並列に問い合わせ、最初の成功で残りをキャンセルする"""
+    tasks = [asyncio.ensure_future(probe_url_async(url, timeout)) for url in urls]
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=timeout + 0.5):
+            if await next_done:
+                return True
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+    return False
+
+
+async def check_connectivity_async(use_cache=True, timeout=PROBE_TIMEOUT):
+    """check_connectivityのasyncio版（キャッシュは共有）"""
+    cached = cached_result(use_cache)
+    if cached is not None:
+        return cached
+    if getproxies():
+        # プロキシ経由の問い合わせはrequestsに任せる
+        return await asyncio.get_running_loop().run_in_executor(None, check_connectivity, use_cache, timeout)
+    if not has_default_route() or not await can_resolve_async():
+        return store_result(False)
+    return store_result(await race_probes_async(PROBE_URLS, timeout))
+
+
+def main():
+    start = time.monotonic()
+    connected = check_connectivity(use_cache=False)
+    elapsed = time.monotonic() - start
+    if connected:
+        print(f"接続あり ({elapsed:.2f}s)")
+    else:
+        print(f"接続なし ({elapsed:.2f}s)")
+    return 0 if connected else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""動作中のサイネージを操作するためのUnixドメインソケット
+
+1行のコマンドを送ると、結果をJSON1行で返す。
+
+    python3 control_socket.py ping
+    python3 control_socket.py force-refresh
+    python3 control_socket.py reload-background
+    python3 control_socket.py reload-config
+    python3 control_socket.py dump-state
+    python3 control_socket.py dump-log     # 直近のログ（デバッグを含む）
+    python3 control_socket.py record-start # 待ち人数・予約数の変化の記録を開始
+    python3 control_socket.py record-stop
+
+終了コードは成功時0、応答がない・失敗した場合1。
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import os
+import socket
+import sys
+
+from core_loop import get_core_loop
+
+logger = logging.getLogger(__name__)
+
+SOCKET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'signage.sock')
+COMMAND_TIMEOUT = 5
+
+
+class ControlServer:
+    """コマンド名ごとの処理を登録して受け付ける（処理は共有のイベントループのスレッドプールで実行される）"""
+
+    def __init__(self, path=SOCKET_PATH, core=None):
+        self.path = path
+        self.core = core
+        self.handlers = {}
+        self.server = None
+
+    def register(self, command, handler):
+        """コマンドの処理を登録（handlerは結果の辞書を返す）"""
+        self.handlers[command] = handler
+
+    def start(self):
+        """ソケットを作成して受付を開始（作成できない場合False）"""
+        if os.path.exists(self.path):
+            if send_command('ping', self.path, timeout=1) is not None:
+                logger.warning(f"操作用ソケットは別のプロセスが使用中です: {self.path}")
+                return False
+            os.unlink(self.path)  # 前回の異常終了で残ったソケット
+
+        if self.core is None:
+            self.core = get_core_loop()
+        try:
+            self.server = self.core.submit(asyncio.start_unix_server(self.serve, self.path)).result(COMMAND_TIMEOUT)
+            os.chmod(self.path, 0o600)
+        except OSError as e:
+            logger.error(f"操作用ソケットを作成できません: {e}")
+            self.server = None
+            return False
+
+        atexit.register(self.close)
+        logger.info(f"操作用ソケットを開始: {self.path}")
+        return True
+
+    async def serve(self, reader, writer):
+        # 接続が来た時だけ呼ばれるため、操作がない間は処理が発生しない
+        try:
+            line = await asyncio.wait_for(reader.readline(), COMMAND_TIMEOUT)
+            # 処理はTkや取得処理を待つことがあるため、イベントループではなくスレッドプールで実行
+            reply = await self.core.run_blocking(
+                self.handle, line.decode('utf-8', 'replace').strip(), timeout=COMMAND_TIMEOUT
+            )
+            writer.write((json.dumps(reply, ensure_ascii=False, default=str) + '\n').encode('utf-8'))
+            await writer.drain()
+        except (asyncio.TimeoutError, OSError) as e:
+            logger.warning(f"操作用ソケットの通信エラー: {e}")
+        finally:
+            writer.close()
+
+    def handle(self, line):
+        """1行のコマンドを処理して返答の辞書を作成"""
+        command = line.split(' ', 1)[0]
+        handler = self.handlers.get(command)
+        if handler is None:
+            return {'ok': False, 'error': f"不明なコマンド: {command}", 'commands': sorted(self.handlers)}
+        try:
+            result = handler() or {}
+            return dict({'ok': True}, **result)
+        except Exception as e:
+            logger.error(f"操作コマンドの処理エラー ({command}): {e}")
+            return {'ok': False, 'error': str(e)}
+
+    def close(self):
+        server, self.server = self.server, None
+        if server is None:
+            return
+        server.close()
+        try:
+            self.core.submit(server.wait_closed()).result(COMMAND_TIMEOUT)
+        except Exception:
+            pass
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def send_command(command, path=SOCKET_PATH, timeout=COMMAND_TIMEOUT):
+    """コマンドを送って返答の辞書を返す（接続できない場合はNone）"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall((command + '\n').encode('utf-8'))
+            line = sock.makefile('r', encoding='utf-8').readline()
+    except OSError:
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'ping'
+    reply = send_command(command)
+    if reply is None:
+        print("応答なし")
+        return 1
+    print(json.dumps(reply, ensure_ascii=False, indent=2))
+    return 0 if reply.get('ok') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
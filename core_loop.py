@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""周期処理・通信を動かすasyncioのイベントループ
+
+データ取得、リスナーの監視、背景の切り替え、Wi-Fiのスキャン・接続、接続確認、
+操作用ソケット、計測値の公開をすべて1つのイベントループのタスクとして動かす。
+タスクには名前を付け、キャンセル・置き換え・終了時の一括停止ができる。
+
+Tkはメインスレッドで自身のmainloopを動かす必要があるため、イベントループは専用の
+1スレッドで動かし、表示の更新はUiDispatcher経由でメインスレッドに渡す。
+PILの画像処理や操作コマンドのように短く終わるブロッキング処理は、同時実行数を制限した
+スレッドプールでタイムアウトを付けて実行する（run_blocking）。FirestoreのSDK呼び出しの
+ように応答が返らないことがある処理は、ハングしても共有のスレッドプールを塞がないように
+呼び出しごとの専用スレッドで実行する（run_isolated）。
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import functools
+import logging
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 短く終わるブロッキング処理を同時に実行する数
+BLOCKING_WORKERS = 4
+# 短く終わるブロッキング処理を打ち切るまでの秒数
+BLOCKING_TIMEOUT = 10
+# 打ち切った後も終わらない専用スレッドをこの数まで許す（超えた分はすぐにタイムアウトとする）
+ISOLATED_LIMIT = 4
+# 終了時にタスクの停止を待つ秒数
+STOP_TIMEOUT = 5
+
+_core = None
+_core_lock = threading.Lock()
+
+
+class CoreLoop:
+    """専用スレッドで動くイベントループと名前付きのタスク"""
+
+    def __init__(self, blocking_workers=BLOCKING_WORKERS, isolated_limit=ISOLATED_LIMIT):
+        self.loop = asyncio.new_event_loop()
+        self.blocking_workers = blocking_workers
+        self.isolated_limit = isolated_limit
+        self.isolated_running = 0
+        self.isolated_lock = threading.Lock()
+        self.tasks = {}  # 名前 -> Task（イベントループのスレッドからのみ変更）
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='core-loop', daemon=True)
+            self.thread.start()
+        return self
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=self.blocking_workers, thread_name_prefix='core-blocking')
+        )
+        self.loop.run_forever()
+
+    def in_loop(self):
+        return threading.current_thread() is self.thread
+
+    def call_soon(self, callback, *args):
+        """イベントループのスレッドでcallbackを実行（どのスレッドからでも呼べる）"""
+        if self.in_loop():
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def submit(self, coroutine):
+        """コルーチンを実行してconcurrent.futures.Futureを返す（イベントループ以外のスレッド用）"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def spawn(self, name, coroutine_function, *args):
+        """名前付きのタスクを開始（同じ名前のタスクが動いていればキャンセルして置き換える）"""
+        def create():
+            old = self.tasks.get(name)
+            if old is not None and not old.done():
+                old.cancel()
+            task = self.loop.create_task(self.guard(name, coroutine_function, args), name=name)
+            self.tasks[name] = task
+            task.add_done_callback(functools.partial(self.forget, name))
+        self.call_soon(create)
+
+    def forget(self, name, task):
+        if self.tasks.get(name) is task:
+            del self.tasks[name]
+
+    async def guard(self, name, coroutine_function, args):
+        try:
+            return await coroutine_function(*args)
+        except asyncio.CancelledError:
+            logger.debug("タスクを停止: %s", name)
+            raise
+        except Exception as e:
+            logger.error(f"タスクが異常終了しました ({name}): {e}")
+
+    def cancel(self, name):
+        """名前付きのタスクをキャンセル"""
+        def cancel():
+            task = self.tasks.get(name)
+            if task is not None:
+                task.cancel()
+        self.call_soon(cancel)
+
+    def task_names(self):
+        return sorted(self.tasks)
+
+    async def run_blocking(self, func, *args, timeout=BLOCKING_TIMEOUT):
+        """短く終わるブロッキング処理を共有のスレッドプールで実行（timeout秒で打ち切る）
+
+        タイムアウトしても実行中の処理自体は止められないため、結果を待つのをやめるだけになる。
+        応答が返らないことがある処理はrun_isolatedを使う。
+        """
+        future = self.loop.run_in_executor(None, functools.partial(func, *args))
+        return await asyncio.wait_for(future, timeout)
+
+    async def run_isolated(self, func, *args, timeout):
+        """応答が返らないことがある処理を呼び出しごとの専用スレッドで実行（timeout秒で打ち切る）
+
+        ハングしたスレッドは残るが共有のスレッドプールは塞がない。打ち切った後も終わらない
+        スレッドがisolated_limit個残っている場合は、新しいスレッドを作らずにすぐタイムアウトとする。
+        """
+        with self.isolated_lock:
+            if self.isolated_running >= self.isolated_limit:
+                raise asyncio.TimeoutError(f"応答のない処理が{self.isolated_running}件残っています")
+            self.isolated_running += 1
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+
+        def run():
+            try:
+                result = func(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                with self.isolated_lock:
+                    self.isolated_running -= 1
+
+        threading.Thread(target=run, name='core-isolated', daemon=True).start()
+        return await asyncio.wait_for(asyncio.wrap_future(future, loop=self.loop), timeout)
+
+    async def shutdown(self):
+        tasks = [task for task in self.tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """すべてのタスクをキャンセルしてイベントループを終了"""
+        if self.thread is None or not self.loop.is_running():
+            return
+        try:
+            self.submit(self.shutdown()).result(timeout)
+        except Exception as e:
+            logger.warning(f"タスクの停止を待てませんでした: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+
+
+def get_core_loop():
+    """プロセスで共有するイベントループ（初回の呼び出しで開始）"""
+    global _core
+    with _core_lock:
+        if _core is None:
+            _core = CoreLoop().start()
+            atexit.register(_core.stop)
+        return _core
+
+
+class WakeEvent:
+    """どのスレッドからでもset()でき、イベントループのタスクがwait()で待てるイベント"""
+
+    def __init__(self, core=None):
+        self.core = core
+        self.flag = False
+        self.event = None
+
+    def set(self):
+        self.flag = True
+        if self.core is not None and self.event is not None:
+            self.core.call_soon(self.event.set)
+
+    def is_set(self):
+        return self.flag
+
+    def clear(self):
+        self.flag = False
+
+    async def wait(self, timeout):
+        """set()されるかtimeout秒経つまで待ち、フラグを戻す（set()された場合True）"""
+        if self.event is None:
+            self.event = asyncio.Event()
+        if not self.flag:
+            self.event.clear()
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        woken = self.flag
+        self.flag = False
+        return woken
+
+
+async def run_command(args, timeout):
+    """外部コマンドを非同期に実行してsubprocess.CompletedProcess（文字列）を返す
+
+    タイムアウトした場合はプロセスを終了させてsubprocess.TimeoutExpiredを送出する。
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise subprocess.TimeoutExpired(args, timeout)
+    return subprocess.CompletedProcess(
+        args, process.returncode,
+        stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace'),
+    )
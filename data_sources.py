@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""サイネージが読み取るFirestoreデータの取得元
+
+grpc: firebase_admin（gRPC）を使う従来の取得元。リアルタイム監視にも対応
+rest: requestsのみでFirestore REST APIを呼ぶ軽量な取得元
+local: ネットワークなしで動くメモリ上のFirestore（開発・負荷試験・CI用、local_firestore.py）
+"""
+
+import importlib
+import json
+import os
+
+from signage_config import load_config
+
+FIRESTORE_SCOPE = 'https://www.googleapis.com/auth/datastore'
+FIRESTORE_URL = 'https://firestore.googleapis.com/v1'
+REQUEST_TIMEOUT = 10
+
+
+class FirestoreSource:
+    """firebase_admin（gRPC）による取得元"""
+
+    name = 'grpc'
+    supports_listen = True
+
+    def __init__(self, key_path):
+        # gRPC一式の読み込みは重いため、この取得元を使う時だけimportする
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(key_path)
+            firebase_admin.initialize_app(cred)
+        self.db = firestore.client()
+
+    def get_population(self):
+        """now_population/signageの内容を返す（存在しない場合はNone）"""
+        doc = self.db.collection('now_population').document('signage').get()
+        if doc.exists:
+            return doc.to_dict()
+        return None
+
+    def get_reservations(self, today):
+        """本日の未処理予約（states == 0）を全フィールドで返す"""
+        docs = self.db.collection('reservations').where('date', '==', today).where('states', '==', 0).get()
+        return [doc.to_dict() for doc in docs]
+
+    def get_reservation_times_page(self, today, current_time, limit, cursor=None):
+        """現在時刻以降の予約のTimeをTime順に最大limit件返す
+
+        戻り値は (Timeのリスト, 次ページ用のカーソル)
+        """
+        query = (
+            self.db.collection('reservations')
+            .where('date', '==', today)
+            .where('states', '==', 0)
+            .where('Time', '>=', current_time)
+            .order_by('Time')
+            .select(['Time'])
+            .limit(limit)
+        )
+        if cursor is not None:
+            query = query.start_after(cursor)
+        docs = query.get()
+        times = [doc.to_dict().get('Time', '') for doc in docs]
+        return times, (docs[-1] if docs else None)
+
+    def listen_population(self, callback):
+        """待ち人数ドキュメントを購読"""
+        return self.db.collection('now_population').document('signage').on_snapshot(callback)
+
+    def listen_reservations(self, today, callback):
+        """本日の未処理予約クエリを購読"""
+        query = self.db.collection('reservations').where('date', '==', today).where('states', '==', 0)
+        return query.on_snapshot(callback)
+
+
+class LocalSource(FirestoreSource):
+    """メモリ上のFirestore（local_firestore.py）による取得元
+
+    クエリと集計はFirestoreSourceと同じコードで実行する。キーファイルは不要。
+    """
+
+    name = 'local'
+    supports_listen = True
+    requires_key = False
+
+    def __init__(self, key_path=None, db=None):
+        from local_firestore import LocalFirestore
+
+        self.db = db if db is not None else LocalFirestore.from_config()
+
+
+def decode_value(value):
+    """REST APIの型付き値をPythonの値に変換"""
+    if 'stringValue' in value:
+        return value['stringValue']
+    if 'integerValue' in value:
+        return int(value['integerValue'])
+    if 'doubleValue' in value:
+        return float(value['doubleValue'])
+    if 'booleanValue' in value:
+        return value['booleanValue']
+    if 'mapValue' in value:
+        return decode_fields(value['mapValue'].get('fields', {}))
+    if 'arrayValue' in value:
+        return [decode_value(v) for v in value['arrayValue'].get('values', [])]
+    if 'timestampValue' in value:
+        return value['timestampValue']
+    return None
+
+
+def decode_fields(fields):
+    """REST APIのfieldsを辞書に変換"""
+    return {key: decode_value(value) for key, value in fields.items()}
+
+
+def field_filter(field, op, value):
+    """structuredQuery用のfieldFilterを作成"""
+    if isinstance(value, int):
+        typed = {'integerValue': str(value)}
+    else:
+        typed = {'stringValue': value}
+    return {'fieldFilter': {'field': {'fieldPath': field}, 'op': op, 'value': typed}}
+
+
+class RestFirestoreSource:
+    """Firestore REST APIによる軽量な取得元
+
+    1つのkeep-aliveセッションで接続を再利用し、アクセストークンは期限切れまでキャッシュする
+    """
+
+    name = 'rest'
+    supports_listen = False
+
+    def __init__(self, key_path):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from google.oauth2 import service_account
+
+        with open(key_path, 'r') as f:
+            self.project_id = json.load(f)['project_id']
+        self.credentials = service_account.Credentials.from_service_account_file(
+            key_path, scopes=[FIRESTORE_SCOPE]
+        )
+
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.documents_url = f"{FIRESTORE_URL}/projects/{self.project_id}/databases/(default)/documents"
+
+    def _headers(self):
+        """有効なアクセストークンのヘッダーを返す（期限切れの時だけ再取得）"""
+        if not self.credentials.valid:
+            from google.auth.transport.requests import Request
+            self.credentials.refresh(Request(self.session))
+        return {'Authorization': f"Bearer {self.credentials.token}"}
+
+    def _run_query(self, structured_query):
+        response = self.session.post(
+            f"{self.documents_url}:runQuery",
+            headers=self._headers(),
+            json={'structuredQuery': structured_query},
+            timeout=REQUEST_TIMEOUT,
+        )
+        response.raise_for_status()
+        return [row['document'] for row in response.json() if 'document' in row]
+
+    def _reservation_filters(self, today):
+        return [
+            field_filter('date', 'EQUAL', today),
+            field_filter('states', 'EQUAL', 0),
+        ]
+
+    def get_population(self):
+        """now_population/signageの内容を返す（存在しない場合はNone）"""
+        response = self.session.get(
+            f"{self.documents_url}/now_population/signage",
+            headers=self._headers(),
+            timeout=REQUEST_TIMEOUT,
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return decode_fields(response.json().get('fields', {}))
+
+    def get_reservations(self, today):
+        """本日の未処理予約（states == 0）を全フィールドで返す"""
+        documents = self._run_query({
+            'from': [{'collectionId': 'reservations'}],
+            'where': {'compositeFilter': {'op': 'AND', 'filters': self._reservation_filters(today)}},
+        })
+        return [decode_fields(doc.get('fields', {})) for doc in documents]
+
+    def get_reservation_times_page(self, today, current_time, limit, cursor=None):
+        """現在時刻以降の予約のTimeをTime順に最大limit件返す
+
+        戻り値は (Timeのリスト, 次ページ用のカーソル)
+        """
+        filters = self._reservation_filters(today) + [field_filter('Time', 'GREATER_THAN_OR_EQUAL', current_time)]
+        structured_query = {
+            'from': [{'collectionId': 'reservations'}],
+            'select': {'fields': [{'fieldPath': 'Time'}]},
+            'where': {'compositeFilter': {'op': 'AND', 'filters': filters}},
+            'orderBy': [
+                {'field': {'fieldPath': 'Time'}, 'direction': 'ASCENDING'},
+                {'field': {'fieldPath': '__name__'}, 'direction': 'ASCENDING'},
+            ],
+            'limit': limit,
+        }
+        if cursor is not None:
+            last_time, last_name = cursor
+            structured_query['startAt'] = {
+                'values': [{'stringValue': last_time}, {'referenceValue': last_name}],
+                'before': False,
+            }
+
+        documents = self._run_query(structured_query)
+        times = [decode_fields(doc.get('fields', {})).get('Time', '') for doc in documents]
+        next_cursor = (times[-1], documents[-1]['name']) if documents else None
+        return times, next_cursor
+
+
+# 取得元ごとの重いモジュール（起動中に先読みする）
+PRELOAD_MODULES = {
+    'grpc': ['firebase_admin', 'firebase_admin.credentials', 'firebase_admin.firestore'],
+    'rest': ['requests', 'google.oauth2.service_account', 'google.auth.transport.requests'],
+    'local': ['local_firestore'],
+}
+
+DATA_SOURCES = {
+    'grpc': FirestoreSource,
+    'rest': RestFirestoreSource,
+    'local': LocalSource,
+}
+
+
+def read_data_source_setting(directory='.'):
+    """設定（signage.jsonのdata_source、またはdatasource.txt）から取得元の名前を読み込み
+    （grpc: firebase_admin, rest: REST API, local: メモリ上）"""
+    return load_config(directory)['data_source']
+
+
+def preload_data_source(name):
+    """取得元が使うモジュールを先に読み込んでおく（起動中のバックグラウンド用）"""
+    for module_name in PRELOAD_MODULES.get(name, []):
+        importlib.import_module(module_name)
+
+
+def create_data_source(name, key_path='Firebase-key.json'):
+    """名前から取得元を作成（キーファイルが必要な取得元でファイルがない場合はNone）"""
+    if name not in DATA_SOURCES:
+        raise ValueError(f"不明な取得元です: {name}")
+    if getattr(DATA_SOURCES[name], 'requires_key', True) and not os.path.exists(key_path):
+        return None
+    return DATA_SOURCES[name](key_path)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""スーパーバイザー（supervisor.py）へのハートビート
+
+スーパーバイザーから起動された場合、環境変数で渡されたパイプに
+"名前 秒数" の1行を書き込み、次のハートビートまでの猶予を知らせる。
+    ui 10.0      Tkのmainloop（メインスレッド）
+    loop 10.0    イベントループ（core_loop.py）
+    data 100.0   データ取得・監視のタスク（次の取得までの待ち時間＋猶予）
+
+猶予を過ぎても次の行が届かなければ、スーパーバイザーは全スレッドのスタックを
+出力させてから再起動する。スーパーバイザーなしで起動した場合は何もしない。
+"""
+
+import faulthandler
+import logging
+import os
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_FD_ENV = 'SIGNAGE_HEARTBEAT_FD'
+STACK_DUMP_ENV = 'SIGNAGE_STACK_DUMP'
+# スーパーバイザーが起動してからの再起動の回数
+RESTARTS_ENV = 'SIGNAGE_RESTARTS'
+# ui・loopのハートビートの間隔と猶予（秒）
+HEARTBEAT_INTERVAL = 2
+HEARTBEAT_TIMEOUT = 10
+# スタックの出力を指示するシグナル（SIGUSR1はプロファイラーが使う）
+STACK_DUMP_SIGNAL = signal.SIGUSR2
+
+_heartbeat = None
+_heartbeat_lock = threading.Lock()
+_stack_file = None
+
+
+class Heartbeat:
+    """パイプにハートビートを書き込む（fdがNoneの場合は何もしない）"""
+
+    def __init__(self, fd=None):
+        self.fd = fd
+
+    @property
+    def enabled(self):
+        return self.fd is not None
+
+    def beat(self, name, within):
+        """within秒以内に次のハートビートを送ると知らせる（どのスレッドからでも呼べる）"""
+        if self.fd is None:
+            return
+        try:
+            # PIPE_BUF以下の書き込みは他のスレッドの行と混ざらない
+            os.write(self.fd, f"{name} {within:.1f}\n".encode('ascii'))
+        except BlockingIOError:
+            pass  # スーパーバイザーの読み込みが遅れている場合は捨てる（次の行で追いつく）
+        except OSError as e:
+            logger.warning(f"ハートビートを送れません: {e}")
+            self.fd = None
+
+
+def get_heartbeat():
+    """プロセスで共有するハートビート（環境変数にfdがなければ何もしない）"""
+    global _heartbeat
+    with _heartbeat_lock:
+        if _heartbeat is None:
+            try:
+                fd = int(os.environ[HEARTBEAT_FD_ENV])
+            except (KeyError, ValueError):
+                fd = None
+            _heartbeat = Heartbeat(fd)
+        return _heartbeat
+
+
+def enable_stack_dump(path=None):
+    """STACK_DUMP_SIGNALを受けたら全スレッドのスタックをpathに追記する"""
+    global _stack_file
+    path = path or os.environ.get(STACK_DUMP_ENV)
+    if not path or _stack_file is not None:
+        return
+    try:
+        _stack_file = open(path, 'a')
+        faulthandler.register(STACK_DUMP_SIGNAL, file=_stack_file, all_threads=True)
+    except (OSError, ValueError) as e:
+        logger.warning(f"スタック出力を設定できません: {e}")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""画面解像度に依存しないレイアウト
+
+LAYOUT_SPECは基準解像度（1080x1920）での配置を、画面の左右上下の端からの距離と
+フォントサイズで宣言する。起動時に実際の画面サイズと回転設定で一度だけ計算し、
+結果は解像度ごとにlayout_cache.jsonへ保存して次回以降は計算を省略する。
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_SIZE = (1080, 1920)
+LAYOUT_CACHE = 'layout_cache.json'
+
+# 回転設定ごとの配置（基準解像度でのピクセル、フォントはポイント）
+LAYOUT_SPEC = {
+    0: {
+        'clock': {'left': 50, 'top': 50, 'font': 80},
+        'wait': {'left': 650, 'top': 150, 'font': 128},
+        'slots': {'left': 200, 'top': 600, 'font': 111, 'gap': 8},
+        'stale': {'left': 50, 'bottom': 150, 'font': 32},
+    },
+    1: {
+        # 180度回転: 日時は右下、待ち人数は左下、予約は中央上部
+        'clock': {'right': 350, 'bottom': 150, 'font': 80},
+        'wait': {'left': 50, 'bottom': 350, 'font': 128},
+        'slots': {'left': 200, 'top': 200, 'font': 111, 'gap': 8},
+        'stale': {'left': 50, 'top': 50, 'font': 32},
+    },
+}
+
+# 仕様を変更した時にキャッシュを作り直すための識別子
+LAYOUT_VERSION = hashlib.sha1(json.dumps(LAYOUT_SPEC, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def layout_key(size, rotation):
+    return f"{size[0]}x{size[1]}_r{rotation}"
+
+
+def resolve_layout(size, rotation):
+    """画面サイズと回転設定から各表示項目の位置とフォントサイズを計算"""
+    width, height = size
+    scale = min(width / REFERENCE_SIZE[0], height / REFERENCE_SIZE[1])
+    spec = LAYOUT_SPEC.get(rotation, LAYOUT_SPEC[0])
+
+    layout = {'size': [width, height], 'scale': scale}
+    for name, item in spec.items():
+        if 'right' in item:
+            x = width - round(item['right'] * scale)
+        else:
+            x = round(item.get('left', 0) * scale)
+        if 'bottom' in item:
+            y = height - round(item['bottom'] * scale)
+        else:
+            y = round(item.get('top', 0) * scale)
+        resolved = {'x': x, 'y': y, 'font': max(8, round(item['font'] * scale))}
+        if 'gap' in item:
+            resolved['gap'] = round(item['gap'] * scale)
+        layout[name] = resolved
+    return layout
+
+
+def read_layout_cache(path=LAYOUT_CACHE):
+    try:
+        with open(path, 'r') as f:
+            cache = json.load(f)
+        if cache.get('version') == LAYOUT_VERSION:
+            return cache
+    except (OSError, ValueError):
+        pass
+    return {'version': LAYOUT_VERSION, 'layouts': {}}
+
+
+def load_layout(size, rotation, path=LAYOUT_CACHE):
+    """解像度ごとにキャッシュしたレイアウトを返す（初めての解像度では計算して保存）"""
+    cache = read_layout_cache(path)
+    key = layout_key(size, rotation)
+    if key in cache['layouts']:
+        return cache['layouts'][key]
+
+    layout = resolve_layout(size, rotation)
+    cache['layouts'][key] = layout
+    try:
+        with open(path + '.tmp', 'w') as f:
+            json.dump(cache, f, indent=2)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        logger.warning(f"レイアウトキャッシュ保存エラー: {e}")
+    return layout
+
+
+def known_screen_sizes(path=LAYOUT_CACHE):
+    """これまでに使われた画面サイズ（アセットパックの作成対象）"""
+    sizes = {tuple(layout['size']) for layout in read_layout_cache(path)['layouts'].values()}
+    return sorted(sizes)
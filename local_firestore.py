@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""ネットワークなしで動くFirestoreの代替（開発・負荷試験・CI用）
+
+サイネージが使うFirestore APIの一部だけを実装する。
+    collection().document().get() / set() / update() / delete() / on_snapshot()
+    collection().where().where().order_by().select().limit().start_after().get() / on_snapshot()
+
+データはJSONのフィクスチャまたは生成した大量の予約で用意し、呼び出しごとの遅延と
+エラーを注入できる。datasource.txtに local と書くとこの取得元を使う。
+
+local_firestore.jsonの例:
+    {
+        "fixture": "fixtures/local_firestore.json",
+        "synthetic_reservations": 3000,
+        "latency_ms": 80,
+        "latency_jitter_ms": 40,
+        "error_rate": 0.05,
+        "seed": 1
+    }
+
+フィクスチャの日付には "$today" や "$today+1" を書ける（読み込んだ日の日付に置き換える）。
+"""
+
+import copy
+import enum
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = 'local_firestore.json'
+# 設定ファイルがない場合に生成する予約数（本日と翌日の合計）
+DEFAULT_SYNTHETIC_RESERVATIONS = 60
+
+OPERATORS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    'in': lambda a, b: a in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+class LocalFirestoreError(Exception):
+    """注入したエラー（ネットワーク障害やサーバーエラーの代わり）"""
+
+
+class ChangeType(enum.Enum):
+    ADDED = 1
+    MODIFIED = 2
+    REMOVED = 3
+
+
+class DocumentChange:
+    def __init__(self, change_type, document):
+        self.type = change_type
+        self.document = document
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class Watch:
+    """on_snapshotの購読（unsubscribeで解除）"""
+
+    def __init__(self, db):
+        self.db = db
+        self.is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+        self.db.remove_watch(self)
+
+
+class DocumentReference:
+    def __init__(self, db, collection, doc_id):
+        self.db = db
+        self.collection_name = collection
+        self.id = doc_id
+
+    def get(self):
+        self.db.simulate_call()
+        return DocumentSnapshot(self, self.db.read_document(self.collection_name, self.id))
+
+    def set(self, data):
+        self.db.write(self.collection_name, self.id, copy.deepcopy(data))
+
+    def update(self, data):
+        current = self.db.read_document(self.collection_name, self.id)
+        if current is None:
+            raise LocalFirestoreError(f"ドキュメントが存在しません: {self.collection_name}/{self.id}")
+        current.update(copy.deepcopy(data))
+        self.db.write(self.collection_name, self.id, current)
+
+    def delete(self):
+        self.db.write(self.collection_name, self.id, None)
+
+    def on_snapshot(self, callback):
+        return self.db.add_watch(DocumentTarget(self), callback)
+
+
+class Query:
+    """where・order_by・select・limit・start_afterを連ねて使う（元のクエリは変更しない）"""
+
+    def __init__(self, db, collection, filters=(), orders=(), fields=None, limit_count=None, cursor=None):
+        self.db = db
+        self.collection_name = collection
+        self.filters = tuple(filters)
+        self.orders = tuple(orders)
+        self.fields = fields
+        self.limit_count = limit_count
+        self.cursor = cursor
+
+    def _copy(self, **changes):
+        values = dict(filters=self.filters, orders=self.orders, fields=self.fields,
+                      limit_count=self.limit_count, cursor=self.cursor)
+        values.update(changes)
+        return Query(self.db, self.collection_name, **values)
+
+    def where(self, field, op, value):
+        if op not in OPERATORS:
+            raise ValueError(f"未対応の演算子です: {op}")
+        return self._copy(filters=self.filters + ((field, op, value),))
+
+    def order_by(self, field, direction='ASCENDING'):
+        return self._copy(orders=self.orders + ((field, direction),))
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def start_after(self, snapshot):
+        return self._copy(cursor=snapshot)
+
+    def sort_key(self, doc_id, data):
+        # フィールドがないドキュメントは先頭に並べる（Noneと値の比較を避ける）
+        values = tuple((0, '') if data.get(field) is None else (1, data[field]) for field, _ in self.orders)
+        return values + (doc_id,)
+
+    def matches(self, data):
+        for field, op, value in self.filters:
+            if field not in data or not OPERATORS[op](data[field], value):
+                return False
+        return True
+
+    def run(self, documents):
+        """ドキュメントの辞書 {ID: データ} にクエリを適用して [(ID, データ)] を返す"""
+        results = [(doc_id, data) for doc_id, data in documents.items() if self.matches(data)]
+        results.sort(key=lambda item: self.sort_key(*item))
+        if self.orders and self.orders[0][1] == 'DESCENDING':
+            results.reverse()
+        if self.cursor is not None:
+            cursor_key = self.sort_key(self.cursor.id, self.db.read_document(self.collection_name, self.cursor.id)
+                                       or self.cursor.to_dict() or {})
+            results = [item for item in results if self.sort_key(*item) > cursor_key]
+        if self.limit_count is not None:
+            results = results[:self.limit_count]
+        if self.fields is not None:
+            results = [(doc_id, {f: data[f] for f in self.fields if f in data}) for doc_id, data in results]
+        return results
+
+    def get(self):
+        self.db.simulate_call()
+        documents = self.db.read_collection(self.collection_name)
+        return [DocumentSnapshot(DocumentReference(self.db, self.collection_name, doc_id), data)
+                for doc_id, data in self.run(documents)]
+
+    def stream(self):
+        return iter(self.get())
+
+    def on_snapshot(self, callback):
+        return self.db.add_watch(QueryTarget(self), callback)
+
+
+class CollectionReference(Query):
+    def __init__(self, db, name):
+        super().__init__(db, name)
+        self.id = name
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            doc_id = self.db.new_id()
+        return DocumentReference(self.db, self.collection_name, doc_id)
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+
+class DocumentTarget:
+    """ドキュメント1件の購読対象"""
+
+    def __init__(self, reference):
+        self.reference = reference
+        self.collection_name = reference.collection_name
+
+    def evaluate(self, db):
+        data = db.read_document(self.collection_name, self.reference.id)
+        return {self.reference.id: data} if data is not None else {}
+
+
+class QueryTarget:
+    """クエリ結果の購読対象"""
+
+    def __init__(self, query):
+        self.query = query
+        self.collection_name = query.collection_name
+
+    def evaluate(self, db):
+        return dict(self.query.run(db.read_collection(self.collection_name)))
+
+
+class LocalFirestore:
+    """メモリ上のFirestore"""
+
+    def __init__(self, latency=0.0, latency_jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.RLock()
+        self.collections = {}   # コレクション名 -> {ID: データ}
+        self.watches = []       # [Watch, 対象, コールバック, 前回の結果, 初回通知済みか]
+        self.pending_errors = []
+        self.calls = 0
+        self.id_counter = 0
+        self.events = queue.Queue()
+        self.delivery_thread = None
+
+    @classmethod
+    def from_config(cls, path=CONFIG_PATH):
+        """local_firestore.jsonの設定でデータを用意（ない場合は少量の生成データ）"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            config = {'synthetic_reservations': DEFAULT_SYNTHETIC_RESERVATIONS}
+        db = cls(
+            latency=config.get('latency_ms', 0) / 1000,
+            latency_jitter=config.get('latency_jitter_ms', 0) / 1000,
+            error_rate=config.get('error_rate', 0.0),
+            seed=config.get('seed'),
+        )
+        if config.get('fixture'):
+            db.load_fixture(config['fixture'])
+        if config.get('synthetic_reservations'):
+            db.seed_synthetic(config['synthetic_reservations'])
+        return db
+
+    # --- 遅延とエラーの注入 ---
+
+    def fail_next(self, count=1, message='注入したエラー'):
+        """次のcount回の読み取りを失敗させる"""
+        with self.lock:
+            self.pending_errors.extend([message] * count)
+
+    def simulate_call(self):
+        """読み取り1回分の遅延とエラー"""
+        with self.lock:
+            self.calls += 1
+            pending = self.pending_errors.pop(0) if self.pending_errors else None
+            delay = self.latency + self.rng.uniform(0, self.latency_jitter) if self.latency_jitter else self.latency
+            fail = pending is None and self.error_rate and self.rng.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if pending is not None:
+            raise LocalFirestoreError(pending)
+        if fail:
+            raise LocalFirestoreError('注入したエラー（ランダム）')
+
+    # --- データ ---
+
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def new_id(self):
+        with self.lock:
+            self.id_counter += 1
+            return f"local{self.id_counter:08d}"
+
+    def read_document(self, collection, doc_id):
+        with self.lock:
+            data = self.collections.get(collection, {}).get(doc_id)
+            return copy.deepcopy(data) if data is not None else None
+
+    def read_collection(self, collection):
+        with self.lock:
+            return dict(self.collections.get(collection, {}))
+
+    def write(self, collection, doc_id, data):
+        """ドキュメントを書き込み（Noneで削除）して購読者に通知"""
+        with self.lock:
+            documents = self.collections.setdefault(collection, {})
+            if data is None:
+                documents.pop(doc_id, None)
+            else:
+                documents[doc_id] = data
+            self.notify(collection)
+
+    def load_fixture(self, path, today=None):
+        """JSONのフィクスチャ {コレクション名: {ID: データ}} を読み込み"""
+        with open(path, 'r', encoding='utf-8') as f:
+            fixture = json.load(f)
+        today = today or datetime.now()
+        with self.lock:
+            for collection, documents in fixture.items():
+                for doc_id, data in documents.items():
+                    self.collections.setdefault(collection, {})[doc_id] = resolve_dates(data, today)
+                self.notify(collection)
+
+    def seed_synthetic(self, count, today=None, days=2, open_time='09:00', close_time='21:00', interval_minutes=15):
+        """営業時間内の時間帯に予約をcount件生成（本日からdays日分、約1割は処理済み）"""
+        today = today or datetime.now()
+        start = datetime.strptime(open_time, '%H:%M')
+        end = datetime.strptime(close_time, '%H:%M')
+        slots = []
+        while start < end:
+            slots.append(start.strftime('%H:%M'))
+            start += timedelta(minutes=interval_minutes)
+        with self.lock:
+            documents = self.collections.setdefault('reservations', {})
+            for i in range(count):
+                date = (today + timedelta(days=i % days)).strftime('%Y-%m-%d')
+                documents[f"synthetic{i:06d}"] = {
+                    'date': date,
+                    'Time': self.rng.choice(slots),
+                    'states': 1 if self.rng.random() < 0.1 else 0,
+                    'name': f"予約{i}",
+                }
+            self.collections.setdefault('now_population', {}).setdefault('signage', {'now': self.rng.randint(0, 10)})
+            self.notify('reservations')
+            self.notify('now_population')
+
+    # --- 購読 ---
+
+    def add_watch(self, target, callback):
+        watch = Watch(self)
+        with self.lock:
+            entry = [watch, target, callback, {}, False]
+            self.watches.append(entry)
+            self.queue_changes(entry)
+        self.start_delivery()
+        return watch
+
+    def remove_watch(self, watch):
+        with self.lock:
+            self.watches = [entry for entry in self.watches if entry[0] is not watch]
+
+    def notify(self, collection):
+        for entry in self.watches:
+            if entry[1].collection_name == collection:
+                self.queue_changes(entry)
+
+    def queue_changes(self, entry):
+        """前回の結果との差分を通知用のキューに積む（lockを保持して呼ぶ）"""
+        watch, target, callback, previous, initialized = entry
+        current = target.evaluate(self)
+        changes = []
+        for doc_id, data in current.items():
+            if doc_id not in previous:
+                changes.append((ChangeType.ADDED, doc_id, data))
+            elif previous[doc_id] != data:
+                changes.append((ChangeType.MODIFIED, doc_id, data))
+        for doc_id, data in previous.items():
+            if doc_id not in current:
+                changes.append((ChangeType.REMOVED, doc_id, data))
+        # 本物と同じく購読の開始時は変更がなくても1回通知する
+        if changes or not initialized:
+            entry[3] = copy.deepcopy(current)
+            entry[4] = True
+            self.events.put((watch, target, callback, current, changes))
+
+    def start_delivery(self):
+        # 本物と同じく通知は別スレッドから呼ぶ
+        with self.lock:
+            if self.delivery_thread is None:
+                self.delivery_thread = threading.Thread(target=self.deliver, daemon=True)
+                self.delivery_thread.start()
+
+    def deliver(self):
+        while True:
+            watch, target, callback, current, changes = self.events.get()
+            try:
+                if watch.is_active:
+                    collection = target.collection_name
+                    reference = lambda doc_id: DocumentReference(self, collection, doc_id)
+                    if isinstance(target, DocumentTarget):
+                        docs = [DocumentSnapshot(target.reference, current.get(target.reference.id))]
+                    else:
+                        docs = [DocumentSnapshot(reference(doc_id), data) for doc_id, data in current.items()]
+                    document_changes = [
+                        DocumentChange(change_type, DocumentSnapshot(reference(doc_id), data))
+                        for change_type, doc_id, data in changes
+                    ]
+                    callback(docs, document_changes, datetime.now())
+            except Exception as e:
+                logger.error(f"購読の通知エラー: {e}")
+            finally:
+                self.events.task_done()
+
+    def flush(self):
+        """積まれている通知をすべて配信し終わるまで待つ（テスト用）"""
+        self.events.join()
+
+
+def resolve_dates(value, today):
+    """"$today" / "$today+N" / "$today-N" を日付の文字列に置き換え"""
+    if isinstance(value, dict):
+        return {key: resolve_dates(item, today) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_dates(item, today) for item in value]
+    if isinstance(value, str) and value.startswith('$today'):
+        offset = int(value[len('$today'):] or 0)
+        return (today + timedelta(days=offset)).strftime('%Y-%m-%d')
+    return value
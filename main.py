@@ -2,11 +2,33 @@
 # -*- coding: utf-8 -*-
 
 import os
-import sys
-import subprocess
+import json
+import logging
 import time
 import threading
-from pathlib import Path
+import asyncio
+import functools
+import importlib
+import tkinter as tk
+
+from asset_pack import build_pack, target_sizes
+from connectivity import check_connectivity_async
+from control_socket import ControlServer
+from core_loop import get_core_loop
+from data_sources import preload_data_source, read_data_source_setting
+from heartbeat import HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, RESTARTS_ENV, enable_stack_dump, get_heartbeat
+from profiler import install_signal_handler
+from signage_log import dump_recent_log, setup_logging
+
+logger = logging.getLogger(__name__)
+
+# プロセス開始時刻（起動フェーズの計測用）
+BOOT_START = time.monotonic()
+
+# 接続確認のリトライ回数
+CONNECT_ATTEMPTS = 30
+# モジュールの先読み・アセットパックの作成を打ち切るまでの秒数
+PRELOAD_TIMEOUT = 300
 
 def read_setup_status():
     """setup.txtから設定状況を読み取り"""
@@ -19,81 +41,222 @@ def read_setup_status():
             f.write('0')
         return 0
 
-def check_internet_connection():
-    """インターネット接続をチェック"""
+def read_uptime():
+    """電源投入からの経過秒数（取得できない場合はNone）"""
     try:
-        import requests
-        response = requests.get('https://www.google.com', timeout=5)
-        return response.status_code == 200
+        with open('/proc/uptime', 'r') as f:
+            return float(f.read().split()[0])
     except:
-        return False
+        return None
 
-def main():
-    # 必要なファイルの存在確認
-    required_files = ['setup.txt', 'rotate.txt']
-    for file in required_files:
-        if not os.path.exists(file):
-            if file == 'setup.txt':
-                with open(file, 'w') as f:
-                    f.write('0')
-            elif file == 'rotate.txt':
+class BootController:
+    """1つのプロセス・1つのTkウィンドウで 接続確認 → 初期設定 → サイネージ と遷移する"""
+
+    def __init__(self):
+        self.state = None
+        self.phase_times = {}
+
+        # 必要なファイルの存在確認
+        for file in ['setup.txt', 'rotate.txt']:
+            if not os.path.exists(file):
                 with open(file, 'w') as f:
                     f.write('0')
-    
-    setup_status = read_setup_status()
-    
-    if setup_status == 0:
-        # 初回起動 - 初期設定プログラムを実行
-        print("初回起動：初期設定プログラムを実行します")
-        subprocess.run([sys.executable, 'setup_window.py'])
-    else:
-        # 2回目以降 - Wi-Fi接続チェック後サイネージ表示
-        print("起動中...")
-        
-        # 接続確認ウィンドウを表示
-        import tkinter as tk
-        from tkinter import ttk
-        
-        root = tk.Tk()
-        root.geometry("1080x1920")
-        root.title("システム起動中")
-        root.attributes('-fullscreen', True)
-        root.configure(bg='black')
-        
-        # メッセージ表示
-        message_label = tk.Label(
-            root, 
-            text="起動中...\nネットワーク接続を確認しています...", 
-            font=('Arial', 24, 'bold'), 
-            fg='white', 
+        self.setup_status = read_setup_status()
+
+        self.root = tk.Tk()
+        self.screen_size = (self.root.winfo_screenwidth(), self.root.winfo_screenheight())
+        self.root.geometry(f"{self.screen_size[0]}x{self.screen_size[1]}")
+        self.root.title("システム起動中")
+        self.root.attributes('-fullscreen', True)
+        self.root.configure(bg='black')
+        self.mark_phase('window')
+
+        # 先読み・接続確認・操作用ソケットは共有のイベントループで動かす
+        self.core = get_core_loop()
+
+        # 操作用ソケット（状態に関係なく応答し、サイネージ表示中は操作コマンドも受け付ける）
+        self.control = ControlServer(core=self.core)
+        self.control.register('ping', self.ping)
+        self.control.register('dump-log', dump_recent_log)
+        self.control.start()
+
+        # スーパーバイザーへのハートビート（mainloopとイベントループがそれぞれ動いていることを知らせる）
+        self.heartbeat = get_heartbeat()
+        if self.heartbeat.enabled:
+            self.root.after(0, self.beat_ui)
+            self.core.spawn('heartbeat', self.beat_loop)
+
+        self.connected = None
+        self.attempt = 0
+        self.preload_done = threading.Event()
+        self.start_preload()
+
+    def ping(self):
+        """操作用ソケットの応答（現在の状態を返す）"""
+        return {
+            'pid': os.getpid(),
+            'state': self.state,
+            'uptime': round(time.monotonic() - BOOT_START, 1),
+            'restarts': int(os.environ.get(RESTARTS_ENV, 0)),
+        }
+
+    def beat_ui(self):
+        """mainloopが動いていることをスーパーバイザーに知らせる"""
+        self.heartbeat.beat('ui', HEARTBEAT_TIMEOUT)
+        self.root.after(HEARTBEAT_INTERVAL * 1000, self.beat_ui)
+
+    async def beat_loop(self):
+        """イベントループが動いていることをスーパーバイザーに知らせる"""
+        while True:
+            self.heartbeat.beat('loop', HEARTBEAT_TIMEOUT)
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    def mark_phase(self, name):
+        """起動フェーズの経過時間を記録"""
+        elapsed = time.monotonic() - BOOT_START
+        self.phase_times[name] = round(elapsed, 3)
+        uptime = read_uptime()
+        uptime_text = f" (電源投入から {uptime:.1f}s)" if uptime is not None else ""
+        logger.info(f"[起動] {name}: {elapsed:.2f}s{uptime_text}")
+
+    def save_phase_times(self):
+        """起動フェーズの計測結果をboot_times.logに1行追記"""
+        try:
+            record = {
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'uptime': read_uptime(),
+                'phases': self.phase_times,
+            }
+            with open('boot_times.log', 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except Exception as e:
+            logger.error(f"起動時間の記録エラー: {e}")
+
+    def start_preload(self):
+        """画面表示中に重いモジュールをバックグラウンドで読み込み"""
+        self.core.spawn('preload', self.preload)
+
+    async def preload(self):
+        try:
+            # SDKの初期化は応答が返らないことがあるため共有のスレッドプールを使わない
+            await self.core.run_isolated(importlib.import_module, 'signage_display', timeout=PRELOAD_TIMEOUT)
+            await self.core.run_isolated(preload_data_source, read_data_source_setting(), timeout=PRELOAD_TIMEOUT)
+        except Exception as e:
+            logger.error(f"モジュール先読みエラー: {e}")
+        self.preload_done.set()
+        self.mark_phase('preload')
+
+        try:
+            # 初回起動時や背景画像の差し替え後は加工済みフレームを作成（表示の開始は待たせない）
+            await self.core.run_isolated(
+                functools.partial(build_pack, sizes=target_sizes(self.screen_size)), timeout=PRELOAD_TIMEOUT
+            )
+        except Exception as e:
+            logger.error(f"アセットパック作成エラー: {e}")
+
+    def clear_window(self):
+        """前の画面のウィジェットを破棄"""
+        for widget in self.root.winfo_children():
+            widget.destroy()
+
+    def enter_check(self):
+        """接続確認状態"""
+        self.state = 'check'
+        self.mark_phase('check')
+        self.message_label = tk.Label(
+            self.root,
+            text="起動中...\nネットワーク接続を確認しています...",
+            font=('Arial', 24, 'bold'),
+            fg='white',
             bg='black'
         )
-        message_label.place(relx=0.5, rely=0.5, anchor='center')
-        
-        root.update()
-        
-        # Wi-Fi接続確認（最大30秒間リトライ）
-        connected = False
-        for attempt in range(30):
-            if check_internet_connection():
-                connected = True
-                break
-            time.sleep(1)
-            message_label.config(text=f"起動中...\nネットワーク接続を確認しています...({attempt+1}/30)")
-            root.update()
-        
-        root.destroy()
-        
-        if connected:
+        self.message_label.place(relx=0.5, rely=0.5, anchor='center')
+
+        self.core.spawn('check', self.check_connection)
+        self.root.after(200, self.poll_check)
+
+    async def check_connection(self):
+        """Wi-Fi接続確認（最大30回リトライ）"""
+        for attempt in range(CONNECT_ATTEMPTS):
+            if await check_connectivity_async():
+                self.connected = True
+                return
+            await asyncio.sleep(1)
+            self.attempt = attempt + 1
+        self.connected = False
+
+    def poll_check(self):
+        """接続確認の結果をメインスレッドで確認"""
+        if self.connected is None:
+            if self.attempt:
+                self.message_label.config(
+                    text=f"起動中...\nネットワーク接続を確認しています...({self.attempt}/{CONNECT_ATTEMPTS})"
+                )
+            self.root.after(200, self.poll_check)
+            return
+
+        self.mark_phase('connectivity')
+        if self.connected:
             # 接続成功 - setup.txtの値を+1してサイネージ表示
             with open('setup.txt', 'w') as f:
-                f.write(str(setup_status + 1))
-            print("ネットワーク接続確認完了：サイネージプログラムを実行します")
-            subprocess.run([sys.executable, 'signage_display.py'])
+                f.write(str(self.setup_status + 1))
+            logger.info("ネットワーク接続確認完了：サイネージを表示します")
+            self.enter_signage()
         else:
-            # 接続失敗 - 初期設定ウィンドウを表示
-            print("ネットワーク接続失敗：初期設定プログラムを実行します")
-            subprocess.run([sys.executable, 'setup_window.py'])
+            # 接続失敗 - 初期設定画面を表示
+            logger.warning("ネットワーク接続失敗：初期設定画面を表示します")
+            self.enter_setup()
+
+    def enter_setup(self):
+        """初期設定状態"""
+        from setup_window import SetupWindow
+
+        self.state = 'setup'
+        self.clear_window()
+        self.mark_phase('setup')
+        self.setup = SetupWindow(root=self.root, on_complete=self.enter_signage)
+
+    def enter_signage(self):
+        """サイネージ表示状態"""
+        if self.state == 'signage':
+            return
+        self.state = 'signage'
+        self.clear_window()
+        # 初期設定画面の最前面指定を解除
+        self.root.attributes('-topmost', False)
+
+        # 先読みが終わっていなければ待つ（通常は接続確認中に完了している）
+        self.preload_done.wait()
+        from signage_display import SignageDisplay
+
+        self.mark_phase('signage')
+        self.signage = SignageDisplay(root=self.root, control=self.control)
+        self.root.update_idletasks()
+        self.root.after_idle(self.on_first_frame)
+
+    def on_first_frame(self):
+        """サイネージの初回描画完了"""
+        self.mark_phase('first_frame')
+        self.save_phase_times()
+
+    def run(self):
+        """起動処理を開始"""
+        if self.setup_status == 0:
+            # 初回起動 - 初期設定画面を表示
+            logger.info("初回起動：初期設定画面を表示します")
+            self.root.after(0, self.enter_setup)
+        else:
+            # 2回目以降 - Wi-Fi接続チェック後サイネージ表示
+            logger.info("起動中...")
+            self.root.after(0, self.enter_check)
+
+        self.root.mainloop()
+
+def main():
+    setup_logging()
+    enable_stack_dump()
+    install_signal_handler()
+    BootController().run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""動作状況の計測（カウンターとヒストグラム）と、Prometheus形式での公開
+
+    curl http://127.0.0.1:9105/metrics
+
+公開用のHTTPサーバーは共有のイベントループ（core_loop）上で動き、
+誰も取得しない間は処理が発生しない。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from core_loop import get_core_loop
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9105
+# 1回のリクエストの読み書きを待つ秒数
+REQUEST_TIMEOUT = 5
+# レイテンシのヒストグラムの区切り（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """カウンター・ヒストグラムを保持し、Prometheusのテキスト形式で出力する"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.counters = {}    # 名前 -> {ラベル: 値}
+        self.histograms = {}  # 名前 -> {ラベル: [区切りごとの件数, 合計, 件数]}
+        self.collectors = []  # 出力時に呼ぶ関数（[(名前, ラベル, 値), ...] を返す）
+
+    def inc(self, name, value=1, **labels):
+        """カウンターを加算"""
+        key = label_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """ヒストグラムに値を記録"""
+        key = label_key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            entry = series.get(key)
+            if entry is None:
+                entry = series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """with文の中の処理時間をヒストグラムに記録"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def add_collector(self, collect):
+        """出力時に現在値を返すゲージを追加（キューの長さやキャッシュ使用量など）"""
+        self.collectors.append(collect)
+
+    def counter_value(self, name, **labels):
+        with self.lock:
+            return self.counters.get(name, {}).get(label_key(labels), 0)
+
+    def histogram_count(self, name, **labels):
+        with self.lock:
+            entry = self.histograms.get(name, {}).get(label_key(labels))
+            return entry[2] if entry else 0
+
+    def render(self):
+        """Prometheusのテキスト形式で出力"""
+        lines = []
+        with self.lock:
+            for name in sorted(self.counters):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self.counters[name].items()):
+                    lines.append(f"{name}{format_labels(key)} {format_value(value)}")
+
+            for name in sorted(self.histograms):
+                lines.append(f"# TYPE {name} histogram")
+                for key, (bucket_counts, total, count) in sorted(self.histograms[name].items()):
+                    for bound, bucket_count in zip(self.buckets, bucket_counts):
+                        lines.append(f"{name}_bucket{format_labels(key, [('le', format_value(bound))])} {bucket_count}")
+                    lines.append(f"{name}_bucket{format_labels(key, [('le', '+Inf')])} {count}")
+                    lines.append(f"{name}_sum{format_labels(key)} {format_value(total)}")
+                    lines.append(f"{name}_count{format_labels(key)} {count}")
+
+        gauges = {}
+        for collect in self.collectors:
+            try:
+                for name, labels, value in collect():
+                    gauges.setdefault(name, []).append((label_key(labels), value))
+            except Exception as e:
+                lines.append(f"# 収集エラー: {e}")
+        for name in sorted(gauges):
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in gauges[name]:
+                lines.append(f"{name}{format_labels(key)} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """GET /metrics に計測値を返すHTTPサーバー（共有のイベントループ上で動く）"""
+
+    def __init__(self, registry, core):
+        self.registry = registry
+        self.core = core
+        self.server = None
+
+    @property
+    def server_address(self):
+        return self.server.sockets[0].getsockname()
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+            # ヘッダーは使わないので空行まで読み飛ばす
+            while True:
+                line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status = '200 OK'
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                body = self.registry.render().encode('utf-8')
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain; charset=utf-8', b'not found\n'
+            header = (
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+            )
+            writer.write(header.encode('latin-1') + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, OSError):
+            pass  # 取得側の切断・無応答は無視
+        finally:
+            writer.close()
+
+    def server_close(self):
+        if self.server is not None:
+            self.server.close()
+            self.core.submit(self.server.wait_closed()).result(REQUEST_TIMEOUT)
+            self.server = None
+
+
+def start_metrics_server(registry, host=METRICS_HOST, port=METRICS_PORT, core=None):
+    """localhostで計測値を公開（起動できない場合はNone）"""
+    metrics_server = MetricsServer(registry, core or get_core_loop())
+    try:
+        # 接続が来るまで処理は発生しない（取得側がいない間はイベントループが起きない）
+        metrics_server.server = metrics_server.core.submit(
+            asyncio.start_server(metrics_server.handle, host, port)
+        ).result(REQUEST_TIMEOUT)
+    except OSError as e:
+        logger.warning(f"計測値の公開を開始できません: {e}")
+        return None
+    logger.info(f"計測値を公開: http://{host}:{metrics_server.server_address[1]}/metrics")
+    return metrics_server
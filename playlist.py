@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""背景画像のプレイリスト
+
+playlist.jsonの例:
+    {
+        "default_duration": 3600,
+        "crossfade_seconds": 1.5,
+        "items": [
+            {"image": "1.png", "duration": 1800},
+            {"image": "2.png"}
+        ],
+        "rules": [
+            {"start": "11:00", "end": "14:00", "images": ["5.png", {"image": "6.png", "duration": 600}]}
+        ]
+    }
+
+rulesは時刻帯ごとに表示する画像を指定する（最初に一致したものを使用）。
+playlist.jsonがない場合は従来通り1時間ごとに (時 % 10) + 1 番目の画像を表示する。
+"""
+
+import json
+import logging
+import time
+from datetime import timedelta
+from PIL import Image
+
+from background import IMAGE_COUNT
+
+logger = logging.getLogger(__name__)
+
+# クロスフェードのフレームレート（UIの反映間隔に合わせる）
+FADE_FPS = 10
+
+
+class Playlist:
+    """次に表示する背景画像と表示時間を決める"""
+
+    def __init__(self, items=None, rules=None, default_duration=3600, crossfade_seconds=0.0):
+        self.default_duration = default_duration
+        self.items = [self.normalize(item) for item in (items or [])]
+        self.rules = [
+            {'start': rule['start'], 'end': rule['end'], 'images': [self.normalize(item) for item in rule['images']]}
+            for rule in (rules or [])
+        ]
+        self.crossfade_seconds = crossfade_seconds
+        self.position = -1
+        self.active_key = None
+
+    @classmethod
+    def load(cls, path='playlist.json'):
+        """playlist.jsonを読み込み（ない場合は従来の1時間ごとのローテーション）"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        except Exception as e:
+            logger.error(f"プレイリスト読み込みエラー: {e}")
+            return cls()
+        return cls.from_config(config)
+
+    @classmethod
+    def from_config(cls, config):
+        """playlist.jsonと同じ形式の辞書（signage.jsonのplaylist）から作成"""
+        return cls(
+            items=config.get('items'),
+            rules=config.get('rules'),
+            default_duration=config.get('default_duration', 3600),
+            crossfade_seconds=config.get('crossfade_seconds', 0.0),
+        )
+
+    def normalize(self, item):
+        """"1.png" または {"image": ..., "duration": ...} を辞書にそろえる"""
+        if isinstance(item, str):
+            return {'image': item, 'duration': self.default_duration}
+        return {'image': item['image'], 'duration': item.get('duration', self.default_duration)}
+
+    def active_entries(self, now):
+        """現在の時刻帯に表示する画像の一覧（日付をまたぐ時刻帯にも対応）"""
+        current = now.strftime("%H:%M")
+        for index, rule in enumerate(self.rules):
+            start, end = rule['start'], rule['end']
+            if start <= end:
+                matched = start <= current < end
+            else:
+                matched = current >= start or current < end
+            if matched:
+                return ('rule', index), rule['images']
+        return ('items', None), self.items
+
+    def next_entry(self, now):
+        """nowから表示する (画像ファイル名, 表示秒数)"""
+        key, entries = self.active_entries(now)
+        if not entries:
+            # 従来通り時刻で選び、次の正時に切り替える
+            image = f"{(now.hour % IMAGE_COUNT) + 1}.png"
+            next_hour = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            return image, (next_hour - now).total_seconds()
+
+        # 時刻帯が変わったら先頭から表示
+        if key != self.active_key:
+            self.active_key = key
+            self.position = -1
+        self.position = (self.position + 1) % len(entries)
+        entry = entries[self.position]
+        return entry['image'], entry['duration']
+
+
+def run_crossfade(front, back, seconds, submit, fps=FADE_FPS, clock=time.monotonic, sleep=time.sleep):
+    """frontからbackへのクロスフェードのフレームを合成して順にsubmitする（ワーカースレッド用）
+
+    合成にはImage.blend（C実装の一括演算）を使い、不透明度は経過時間から決めるため、
+    合成がフレーム間隔に間に合わない場合はフレームを間引いて時間内に終える。
+    作成したフレーム数を返す。
+    """
+    if front is None or front.size != back.size or front.mode != back.mode or seconds <= 0:
+        submit(back)
+        return 0
+
+    interval = 1.0 / fps
+    start = clock()
+    frames = 0
+    while True:
+        alpha = (clock() - start) / seconds
+        if alpha >= 1.0:
+            break
+        submit(Image.blend(front, back, alpha))
+        frames += 1
+        # 次のフレーム時刻まで待つ（遅れている場合は待たない）
+        wait = start + frames * interval - clock()
+        if wait > 0:
+            sleep(wait)
+    submit(back)
+    return frames
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""SIGUSR1で開始するサンプリングプロファイラー
+
+    ./system_control.sh profile        # 設定のprofile_seconds（既定30秒）だけ計測
+    ./system_control.sh profile 120    # 120秒計測（設定に保存）
+    kill -USR1 <pid>                   # 計測中にもう一度送ると途中で終了
+
+計測中は全スレッドのスタックを一定間隔で取得し、終了時に次の2つを書き出す。
+- profiles/profile-YYYYmmdd-HHMMSS.folded
+    flamegraph.pl・speedscopeで読める折りたたみ形式（"スレッド;[区間];関数 (ファイル);... 回数"）
+- profiles/profile-YYYYmmdd-HHMMSS.spans.json
+    取得（fetch）・集計（aggregate）・描画（render）・背景の読み込み（background_load）の
+    区間ごとの回数と所要時間
+
+区間はspan()で囲む。計測していない間のspan()は何もしない共有のコンテキストを返すだけで、
+時刻の取得や記録は行わない。
+"""
+
+import contextlib
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+from signage_config import DEFAULTS, load_config
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = 'profiles'
+# スタックを取得する間隔（秒）
+SAMPLE_INTERVAL = 0.01
+
+_active = None
+_lock = threading.Lock()
+_IDLE = contextlib.nullcontext()
+
+
+def span(name):
+    """計測中はwith文の中を名前付きの区間として記録する（計測していなければ何もしない）"""
+    profiler = _active
+    if profiler is None:
+        return _IDLE
+    return profiler.span(name)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)})"
+
+
+class SamplingProfiler:
+    """専用スレッドで全スレッドのスタックを取得し、折りたたみ形式で数える"""
+
+    def __init__(self, seconds=DEFAULTS['profile_seconds'], interval=SAMPLE_INTERVAL, directory=PROFILE_DIR):
+        self.seconds = seconds
+        self.interval = interval
+        self.directory = directory
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.samples = {}    # 折りたたんだスタック -> 回数
+        self.spans = {}      # スレッドID -> 実行中の区間名のタプル
+        self.durations = {}  # 区間名 -> [所要時間]
+        self.span_lock = threading.Lock()
+        self.sample_count = 0
+        self.started_at = None
+        self.path = None
+
+    @contextlib.contextmanager
+    def span(self, name):
+        ident = threading.get_ident()
+        outer = self.spans.get(ident, ())
+        self.spans[ident] = outer + (name,)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if outer:
+                self.spans[ident] = outer
+            else:
+                self.spans.pop(ident, None)
+            with self.span_lock:
+                self.durations.setdefault(name, []).append(elapsed)
+
+    def start(self):
+        self.started_at = time.time()
+        self.thread = threading.Thread(target=self.run, name='profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """計測を途中で終える（書き出しは計測スレッドが行う）"""
+        self.stop_event.set()
+
+    def run(self):
+        deadline = time.monotonic() + self.seconds
+        try:
+            while not self.stop_event.is_set() and time.monotonic() < deadline:
+                self.sample()
+                self.stop_event.wait(self.interval)
+        finally:
+            finish(self)
+
+    def sample(self):
+        """全スレッドのスタックを1回取得"""
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            stack.reverse()
+            prefix = [names.get(ident, str(ident))] + [f"[{name}]" for name in self.spans.get(ident, ())]
+            key = ';'.join(prefix + stack)
+            self.samples[key] = self.samples.get(key, 0) + 1
+        self.sample_count += 1
+
+    def span_summary(self):
+        with self.span_lock:
+            durations = {name: sorted(values) for name, values in self.durations.items()}
+        summary = {}
+        for name, values in sorted(durations.items()):
+            summary[name] = {
+                'count': len(values),
+                'total_seconds': round(sum(values), 6),
+                'p50_seconds': round(values[len(values) // 2], 6),
+                'max_seconds': round(values[-1], 6),
+            }
+        return summary
+
+    def write(self):
+        """計測結果を書き出して折りたたみ形式のファイルのパスを返す"""
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))
+        base = os.path.join(self.directory, f"profile-{stamp}")
+        with open(base + '.folded', 'w', encoding='utf-8') as f:
+            for key, count in sorted(self.samples.items()):
+                f.write(f"{key} {count}\n")
+        with open(base + '.spans.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+                'seconds': round(time.time() - self.started_at, 3),
+                'interval': self.interval,
+                'samples': self.sample_count,
+                'spans': self.span_summary(),
+            }, f, ensure_ascii=False, indent=2)
+        self.path = base + '.folded'
+        return self.path
+
+
+def read_profile_seconds(directory='.'):
+    """設定（signage.jsonのprofile_seconds、またはprofile.txt）から計測する秒数を読み込み"""
+    return load_config(directory)['profile_seconds']
+
+
+def start_profile(seconds=None, **kwargs):
+    """計測を開始（計測中の場合は何もしない）。開始した場合はプロファイラーを返す"""
+    global _active
+    with _lock:
+        if _active is not None:
+            return None
+        profiler = SamplingProfiler(seconds if seconds is not None else read_profile_seconds(), **kwargs)
+        _active = profiler
+    profiler.start()
+    logger.info(f"プロファイルを開始: {profiler.seconds:g}秒")
+    return profiler
+
+
+def finish(profiler):
+    """計測を終えてspan()を無効に戻し、結果を書き出す"""
+    global _active
+    with _lock:
+        if _active is profiler:
+            _active = None
+    try:
+        path = profiler.write()
+        logger.info(f"プロファイルを書き出しました: {path} ({profiler.sample_count}回)")
+    except OSError as e:
+        logger.error(f"プロファイルの書き出しエラー: {e}")
+
+
+def toggle_profile(*args):
+    """計測していなければ開始し、計測中なら終了する（SIGUSR1のハンドラー）"""
+    profiler = _active
+    if profiler is not None:
+        profiler.stop()
+    else:
+        start_profile()
+
+
+def install_signal_handler(signum=signal.SIGUSR1):
+    """SIGUSR1で計測を開始・終了する（メインスレッドから呼ぶ）"""
+    signal.signal(signum, toggle_profile)
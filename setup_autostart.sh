@@ -31,7 +31,7 @@ cat > "$AUTOSTART_DIR/signage-system.desktop" << EOF
 Type=Application
 Name=Signage System
 Comment=予約状況サイネージシステム
-Exec=python3 $SCRIPT_DIR/main.py
+Exec=python3 $SCRIPT_DIR/supervisor.py run
 Icon=application-x-executable
 Hidden=false
 NoDisplay=false
@@ -42,6 +42,7 @@ echo "自動起動ファイルを作成しました: $AUTOSTART_DIR/signage-syst
 
 # 実行権限を付与
 chmod +x "$SCRIPT_DIR/main.py"
+chmod +x "$SCRIPT_DIR/supervisor.py"
 chmod +x "$SCRIPT_DIR/setup_window.py"
 chmod +x "$SCRIPT_DIR/signage_display.py"
 
@@ -59,6 +60,10 @@ for i in {1..10}; do
     fi
 done
 
+# 背景画像を回転・解像度ごとに加工済みのデータに変換（画像が変わった時だけ作り直す）
+echo "背景画像のアセットパックを作成中..."
+(cd "$SCRIPT_DIR" && python3 asset_pack.py)
+
 echo ""
 echo "セットアップが完了しました！"
 echo ""
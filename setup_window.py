@@ -3,15 +3,25 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox
+import asyncio
 import subprocess
 import sys
 import os
+import logging
 import time
-import threading
+from connectivity import check_connectivity_async
+from core_loop import get_core_loop, run_command
+from signage_config import load_config, save_setting
+from signage_log import setup_logging
+from ui_dispatcher import UiDispatcher
+
+logger = logging.getLogger(__name__)
 
 class SetupWindow:
-    def __init__(self):
-        self.root = tk.Tk()
+    def __init__(self, root=None, on_complete=None):
+        # 起動制御から呼ばれた場合は既存のウィンドウを再利用し、完了時にon_completeを呼ぶ
+        self.root = root if root is not None else tk.Tk()
+        self.on_complete = on_complete
         self.root.title("初期設定")
         self.root.geometry("1080x1920")
         self.root.attributes('-fullscreen', True)
@@ -38,27 +48,41 @@ class SetupWindow:
         self.create_widgets()
         self.apply_rotation()
         
+        # Wi-Fiのスキャン・接続は共有のイベントループで行い、画面への反映はメインスレッドでまとめて行う
+        self.core = get_core_loop()
+        self.dispatcher = UiDispatcher(self.root)
+        self.dispatcher.register('status', lambda text: self.status_label.config(text=text))
+        self.dispatcher.register('networks', self.show_networks)
+        self.dispatcher.register('refresh_button', lambda state: self.refresh_button.config(state=state))
+        self.dispatcher.register('complete_button', lambda state: self.complete_button.config(state=state))
+        self.dispatcher.register('error', lambda message: messagebox.showerror("エラー", message))
+        self.dispatcher.register('launch', lambda _: self.launch_signage())
+        self.dispatcher.start()
+        
         # 前回接続したWi-Fiに自動接続を試行
         self.try_auto_connect()
         
         self.scan_wifi()
         
     def read_rotation(self):
-        """rotate.txtから回転状態を読み込み"""
+        """回転状態（signage.jsonのrotation、またはrotate.txt）を読み込み"""
+        return load_config()['rotation']
+    
+    def save_rotation(self):
+        """回転状態をsignage.jsonとrotate.txtに保存（動作中のサイネージには監視で反映される）"""
         try:
-            with open('rotate.txt', 'r') as f:
-                return int(f.read().strip())
-        except:
-            return 0
+            save_setting('rotation', self.rotation)
+        except Exception as e:
+            logger.error(f"回転設定の保存エラー: {e}")
     
     def save_network_info(self, ssid, password):
         """ネットワーク情報をnetwork.txtに保存"""
         try:
             with open('network.txt', 'w', encoding='utf-8') as f:
                 f.write(f"{ssid}\n{password}")
-            print(f"ネットワーク情報を保存: {ssid}")
+            logger.info(f"ネットワーク情報を保存: {ssid}")
         except Exception as e:
-            print(f"ネットワーク情報保存エラー: {e}")
+            logger.error(f"ネットワーク情報保存エラー: {e}")
     
     def load_network_info(self):
         """network.txtからネットワーク情報を読み込み"""
@@ -73,11 +97,8 @@ class SetupWindow:
                     elif len(lines) == 1:
                         return lines[0], ""  # パスワードなし
         except Exception as e:
-            print(f"ネットワーク情報読み込みエラー: {e}")
+            logger.error(f"ネットワーク情報読み込みエラー: {e}")
         return None, None
-        """rotate.txtに回転状態を保存"""
-        with open('rotate.txt', 'w') as f:
-            f.write(str(self.rotation))
     
     def create_widgets(self):
         """ウィジェットを作成"""
@@ -198,156 +219,143 @@ class SetupWindow:
         """画面を回転"""
         self.rotation = 1 if self.rotation == 0 else 0
         self.save_rotation()
-        messagebox.showinfo("回転", f"画面回転設定を変更しました（rotate.txt = {self.rotation}）")
+        messagebox.showinfo("回転", f"画面回転設定を変更しました（rotation = {self.rotation}）")
+    
+    def show_networks(self, networks):
+        """スキャン結果を表示（メインスレッド専用）"""
+        self.wifi_combo['values'] = networks
+        if networks:
+            self.status_label.config(text=f"{len(networks)}個のネットワークが見つかりました")
+        else:
+            self.status_label.config(text="Wi-Fiネットワークが見つかりませんでした")
     
     def scan_wifi(self):
         """Wi-Fiネットワークをスキャン"""
-        def scan_thread():
-            self.status_label.config(text="Wi-Fiネットワークを取得中...")
-            self.refresh_button.config(state='disabled')
+        self.core.spawn('wifi-scan', self.scan_networks)
+    
+    async def scan_networks(self):
+        """nmcliでWi-Fiネットワークを取得"""
+        self.dispatcher.submit('status', "Wi-Fiネットワークを取得中...")
+        self.dispatcher.submit('refresh_button', 'disabled')
+        
+        try:
+            # nmcliを使用してWi-Fiスキャン
+            result = await run_command(['nmcli', '-f', 'SSID', 'dev', 'wifi', 'list'], timeout=10)
             
-            try:
-                # nmcliを使用してWi-Fiスキャン
-                result = subprocess.run(
-                    ['nmcli', '-f', 'SSID', 'dev', 'wifi', 'list'],
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
+            if result.returncode == 0:
+                networks = []
+                for line in result.stdout.split('\n')[1:]:  # ヘッダーをスキップ
+                    ssid = line.strip()
+                    if ssid and ssid != '--':
+                        networks.append(ssid)
                 
-                if result.returncode == 0:
-                    networks = []
-                    for line in result.stdout.split('\n')[1:]:  # ヘッダーをスキップ
-                        ssid = line.strip()
-                        if ssid and ssid != '--':
-                            networks.append(ssid)
-                    
-                    # 重複を除去してソート
-                    networks = sorted(list(set(networks)))
-                    self.wifi_combo['values'] = networks
-                    
-                    if networks:
-                        self.status_label.config(text=f"{len(networks)}個のネットワークが見つかりました")
-                    else:
-                        self.status_label.config(text="Wi-Fiネットワークが見つかりませんでした")
-                else:
-                    self.status_label.config(text="Wi-Fiスキャンに失敗しました")
-                    
-            except subprocess.TimeoutExpired:
-                self.status_label.config(text="Wi-Fiスキャンがタイムアウトしました")
-            except Exception as e:
-                self.status_label.config(text=f"エラー: {str(e)}")
-            
-            self.refresh_button.config(state='normal')
+                # 重複を除去してソート
+                self.dispatcher.submit('networks', sorted(set(networks)))
+            else:
+                self.dispatcher.submit('status', "Wi-Fiスキャンに失敗しました")
+                
+        except subprocess.TimeoutExpired:
+            self.dispatcher.submit('status', "Wi-Fiスキャンがタイムアウトしました")
+        except Exception as e:
+            self.dispatcher.submit('status', f"エラー: {str(e)}")
         
-        threading.Thread(target=scan_thread, daemon=True).start()
+        self.dispatcher.submit('refresh_button', 'normal')
     
     def try_auto_connect(self):
         """前回接続したWi-Fiに自動接続を試行"""
-        def auto_connect_thread():
-            try:
-                self.status_label.config(text="前回のWi-Fi接続を確認中...")
-                
-                # 保存されたネットワーク情報を読み込み
-                saved_ssid, saved_password = self.load_network_info()
+        self.core.spawn('wifi-auto-connect', self.auto_connect)
+    
+    async def auto_connect(self):
+        """保存されたネットワークに接続し、インターネットに出られればサイネージを起動"""
+        try:
+            self.dispatcher.submit('status', "前回のWi-Fi接続を確認中...")
+            
+            # 保存されたネットワーク情報を読み込み
+            saved_ssid, saved_password = self.load_network_info()
+            
+            if saved_ssid:
+                self.dispatcher.submit('status', f"保存されたネットワークに接続中: {saved_ssid}")
                 
-                if saved_ssid:
-                    self.status_label.config(text=f"保存されたネットワークに接続中: {saved_ssid}")
+                # 保存されたネットワークに接続を試行
+                if await self.connect_wifi(saved_ssid, saved_password):
+                    # 接続成功後、インターネット接続をテスト
+                    self.dispatcher.submit('status', "インターネット接続をテスト中...")
+                    await asyncio.sleep(3)
                     
-                    # 保存されたネットワークに接続を試行
-                    if self.connect_wifi(saved_ssid, saved_password):
-                        # 接続成功後、インターネット接続をテスト
-                        self.status_label.config(text="インターネット接続をテスト中...")
-                        time.sleep(3)
+                    if await self.test_connection():
+                        # 接続成功 - 自動的にサイネージを起動
+                        self.dispatcher.submit('status', "自動接続成功！サイネージを起動します...")
+                        
+                        # setup.txtを1に更新
+                        with open('setup.txt', 'w') as f:
+                            f.write('1')
                         
-                        if self.test_connection():
-                            # 接続成功 - 自動的にサイネージを起動
-                            self.status_label.config(text="自動接続成功！サイネージを起動します...")
-                            
-                            # setup.txtを1に更新
-                            with open('setup.txt', 'w') as f:
-                                f.write('1')
-                            
-                            time.sleep(2)
-                            self.launch_signage()
-                            return
-                        else:
-                            self.status_label.config(text="インターネット接続が不安定です")
+                        await asyncio.sleep(2)
+                        self.dispatcher.submit('launch')
+                        return
                     else:
-                        self.status_label.config(text="保存されたネットワークに接続できませんでした")
+                        self.dispatcher.submit('status', "インターネット接続が不安定です")
                 else:
-                    self.status_label.config(text="保存されたネットワーク情報がありません")
-                
-                # 自動接続に失敗した場合は手動設定画面を表示
-                time.sleep(2)
-                self.status_label.config(text="Wi-Fi設定が必要です")
-                
-            except Exception as e:
-                print(f"自動接続エラー: {e}")
-                self.status_label.config(text="Wi-Fi設定が必要です")
-        
-        threading.Thread(target=auto_connect_thread, daemon=True).start()
+                    self.dispatcher.submit('status', "保存されたネットワークに接続できませんでした")
+            else:
+                self.dispatcher.submit('status', "保存されたネットワーク情報がありません")
+            
+            # 自動接続に失敗した場合は手動設定画面を表示
+            await asyncio.sleep(2)
+            self.dispatcher.submit('status', "Wi-Fi設定が必要です")
+            
+        except Exception as e:
+            logger.error(f"自動接続エラー: {e}")
+            self.dispatcher.submit('status', "Wi-Fi設定が必要です")
     
-    def test_connection(self):
+    async def test_connection(self):
         """Wi-Fi接続をテスト"""
-        try:
-            import requests
-            # 複数のサイトで接続テスト
-            test_urls = ['https://www.google.com', 'https://www.cloudflare.com', 'https://httpbin.org/get']
-            for url in test_urls:
-                try:
-                    response = requests.get(url, timeout=15)  # タイムアウトを10秒から15秒に延長
-                    if response.status_code == 200:
-                        return True
-                except:
-                    continue
-            return False
-        except:
-            return False
+        # 複数のサイトへ並列に接続テスト（接続直後なのでキャッシュは使わない）
+        return await check_connectivity_async(use_cache=False)
     
-    def connect_wifi(self, ssid, password):
+    async def connect_wifi(self, ssid, password):
         """Wi-Fiに接続"""
         try:
             # 既存の接続を削除（重複接続を避けるため）
             try:
-                subprocess.run(['nmcli', 'connection', 'delete', ssid], 
-                             capture_output=True, timeout=10)
+                await run_command(['nmcli', 'connection', 'delete', ssid], timeout=10)
             except:
                 pass
             
             # nmcliを使用してWi-Fi接続（タイムアウトを延長）
             if password:
-                result = subprocess.run(
-                    ['nmcli', 'dev', 'wifi', 'connect', ssid, 'password', password],
-                    capture_output=True,
-                    text=True,
-                    timeout=60  # 30秒から60秒に延長
-                )
+                command = ['nmcli', 'dev', 'wifi', 'connect', ssid, 'password', password]
             else:
-                result = subprocess.run(
-                    ['nmcli', 'dev', 'wifi', 'connect', ssid],
-                    capture_output=True,
-                    text=True,
-                    timeout=60  # 30秒から60秒に延長
-                )
+                command = ['nmcli', 'dev', 'wifi', 'connect', ssid]
+            result = await run_command(command, timeout=60)  # 30秒から60秒に延長
             
             if result.returncode == 0:
-                print("Wi-Fi接続成功")
+                logger.info("Wi-Fi接続成功")
                 return True
             else:
-                print(f"Wi-Fi接続失敗: {result.stderr}")
+                logger.warning(f"Wi-Fi接続失敗: {result.stderr}")
                 return False
         except subprocess.TimeoutExpired:
-            print("Wi-Fi接続タイムアウト")
+            logger.warning("Wi-Fi接続タイムアウト")
             return False
         except Exception as e:
-            print(f"Wi-Fi接続エラー: {e}")
+            logger.error(f"Wi-Fi接続エラー: {e}")
             return False
     
     def launch_signage(self):
-        """サイネージプログラムを起動"""
+        """サイネージプログラムを起動（メインスレッド専用）"""
         try:
-            print("サイネージプログラムを起動中...")
+            logger.info("サイネージプログラムを起動中...")
+            
+            # 初期設定画面のタスクと画面更新を止める
+            for name in ('wifi-scan', 'wifi-auto-connect', 'wifi-connect'):
+                self.core.cancel(name)
+            self.dispatcher.stop()
+            
+            # 同じプロセス内でサイネージに切り替え
+            if self.on_complete:
+                self.root.after(0, self.on_complete)
+                return
             
             # 現在のウィンドウを非表示
             self.root.withdraw()
@@ -363,7 +371,7 @@ class SetupWindow:
             self.root.destroy()
             
         except Exception as e:
-            print(f"サイネージプログラム起動エラー: {e}")
+            logger.error(f"サイネージプログラム起動エラー: {e}")
             messagebox.showerror("エラー", f"サイネージプログラムの起動に失敗しました: {e}")
     
     def complete_setup(self):
@@ -377,54 +385,54 @@ class SetupWindow:
         
         self.status_label.config(text="Wi-Fiに接続中...")
         self.complete_button.config(state='disabled')
-        
-        def connect_thread():
-            # Wi-Fi接続
-            if self.connect_wifi(ssid, password):
-                # 接続安定化のため待機時間を延長
-                self.status_label.config(text="接続確認中...")
-                for i in range(10):  # 10秒待機
-                    time.sleep(1)
-                    self.status_label.config(text=f"接続確認中...({i+1}/10)")
+        self.core.spawn('wifi-connect', self.connect_and_launch, ssid, password)
+    
+    async def connect_and_launch(self, ssid, password):
+        """入力されたWi-Fiに接続し、インターネットに出られればサイネージを起動"""
+        # Wi-Fi接続
+        if await self.connect_wifi(ssid, password):
+            # 接続安定化のため待機時間を延長
+            self.dispatcher.submit('status', "接続確認中...")
+            for i in range(10):  # 10秒待機
+                await asyncio.sleep(1)
+                self.dispatcher.submit('status', f"接続確認中...({i+1}/10)")
+            
+            # 接続テスト（複数回試行）
+            connection_success = False
+            for attempt in range(3):  # 3回試行
+                self.dispatcher.submit('status', f"接続テスト中...({attempt+1}/3)")
+                if await self.test_connection():
+                    connection_success = True
+                    break
+                await asyncio.sleep(5)  # 5秒待機してリトライ
+            
+            if connection_success:
+                # ネットワーク情報を保存
+                self.save_network_info(ssid, password)
                 
-                # 接続テスト（複数回試行）
-                connection_success = False
-                for attempt in range(3):  # 3回試行
-                    self.status_label.config(text=f"接続テスト中...({attempt+1}/3)")
-                    if self.test_connection():
-                        connection_success = True
-                        break
-                    time.sleep(5)  # 5秒待機してリトライ
+                # setup.txtを1に更新
+                with open('setup.txt', 'w') as f:
+                    f.write('1')
                 
-                if connection_success:
-                    # ネットワーク情報を保存
-                    self.save_network_info(ssid, password)
-                    
-                    # setup.txtを1に更新
-                    with open('setup.txt', 'w') as f:
-                        f.write('1')
-                    
-                    self.status_label.config(text="設定完了！サイネージを起動します...")
-                    
-                    # 2秒待機してからサイネージを起動
-                    time.sleep(2)
-                    self.launch_signage()
-                    
-                else:
-                    messagebox.showerror("エラー", "インターネット接続テストに失敗しました\n時間をおいて再度お試しください")
-                    self.complete_button.config(state='normal')
+                self.dispatcher.submit('status', "設定完了！サイネージを起動します...")
+                
+                # 2秒待機してからサイネージを起動
+                await asyncio.sleep(2)
+                self.dispatcher.submit('launch')
+                return
             else:
-                messagebox.showerror("エラー", "Wi-Fi接続に失敗しました\nネットワーク名とパスワードを確認してください")
-                self.complete_button.config(state='normal')
-            
-            self.status_label.config(text="")
+                self.dispatcher.submit('error', "インターネット接続テストに失敗しました\n時間をおいて再度お試しください")
+        else:
+            self.dispatcher.submit('error', "Wi-Fi接続に失敗しました\nネットワーク名とパスワードを確認してください")
         
-        threading.Thread(target=connect_thread, daemon=True).start()
+        self.dispatcher.submit('complete_button', 'normal')
+        self.dispatcher.submit('status', "")
     
     def run(self):
         """ウィンドウを実行"""
         self.root.mainloop()
 
 if __name__ == "__main__":
+    setup_logging()
     app = SetupWindow()
     app.run()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""表示・データ取得で使う時計
+
+通常は実際の時刻を使う。記録したトラフィックを再生する時は、記録した時刻から
+指定した倍速で進む仮想の時計に差し替え、時計の表示や時間帯が過ぎる時刻を
+記録した日の時刻に合わせる（traffic_replay.py）。
+"""
+
+import time
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """実際の時刻"""
+
+    speed = 1.0
+
+    def now(self):
+        return datetime.now()
+
+    def time(self):
+        return time.time()
+
+    def real_seconds(self, seconds):
+        """この時計でのseconds秒を実際に待つ秒数に換算"""
+        return seconds
+
+
+class VirtualClock:
+    """startからspeed倍の速さで進む時計"""
+
+    def __init__(self, start, speed=1.0, monotonic=time.monotonic):
+        if speed <= 0:
+            raise ValueError(f"速度は0より大きい値を指定してください: {speed}")
+        self.start = start
+        self.speed = speed
+        self.monotonic = monotonic
+        self.origin = monotonic()
+
+    def now(self):
+        return self.start + timedelta(seconds=(self.monotonic() - self.origin) * self.speed)
+
+    def time(self):
+        return self.now().timestamp()
+
+    def real_seconds(self, seconds):
+        return seconds / self.speed
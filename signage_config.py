@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""サイネージの設定（signage.json）
+
+    python3 signage_config.py                 # 現在の設定（従来のファイルを含めて反映した値）
+    python3 signage_config.py set rotation 1  # signage.jsonと従来のファイルの両方に保存
+
+signage.jsonの例:
+    {
+        "rotation": 0,
+        "data_mode": "listen",
+        "data_source": "grpc",
+        "renderer": "canvas",
+        "log_level": "INFO",
+        "profile_seconds": 30,
+        "schedule": {"hours": {"mon": [["09:00", "18:00"]]}, "poll": {"fast_seconds": 10}},
+        "playlist": {"items": ["1.png", "2.png"], "crossfade_seconds": 1.5}
+    }
+
+signage.jsonにない項目は従来のファイル（rotate.txt・datamode.txt・datasource.txt・
+renderer.txt・loglevel.txt・profile.txt・hours.json・playlist.json）から読み、
+どちらにもなければ既定値を使う。値が不正な場合も既定値を使う。
+
+動作中のサイネージはConfigWatcherでこれらのファイルをinotifyで監視し、
+変更された設定だけを再起動せずに反映する。
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import struct
+import sys
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = 'signage.json'
+
+# 設定名 -> 従来のファイル
+LEGACY_FILES = {
+    'rotation': 'rotate.txt',
+    'data_mode': 'datamode.txt',
+    'data_source': 'datasource.txt',
+    'renderer': 'renderer.txt',
+    'log_level': 'loglevel.txt',
+    'profile_seconds': 'profile.txt',
+    'schedule': 'hours.json',
+    'playlist': 'playlist.json',
+}
+
+DEFAULTS = {
+    'rotation': 0,
+    'data_mode': 'poll',
+    'data_source': 'grpc',
+    'renderer': 'label',
+    'log_level': 'INFO',
+    'profile_seconds': 30,
+    'schedule': {},
+    'playlist': {},
+}
+
+# 取得元の名前（data_sources.DATA_SOURCESのキー）
+DATA_SOURCE_NAMES = ('grpc', 'rest', 'local')
+PROFILE_MAX_SECONDS = 600
+
+VALIDATORS = {
+    'rotation': lambda value: value in (0, 1),
+    'data_mode': lambda value: value in ('poll', 'query', 'listen'),
+    'data_source': lambda value: value in DATA_SOURCE_NAMES,
+    'renderer': lambda value: value in ('label', 'canvas'),
+    'log_level': lambda value: value in ('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+    'profile_seconds': lambda value: 0 < value <= PROFILE_MAX_SECONDS,
+    'schedule': lambda value: isinstance(value, dict),
+    'playlist': lambda value: isinstance(value, dict),
+}
+
+# ファイルの変更をまとめて反映するまでの待ち時間（エディタの保存で複数回通知されるため）
+DEBOUNCE_SECONDS = 0.5
+# inotifyが使えない場合に更新時刻を確認する間隔（秒）
+POLL_SECONDS = 5
+
+
+def parse_setting(name, text):
+    """ファイルやコマンドラインの文字列を設定値に変換"""
+    if name in ('schedule', 'playlist'):
+        return json.loads(text) if text.strip() else {}
+    text = text.strip()
+    if name == 'rotation':
+        return int(text)
+    if name == 'profile_seconds':
+        return float(text)
+    if name == 'log_level':
+        return text.upper()
+    return text
+
+
+def format_setting(name, value):
+    """従来のファイルに書き込む文字列"""
+    if name in ('schedule', 'playlist'):
+        return json.dumps(value, ensure_ascii=False, indent=2) + '\n'
+    if name == 'profile_seconds':
+        return f"{value:g}"
+    return str(value)
+
+
+def read_structured(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        if isinstance(config, dict):
+            return config
+        logger.error(f"{path}の形式が正しくありません")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f"設定の読み込みエラー ({path}): {e}")
+    return {}
+
+
+def read_legacy(name, path):
+    """従来のファイルから設定値を読み込み（ファイルがない・読めない場合はNone）"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return parse_setting(name, f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"設定の読み込みエラー ({path}): {e}")
+        return None
+
+
+def load_config(directory='.'):
+    """signage.jsonと従来のファイルから、すべての設定値を持つ辞書を作成"""
+    structured = read_structured(os.path.join(directory, CONFIG_PATH))
+    config = {}
+    for name, default in DEFAULTS.items():
+        if name in structured:
+            value = structured[name]
+        else:
+            value = read_legacy(name, os.path.join(directory, LEGACY_FILES[name]))
+            if value is None:
+                config[name] = default
+                continue
+        try:
+            valid = VALIDATORS[name](value)
+        except TypeError:
+            valid = False
+        if not valid:
+            logger.warning(f"設定 {name} の値が正しくないため既定値を使用します: {value!r}")
+            value = default
+        config[name] = value
+    return config
+
+
+def write_atomic(path, text):
+    """一時ファイルに書いてから置き換える（読み込み中に書きかけの内容が見えないように）"""
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+def save_setting(name, value, directory='.'):
+    """設定をsignage.jsonと従来のファイルの両方に保存（どちらから読んでも同じ値になるように）"""
+    if name not in DEFAULTS:
+        raise ValueError(f"不明な設定です: {name}")
+    if not VALIDATORS[name](value):
+        raise ValueError(f"設定 {name} の値が正しくありません: {value!r}")
+    path = os.path.join(directory, CONFIG_PATH)
+    structured = read_structured(path)
+    structured[name] = value
+    write_atomic(path, json.dumps(structured, ensure_ascii=False, indent=2) + '\n')
+    write_atomic(os.path.join(directory, LEGACY_FILES[name]), format_setting(name, value))
+    logger.info(f"設定を保存: {name} = {value!r}")
+
+
+def watched_names():
+    return {CONFIG_PATH, *LEGACY_FILES.values()}
+
+
+# inotify（linux/inotify.h）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def open_inotify(directory):
+    """directoryを監視するinotifyのfdを作成（使えない場合はNone）"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        # 書き込みの完了・置き換え・削除だけを通知させる（書き込み途中のIN_MODIFYは使わない）
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(error, os.strerror(error))
+        return fd
+    except (OSError, AttributeError) as e:
+        logger.warning(f"inotifyを使用できないため更新時刻を定期的に確認します: {e}")
+        return None
+
+
+def parse_events(data):
+    """inotifyのイベント列からファイル名を取り出す"""
+    names = []
+    offset = 0
+    while offset + EVENT_HEADER.size <= len(data):
+        _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+        offset += EVENT_HEADER.size
+        name = data[offset:offset + length].rstrip(b'\0')
+        offset += length
+        if name:
+            names.append(os.fsdecode(name))
+    return names
+
+
+class ConfigWatcher:
+    """設定ファイルの変更を監視してcallback(変更されたファイル名の一覧)を呼ぶ
+
+    callbackはブロッキングしてよい（共有のイベントループのスレッドプールで実行する）。
+    """
+
+    def __init__(self, core, callback, directory='.', debounce=DEBOUNCE_SECONDS, poll_seconds=POLL_SECONDS):
+        self.core = core
+        self.callback = callback
+        self.directory = directory
+        self.debounce = debounce
+        self.poll_seconds = poll_seconds
+        self.names = watched_names()
+        self.pending = set()
+        self.changed = None
+
+    def start(self):
+        self.core.spawn('config-watch', self.watch)
+        return self
+
+    def stop(self):
+        self.core.cancel('config-watch')
+
+    async def watch(self):
+        self.changed = asyncio.Event()
+        fd = open_inotify(self.directory)
+        if fd is None:
+            await self.poll()
+            return
+        loop = asyncio.get_running_loop()
+        loop.add_reader(fd, self.on_readable, fd)
+        logger.info(f"設定ファイルの監視を開始: {os.path.abspath(self.directory)}")
+        try:
+            while True:
+                await self.changed.wait()
+                # 続けて届く通知をまとめてから1回だけ反映する
+                await asyncio.sleep(self.debounce)
+                self.changed.clear()
+                names, self.pending = sorted(self.pending), set()
+                await self.notify(names)
+        finally:
+            loop.remove_reader(fd)
+            os.close(fd)
+
+    def on_readable(self, fd):
+        try:
+            data = os.read(fd, 4096)
+        except BlockingIOError:
+            return
+        names = [name for name in parse_events(data) if name in self.names]
+        if names:
+            self.pending.update(names)
+            self.changed.set()
+
+    async def poll(self):
+        """inotifyが使えない場合の代わり（更新時刻の変化を確認）"""
+        last = self.modified_times()
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            current = self.modified_times()
+            names = sorted(name for name in self.names if current.get(name) != last.get(name))
+            last = current
+            if names:
+                await self.notify(names)
+
+    def modified_times(self):
+        times = {}
+        for name in self.names:
+            try:
+                times[name] = os.stat(os.path.join(self.directory, name)).st_mtime_ns
+            except OSError:
+                pass
+        return times
+
+    async def notify(self, names):
+        logger.info(f"設定ファイルの変更を検知: {', '.join(names)}")
+        try:
+            await self.core.run_blocking(self.callback, names)
+        except Exception as e:
+            logger.error(f"設定の反映エラー: {e}")
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        print(json.dumps(load_config(), ensure_ascii=False, indent=2))
+        return 0
+    if len(args) == 3 and args[0] == 'set' and args[1] in DEFAULTS:
+        try:
+            save_setting(args[1], parse_setting(args[1], args[2]))
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        return 0
+    print(f"使用方法: {sys.argv[0]} [set 名前 値]  名前: {', '.join(DEFAULTS)}", file=sys.stderr)
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,23 +2,96 @@
 # -*- coding: utf-8 -*-
 
 import tkinter as tk
-from PIL import Image, ImageTk
-import firebase_admin
-from firebase_admin import credentials, firestore
+from PIL import ImageTk
+import asyncio
 import threading
 import time
 from datetime import datetime, timedelta
 import os
 import math
+import atexit
+import logging
+from slot_aggregator import DaySlots, SlotAggregator
+from data_sources import create_data_source
+from state_store import StateStore
+from ui_dispatcher import UiDispatcher
+from canvas_compositor import CanvasCompositor
+from background import BackgroundLibrary
+from playlist import Playlist, run_crossfade
+from layout import load_layout
+from metrics import MetricsRegistry, start_metrics_server
+from control_socket import ControlServer
+from signage_log import dump_recent_log, set_log_level, setup_logging
+from business_hours import schedule_from_config, set_display_power
+from signage_clock import SystemClock
+from core_loop import BLOCKING_TIMEOUT, WakeEvent, get_core_loop
+from heartbeat import get_heartbeat
+from profiler import install_signal_handler, span
+from traffic_trace import TRACE_DIR, TrafficRecorder
+from signage_config import ConfigWatcher, load_config
+
+logger = logging.getLogger(__name__)
+
+# queryモードで1回のリクエストで取得する予約ドキュメント数
+RESERVATION_PAGE_SIZE = 20
+# 表示する時間帯の最大数
+MAX_SLOTS = 5
+# queryモードで表示数より多めに取得する時間帯の数（次の取得までに時間帯が過ぎても表示が欠けないように）
+SLOT_LOOKAHEAD = 5
+# 最後の取得成功からこの秒数を過ぎたら古いデータとして表示
+STALE_SECONDS = 60
+# 取得の応答を待つ最長秒数（超えた場合は失敗としてバックオフ）
+FETCH_TIMEOUT = 30
+# データ取得のハートビートの猶予（待ち時間に加える秒数、待ち人数と予約の取得がともにタイムアウトしても間に合う長さ）
+DATA_HEARTBEAT_GRACE = FETCH_TIMEOUT * 2 + 30
+# Firestoreの呼び出しがこの回数続けてタイムアウトしたらハートビートを止める（監視プロセスに再起動させる）
+DATA_HANG_TIMEOUTS = 3
+# Tkのイベントループの遅れを測る間隔（ミリ秒）
+LOOP_LAG_PROBE_MS = 1000
+
+def build_view_model(snapshot, now=None):
+    """表示データのスナップショットから各ウィジェットに表示する文字列を作成"""
+    if now is None:
+        now = time.time()
+    view = {'wait': f"{snapshot['now_population']}"}
+    
+    # 予約情報（時間と人数のみ、「〇名」形式）
+    reservations = snapshot['reservations']
+    for i in range(MAX_SLOTS):
+        if i < len(reservations):
+            time_slot, count = reservations[i]
+            view[f'slot{i}'] = f"{time_slot}  {count}名"
+        else:
+            view[f'slot{i}'] = ""
+    
+    # 古いデータを表示中は最終更新時刻を表示
+    last_success_at = snapshot['last_success_at']
+    if last_success_at is not None and now - last_success_at > STALE_SECONDS:
+        updated = datetime.fromtimestamp(last_success_at).strftime("%m/%d %H:%M")
+        view['stale'] = f"最終更新 {updated}"
+    else:
+        view['stale'] = ""
+    return view
+
+def changed_fields(old_view, new_view):
+    """前回描画した内容から変わった項目だけを返す"""
+    return [key for key, value in new_view.items() if old_view.get(key) != value]
 
 class SignageDisplay:
-    def __init__(self):
-        self.root = tk.Tk()
+    def __init__(self, root=None, control=None, clock=None):
+        # 起動制御から呼ばれた場合は既存のウィンドウと操作用ソケットを再利用
+        self.root = root if root is not None else tk.Tk()
         self.root.title("予約状況サイネージ")
-        self.root.geometry("1080x1920")
+        # 実際の画面サイズに合わせて表示（1080x1920以外のパネルにも対応）
+        self.screen_size = (self.root.winfo_screenwidth(), self.root.winfo_screenheight())
+        self.root.geometry(f"{self.screen_size[0]}x{self.screen_size[1]}")
         self.root.attributes('-fullscreen', True)
         self.root.configure(bg='black')
         
+        # 時刻（記録の再生時は記録した時刻から倍速で進む仮想の時計）
+        self.clock = clock if clock is not None else SystemClock()
+        self.recorder = None
+        
         # スリープ無効化（エラーを無視）
         try:
             os.system('xset s off 2>/dev/null')
@@ -27,17 +100,67 @@ class SignageDisplay:
         except:
             pass
         
-        # Firebase初期化
-        self.init_firebase()
+        # 設定を読み込み（signage.jsonと従来のrotate.txtなど。動作中の変更は監視して反映）
+        self.config = load_config()
+        self.config_lock = threading.Lock()
         
         # 回転状態を読み込み
         self.rotation = self.read_rotation()
         
+        # 画面サイズと回転設定に合わせた表示位置・フォントサイズ（解像度ごとにキャッシュ）
+        self.layout = load_layout(self.screen_size, self.rotation)
+        
+        # 描画方式を読み込み（label: ラベル配置, canvas: Canvas合成）
+        self.render_backend = self.read_render_backend()
+        self.compositor = None
+        
+        # データ取得モードを読み込み（poll: 定期取得, query: サーバー側で絞り込む定期取得, listen: リアルタイム監視）
+        self.data_mode = self.read_data_mode()
+        
+        # 営業時間と取得間隔（営業時間外は取得を止めて画面を消す）
+        self.hours, self.scheduler = schedule_from_config(self.config['schedule'])
+        self.display_on = True
+        self.poll_interval = self.scheduler.fast_seconds
+        
+        # 取得・描画・背景読み込みの計測
+        self.metrics = MetricsRegistry()
+        
+        # Firebase初期化
+        self.init_firebase()
+        
         # データ格納用
         self.now_population = 0
         self.reservations = []
-        self.background_image = None
+        # 本日の時間帯（時刻を過ぎた時間帯は再取得せずにタイマーで表示から外す）
+        self.day_slots = DaySlots()
+        self.expiry_timer = None
+        self.expiry_at = None
+        self.reloaded_date = None
+        self.slot_aggregator = SlotAggregator()
+        self.shaped_query_warned = False
+        self.core = get_core_loop()
+        self.refresh_event = WakeEvent(self.core)
+        self.heartbeat = get_heartbeat()
+        self.consecutive_timeouts = 0
+        self.refresh_requested = False
+        self.listen_date = None
+        self.listen_generation = 0
+        self.listen_delivered = set()  # 現在の購読で初回の通知が届いたリスナー
+        self.population_watch = None
+        self.reservations_watch = None
         self.background_photo = None
+        self.bg_label = None
+        self.backgrounds = BackgroundLibrary(rotation=self.rotation, size=self.screen_size)
+        self.playlist = Playlist.from_config(self.config['playlist'])
+        self.front_background = None
+        self.background_switch_at = None
+        self.last_success_at = None
+        self.rendered_view = {}
+        self.rendered_clock = None
+        
+        # 前回取得できたデータを読み込み
+        self.state_store = self.open_state_store()
+        has_last_known = self.load_last_known_state()
         
         # メインフレーム
         self.main_frame = tk.Frame(self.root, bg='black')
@@ -47,10 +170,30 @@ class SignageDisplay:
         self.apply_rotation()  # 回転設定を適用
         self.load_background()
         
-        # 初期表示（テストデータ）
-        self.now_population = 3
-        self.reservations = [("09:00", 2), ("10:30", 1)]
-        self.update_display()
+        # ワーカースレッドからの表示更新はメインスレッドでまとめて反映
+        self.dispatcher = UiDispatcher(self.root)
+        self.dispatcher.register('background', self.apply_background)
+        self.dispatcher.register('data', self.render_display)
+        self.dispatcher.register('layout', self.apply_layout)
+        self.dispatcher.register('power', self.apply_display_power)
+        self.dispatcher.register('renderer', self.apply_render_backend)
+        self.dispatcher.start()
+        
+        # 計測値をlocalhostで公開（キューの状態とキャッシュ使用量は取得時に収集）
+        self.metrics.add_collector(self.collect_gauges)
+        start_metrics_server(self.metrics)
+        self.check_loop_lag()
+        
+        # 再起動せずに再取得・再読み込みできるように操作用ソケットのコマンドを登録
+        self.start_control(control)
+        self.start_config_watch()
+        
+        # 初期表示（保存データがない場合はテストデータ）
+        if not has_last_known:
+            self.now_population = 3
+            self.reservations = [("09:00", 2), ("10:30", 1)]
+            self.day_slots.replace(self.clock.now().strftime("%Y-%m-%d"), self.reservations)
+        self.render_display(self.display_snapshot())
         
         # ウィジェットを最前面に配置
         self.bring_widgets_to_front()
@@ -60,33 +203,83 @@ class SignageDisplay:
         self.start_background_rotation()
         
     def read_rotation(self):
-        """rotate.txtから回転状態を読み込み"""
-        try:
-            with open('rotate.txt', 'r') as f:
-                return int(f.read().strip())
-        except:
-            return 0
+        """回転状態（signage.jsonのrotation、またはrotate.txt）"""
+        return self.config['rotation']
+    
+    def read_data_mode(self):
+        """データ取得モード（signage.jsonのdata_mode、またはdatamode.txt）"""
+        return self.config['data_mode']
+    
+    def read_render_backend(self):
+        """描画方式（signage.jsonのrenderer、またはrenderer.txt）"""
+        return self.config['renderer']
+    
+    def read_data_source(self):
+        """取得元（signage.jsonのdata_source、またはdatasource.txt）"""
+        return self.config['data_source']
     
     def init_firebase(self):
         """Firebase初期化"""
         try:
-            if not firebase_admin._apps:
-                if os.path.exists('Firebase-key.json'):
-                    cred = credentials.Certificate('Firebase-key.json')
-                    firebase_admin.initialize_app(cred)
-                    self.db = firestore.client()
-                    print("Firebase接続成功")
-                else:
-                    print("警告: Firebase-key.jsonが見つかりません")
-                    self.db = None
+            self.source = create_data_source(self.read_data_source())
+            if self.source:
+                logger.info(f"Firebase接続成功 (取得元: {self.source.name})")
             else:
-                self.db = firestore.client()
+                logger.warning("警告: Firebase-key.jsonが見つかりません")
+        except Exception as e:
+            logger.error(f"Firebase初期化エラー: {e}")
+            self.source = None
+    
+    def open_state_store(self):
+        """端末内のデータ保存先を開く"""
+        try:
+            store = StateStore()
+            atexit.register(store.close)
+            return store
         except Exception as e:
-            print(f"Firebase初期化エラー: {e}")
-            self.db = None
+            logger.error(f"保存データを開けません: {e}")
+            return None
+    
+    def load_last_known_state(self):
+        """保存済みの待ち人数と予約を読み込み（読み込めた場合True）"""
+        if not self.state_store:
+            return False
+        try:
+            population, population_at = self.state_store.load('now_population')
+            reservations, reservations_at = self.state_store.load('reservations')
+            if population is None or reservations is None:
+                return False
+            self.now_population = population
+            self.reservations = [tuple(item) for item in reservations]
+            self.last_success_at = min(population_at, reservations_at)
+            # 保存した日の時間帯として保持（時刻を過ぎたもの・前日のものは表示しない）
+            saved_date = datetime.fromtimestamp(reservations_at).strftime("%Y-%m-%d")
+            self.day_slots.replace(saved_date, self.reservations)
+            self.reservations = self.day_slots.upcoming(self.clock.now(), MAX_SLOTS)
+            logger.info(f"保存データを表示: {datetime.fromtimestamp(self.last_success_at)} 時点")
+            return True
+        except Exception as e:
+            logger.error(f"保存データ読み込みエラー: {e}")
+            return False
+    
+    def save_state(self):
+        """取得成功したデータを記録"""
+        self.last_success_at = self.clock.time()
+        self.record_traffic()
+        if not self.state_store:
+            return
+        try:
+            self.state_store.record('now_population', self.now_population, self.last_success_at)
+            self.state_store.record('reservations', self.reservations, self.last_success_at)
+        except Exception as e:
+            logger.error(f"データ保存エラー: {e}")
     
     def create_widgets(self):
         """ウィジェットを作成"""
+        if self.render_backend == 'canvas':
+            self.create_canvas_widgets()
+            return
+        
         # 利用可能な日本語フォントを確認して使用
         japanese_fonts = [
             'DejaVu Sans',
@@ -104,7 +297,7 @@ class SignageDisplay:
                 test_label = tk.Label(self.main_frame, font=(font, 12))
                 test_label.destroy()
                 main_font = font
-                print(f"使用するフォント: {font}")
+                logger.info(f"使用するフォント: {font}")
                 break
             except:
                 continue
@@ -113,243 +306,843 @@ class SignageDisplay:
         self.datetime_label = tk.Label(
             self.main_frame,
             text="",
-            font=(main_font, 80, 'bold'),  # フォントサイズを2倍
+            font=(main_font, self.layout['clock']['font'], 'bold'),  # フォントサイズを2倍
             fg='#ffffff',
             bg='#0e3c7f'
         )
-        self.datetime_label.place(x=50, y=50)
         
         # 待ち人数表示（右上）- 数字のみ、背景色#3e6399、文字色#c8bf43、フォントサイズ2倍、100px下に移動
         self.wait_count = tk.Label(
             self.main_frame,
             text="0",
-            font=(main_font, 128, 'bold'),  # フォントサイズを2倍
+            font=(main_font, self.layout['wait']['font'], 'bold'),  # フォントサイズを2倍
             fg='#c8bf43',
             bg='#3e6399'
         )
-        self.wait_count.place(x=650, y=150)  # 100px下に移動
         
         # 予約表示（中央）- タイトル削除
         self.reservation_frame = tk.Frame(self.main_frame, bg='black')
-        self.reservation_frame.place(x=200, y=600)
         
         # 予約リスト用のラベル（最大5件）- 時間と人数のみ、背景色#0e3c7f、交互の文字色
         self.reservation_labels = []
-        for i in range(5):
+        for i in range(MAX_SLOTS):
             # 1,3,5番目は#fe924c、2,4番目は#ffffff
             text_color = '#fe924c' if (i + 1) % 2 == 1 else '#ffffff'
             
             label = tk.Label(
                 self.reservation_frame,
                 text="",
-                font=(main_font, 111, 'bold'),  # フォントサイズ111px
+                font=(main_font, self.layout['slots']['font'], 'bold'),  # 基準解像度で111
                 fg=text_color,
                 bg='#0e3c7f'
             )
-            label.pack(pady=8)
+            label.pack(pady=self.layout['slots']['gap'])
             self.reservation_labels.append(label)
+        
+        # 古いデータ表示中の目印（通信障害時のみ表示）
+        self.stale_label = tk.Label(
+            self.main_frame,
+            text="",
+            font=(main_font, self.layout['stale']['font'], 'bold'),
+            fg='#ffffff',
+            bg='#b03a2e'
+        )
+    
+    def create_canvas_widgets(self):
+        """Canvas合成方式の表示項目を作成（文字は背景の上に透過で重ねる）"""
+        self.compositor = CanvasCompositor(self.main_frame, self.root.winfo_fpixels('1p'))
+        self.compositor.add_text('clock', self.layout['clock']['font'], '#ffffff')
+        self.compositor.add_text('wait', self.layout['wait']['font'], '#c8bf43')
+        for i in range(MAX_SLOTS):
+            # 1,3,5番目は#fe924c、2,4番目は#ffffff
+            text_color = '#fe924c' if (i + 1) % 2 == 1 else '#ffffff'
+            self.compositor.add_text(f'slot{i}', self.layout['slots']['font'], text_color)
+        self.compositor.add_text('stale', self.layout['stale']['font'], '#ff6b5b')
+        logger.info("描画方式: Canvas合成")
+    
+    def apply_canvas_rotation(self):
+        """Canvas合成方式の表示位置をレイアウトに合わせて配置"""
+        for key in ('clock', 'wait', 'stale'):
+            self.compositor.place_text(key, self.layout[key]['x'], self.layout[key]['y'])
+        
+        # 予約は行の高さ＋上下の余白（ラベル方式のpadyと同じ）で縦に並べる
+        slots = self.layout['slots']
+        row_height = self.compositor.line_height('slot0') + slots['gap'] * 2
+        for i in range(MAX_SLOTS):
+            self.compositor.place_text(f'slot{i}', slots['x'], slots['y'] + i * row_height)
     
     def apply_rotation(self):
         """画面回転を適用"""
+        if self.compositor:
+            self.apply_canvas_rotation()
+            return
+        
         if self.rotation == 1:
-            # 180度回転の場合、ウィジェットの位置も調整
-            print("180度回転モード: ウィジェット位置を調整")
-            
-            # 日時表示を右下に移動
-            self.datetime_label.place(x=1080-350, y=1920-150)
-            
-            # 待ち人数表示を左下に移動
-            self.wait_count.place(x=50, y=1920-350)
-            
-            # 予約表示を中央上部に移動
-            self.reservation_frame.place(x=200, y=200)
+            # 180度回転の場合、日時は右下・待ち人数は左下・予約は中央上部（layout.pyで定義）
+            logger.info("180度回転モード: ウィジェット位置を調整")
         else:
-            # 通常配置
-            print("通常モード: 標準ウィジェット位置")
-            self.datetime_label.place(x=50, y=50)
-            self.wait_count.place(x=650, y=150)
-            self.reservation_frame.place(x=200, y=600)
+            logger.info("通常モード: 標準ウィジェット位置")
+        
+        self.datetime_label.place(x=self.layout['clock']['x'], y=self.layout['clock']['y'])
+        self.wait_count.place(x=self.layout['wait']['x'], y=self.layout['wait']['y'])
+        self.reservation_frame.place(x=self.layout['slots']['x'], y=self.layout['slots']['y'])
     
-    def load_background(self):
-        """背景画像を読み込み"""
-        current_hour = datetime.now().hour
-        image_number = (current_hour % 10) + 1  # 1-10の画像をローテーション
-        image_path = f"{image_number}.png"
+    def apply_render_backend(self, backend):
+        """描画方式を切り替え（メインスレッド専用）
         
+        新しい表示項目を作って前回の内容を描画してから古いものを破棄する。
+        同じ処理の中で入れ替えるため、途中の状態が画面に出ることはない。
+        """
+        old_frame = self.main_frame
+        self.render_backend = backend
+        self.compositor = None
+        self.bg_label = None
+        self.background_photo = None
+        self.main_frame = tk.Frame(self.root, bg='black')
+        self.create_widgets()
+        self.apply_rotation()
+        if self.front_background is not None:
+            self.apply_background(self.front_background)
+        self.bring_widgets_to_front()
+        self.rendered_view = {}
+        self.rendered_clock = None
+        self.render_clock(self.clock.now().strftime("%m月%d日 %H:%M"))
+        self.render_display(self.display_snapshot())
+        old_frame.destroy()
+        self.main_frame.pack(fill='both', expand=True)
+        logger.info(f"描画方式を切り替えました: {backend}")
+    
+    def apply_layout(self, _=None):
+        """回転設定の変更後に表示位置を配置し直す（メインスレッド専用）"""
+        self.apply_rotation()
+        if not self.compositor and self.rendered_view.get('stale'):
+            self.place_stale_label()
+    
+    def place_stale_label(self):
+        """古いデータの目印を他の表示と重ならない位置に配置"""
+        self.stale_label.place(x=self.layout['stale']['x'], y=self.layout['stale']['y'])
+        self.stale_label.lift()
+    
+    def load_background(self):
+        """プレイリストの最初の背景画像を読み込み（メインスレッド用）"""
+        now = self.clock.now()
+        image_name, duration = self.playlist.next_entry(now)
+        self.front_background = self.prepare_background(image_name)
+        self.background_switch_at = now + timedelta(seconds=duration)
+        self.apply_background(self.front_background)
+    
+    def prepare_background(self, image_name):
+        """背景画像を読み込んで画面サイズに加工（Tkに触れないためワーカースレッドで実行可能）"""
         try:
-            if os.path.exists(image_path):
-                image = Image.open(image_path)
-                print(f"背景画像を読み込み: {image_path} (回転設定: {self.rotation})")
-                
-                # 回転に応じて画像を回転
-                if self.rotation == 1:
-                    # rotate.txtが1の時のみ180度回転
-                    image = image.rotate(180, expand=True)
-                    print("背景画像を180度回転")
+            with span('background_load'), self.metrics.timer('signage_background_load_seconds'):
+                image = self.backgrounds.frame_for_name(image_name)
+            if image is not None:
+                logger.info(f"背景画像を読み込み: {image_name} (回転設定: {self.rotation})")
+            return image
+        except Exception as e:
+            logger.error(f"背景画像読み込みエラー: {e}")
+        return None
+    
+    def apply_background(self, image):
+        """加工済みの背景画像を表示（メインスレッド専用）"""
+        try:
+            if image is not None and self.compositor:
+                # Canvas合成方式では同じ背景アイテムの画像を差し替える
+                self.compositor.set_background(image)
+                return
+            
+            if image is not None and self.background_photo is not None and (
+                    self.background_photo.width(), self.background_photo.height()) == image.size:
+                # 同じサイズなら表示中の画像に上書き（クロスフェード中も新しい画像を作らない）
+                self.background_photo.paste(image)
+                return
+            
+            if image is not None:
+                # 背景ラベルは1つだけ作成し、以降は画像だけを差し替える
+                # （前の画像は参照がなくなった時点で解放される）
+                photo = ImageTk.PhotoImage(image)
+                if self.bg_label is None:
+                    self.bg_label = tk.Label(self.main_frame, image=photo, bd=0)
+                    self.bg_label.place(x=0, y=0, relwidth=1, relheight=1)
+                    self.bg_label.lower()  # 背景として最背面に配置
+                    self.bring_widgets_to_front()
                 else:
-                    # 通常時: 回転なし（元画像が縦画面対応）
-                    print("背景画像: 回転なし")
-                
-                # 画面サイズにリサイズ（1080x1920）
-                image = image.resize((1080, 1920), Image.Resampling.LANCZOS)
-                self.background_photo = ImageTk.PhotoImage(image)
-                
-                # 背景として設定
-                self.bg_label = tk.Label(self.main_frame, image=self.background_photo)
-                self.bg_label.place(x=0, y=0, relwidth=1, relheight=1)
-                self.bg_label.lower()  # 背景として最背面に配置
-                
-                print("背景画像の設定完了")
+                    self.bg_label.config(image=photo)
+                self.background_photo = photo
+                logger.debug("背景画像の設定完了")
+                return
                 
         except Exception as e:
-            print(f"背景画像読み込みエラー: {e}")
-            # エラー時はデフォルトの背景色
-            self.main_frame.configure(bg='#1a1a2e')
+            logger.error(f"背景画像設定エラー: {e}")
+        # エラー時はデフォルトの背景色
+        if self.compositor:
+            self.compositor.canvas.configure(bg='#1a1a2e')
+        self.main_frame.configure(bg='#1a1a2e')
             
     def bring_widgets_to_front(self):
         """テキストウィジェットを最前面に配置"""
+        if self.compositor:
+            return  # Canvas合成方式では背景アイテムを最背面に固定している
         try:
             self.datetime_label.lift()
             self.wait_count.lift()
             self.reservation_frame.lift()
             for label in self.reservation_labels:
                 label.lift()
-            print("ウィジェットを最前面に配置しました")
+            self.stale_label.lift()
+            logger.debug("ウィジェットを最前面に配置しました")
         except Exception as e:
-            print(f"ウィジェット配置エラー: {e}")
+            logger.error(f"ウィジェット配置エラー: {e}")
     
     def start_clock_update(self):
-        """時計更新を開始"""
-        def update_clock():
-            while True:
-                now = datetime.now()
-                time_str = now.strftime("%m月%d日 %H:%M")
-                self.datetime_label.config(text=time_str)
-                time.sleep(1)
+        """時計更新を開始（表示は分単位のため、分の切り替わりに合わせてメインスレッドで更新）"""
+        self.tick_clock()
+    
+    def tick_clock(self):
+        """時計を更新して次の分の切り替わりに再実行"""
+        now = self.clock.now()
+        if self.display_on:
+            self.render_clock(now.strftime("%m月%d日 %H:%M"))
         
-        threading.Thread(target=update_clock, daemon=True).start()
+        # 次の分の境界まで待つ（早すぎる実行を避けるため少し余裕を持たせる）
+        delay_ms = (60 - now.second) * 1000 - now.microsecond // 1000 + 50
+        self.root.after(int(self.clock.real_seconds(delay_ms)), self.tick_clock)
     
     def start_background_rotation(self):
         """背景画像のローテーションを開始"""
-        def rotate_background():
-            while True:
-                time.sleep(3600)  # 1時間待機
-                self.load_background()
-        
-        threading.Thread(target=rotate_background, daemon=True).start()
+        self.core.spawn('background', self.rotate_backgrounds)
+    
+    async def rotate_backgrounds(self):
+        """切り替え時刻ごとに次の背景画像を表示"""
+        while True:
+            try:
+                switch_at = self.background_switch_at
+                
+                # 切り替え時刻に表示する画像を先に読み込んで裏で保持しておく
+                image_name, duration = self.playlist.next_entry(switch_at)
+                back = await self.core.run_blocking(self.prepare_background, image_name)
+                
+                wait = (switch_at - self.clock.now()).total_seconds()
+                if wait > 0:
+                    await asyncio.sleep(self.clock.real_seconds(wait))
+                
+                # 画像の加工・合成はスレッドプールで行い、表示の切り替えだけメインスレッドに依頼
+                if back is not None and not self.display_on:
+                    # 画面が消えている間は切り替えだけ記録し、表示の再開時に反映する
+                    self.front_background = back
+                elif back is not None:
+                    await self.core.run_blocking(
+                        run_crossfade, self.front_background, back, self.playlist.crossfade_seconds,
+                        lambda frame: self.dispatcher.submit('background', frame),
+                        timeout=self.playlist.crossfade_seconds + BLOCKING_TIMEOUT
+                    )
+                    self.front_background = back
+                
+                # 時計が大きくずれた場合は現在時刻から数え直す
+                next_switch = switch_at + timedelta(seconds=duration)
+                if next_switch < self.clock.now():
+                    next_switch = self.clock.now() + timedelta(seconds=duration)
+                self.background_switch_at = next_switch
+            except Exception as e:
+                logger.error(f"背景ローテーションエラー: {e}")
+                await asyncio.sleep(60)
     
     def start_data_monitoring(self):
         """Firestoreデータ監視を開始"""
-        def monitor_data():
-            while True:
+        if self.data_mode == 'listen' and self.source:
+            if self.source.supports_listen:
+                self.core.spawn('data', self.monitor_listeners)
+                return
+            logger.warning(f"取得元 {self.source.name} はリアルタイム監視に未対応のため定期取得します")
+        self.core.spawn('data', self.monitor_data)
+    
+    async def monitor_data(self):
+        """定期取得（poll/queryモード）"""
+        while True:
+            try:
+                if self.population_watch is not None or self.reservations_watch is not None:
+                    # listenモードから切り替えた場合は購読を解除しておく
+                    await self.run_sdk(self.stop_listeners)
+                if await self.wait_while_closed():
+                    continue
+                self.refresh_requested = False
+                logger.debug("データを取得中...")
+                before = (self.now_population, list(self.reservations))
+                population_ok = await self.run_fetch('population', self.fetch_current_population)
+                reservations_ok = await self.run_fetch('reservations', self.fetch_reservations)
+                failed = not (population_ok and reservations_ok)
+                if not failed:
+                    self.save_state()
+                self.update_display()
+                logger.debug("現在の待ち人数: %s", self.now_population)
+                logger.debug("予約件数: %d", len(self.reservations))
+                
+                # 変化があった直後や混雑時間帯は短く、変化がなければ長く、失敗時はバックオフ
+                changed = before != (self.now_population, list(self.reservations))
+                self.poll_interval = self.scheduler.next_interval(changed, failed, self.hours.is_busy(self.clock.now()))
+                await self.wait_for_refresh(self.poll_interval)
+            except Exception as e:
+                logger.error(f"データ取得エラー: {e}")
+                self.metrics.inc('signage_fetch_error_sleeps_total')
+                self.poll_interval = self.scheduler.next_interval(False, True)
+                await self.wait_for_refresh(self.poll_interval)
+    
+    async def monitor_listeners(self):
+        """on_snapshotによるリアルタイム監視（listenモード）"""
+        while True:
+            try:
+                # 営業時間外は購読を解除（変更通知による読み取りも止める）
+                if not self.hours.is_open(self.clock.now()):
+                    await self.run_sdk(self.stop_listeners)
+                    self.listen_date = None
+                if await self.wait_while_closed():
+                    continue
+                
+                # 日付が変わった時、リスナーが停止した時、再取得を指示された時は再購読
+                today = self.clock.now().strftime("%Y-%m-%d")
+                if today != self.listen_date or not self.listeners_active() or self.refresh_requested:
+                    self.refresh_requested = False
+                    await self.run_sdk(self.stop_listeners)
+                    await self.run_sdk(self.start_listeners, today)
+                
+                # 時間帯が過ぎた時の表示の更新はタイマーで行うため、ここではリスナーの状態だけ確認
+                await self.wait_for_refresh(10)
+            except Exception as e:
+                logger.error(f"リスナー監視エラー: {e}")
+                await self.wait_for_refresh(30)
+    
+    async def wait_while_closed(self):
+        """営業時間外は画面を消して表示開始まで待つ（待った場合True）"""
+        now = self.clock.now()
+        if self.hours.is_open(now):
+            if not self.display_on:
+                await self.core.run_blocking(self.set_power, True)
+            return False
+        
+        if self.display_on:
+            await self.core.run_blocking(self.set_power, False)
+        # 時計の変更や設定の再読み込みに備えて最長1時間ごとに確認し直す
+        seconds = self.hours.seconds_until_open(now)
+        await self.wait_for_refresh(min(seconds, 3600) if seconds is not None else 3600)
+        return True
+    
+    def set_power(self, on):
+        """画面の電源を切り替えて、描画の停止・再開をメインスレッドに依頼"""
+        self.display_on = on
+        set_display_power(on)
+        if on:
+            self.scheduler.reset()
+        self.dispatcher.submit('power', on)
+    
+    def apply_display_power(self, on):
+        """表示の再開時に止めていた時計・背景・データの表示を反映（メインスレッド専用）"""
+        if not on:
+            return
+        self.render_clock(self.clock.now().strftime("%m月%d日 %H:%M"))
+        if self.front_background is not None:
+            self.apply_background(self.front_background)
+        self.render_display(self.display_snapshot())
+    
+    async def wait_for_refresh(self, seconds):
+        """次の取得まで待つ（再取得を指示された場合はすぐに戻る）"""
+        seconds = self.clock.real_seconds(seconds)
+        # 待ち時間と次の取得（タイムアウトまで）の間にハートビートが届かなければハングとみなされる。
+        # 取得が応答しないまま続けてタイムアウトしている間は送らない（古い表示のまま動き続けないように）
+        if self.consecutive_timeouts < DATA_HANG_TIMEOUTS:
+            self.heartbeat.beat('data', seconds + DATA_HEARTBEAT_GRACE)
+        else:
+            logger.error(f"Firestoreの呼び出しが{self.consecutive_timeouts}回続けてタイムアウトしたためハートビートを止めます")
+        await self.refresh_event.wait(seconds)
+    
+    def start_listeners(self, today):
+        """待ち人数ドキュメントと本日の予約クエリを購読"""
+        logger.info(f"リアルタイム監視を開始: 日付 {today}")
+        # 購読ごとに世代番号と集計を新しくし、古い購読からの遅れた通知が混ざらないようにする
+        self.listen_generation += 1
+        generation = self.listen_generation
+        self.listen_date = today
+        self.slot_aggregator = SlotAggregator()
+        self.listen_delivered = set()
+        
+        self.population_watch = self.source.listen_population(
+            lambda docs, changes, read_time: self.on_population_snapshot(generation, docs, changes, read_time)
+        )
+        self.reservations_watch = self.source.listen_reservations(
+            today,
+            lambda docs, changes, read_time: self.on_reservations_snapshot(generation, docs, changes, read_time)
+        )
+    
+    def stop_listeners(self):
+        """購読を解除（解除後に届いた通知は無視する）"""
+        self.listen_generation += 1
+        for watch in (self.population_watch, self.reservations_watch):
+            if watch:
                 try:
-                    print("データを取得中...")
-                    self.fetch_current_population()
-                    self.fetch_reservations()
-                    self.update_display()
-                    print(f"現在の待ち人数: {self.now_population}")
-                    print(f"予約件数: {len(self.reservations)}")
-                    time.sleep(10)  # 10秒ごとに更新
+                    watch.unsubscribe()
                 except Exception as e:
-                    print(f"データ取得エラー: {e}")
-                    time.sleep(30)  # エラー時は30秒待機
-        
-        threading.Thread(target=monitor_data, daemon=True).start()
+                    logger.warning(f"リスナー解除エラー: {e}")
+        self.population_watch = None
+        self.reservations_watch = None
+    
+    def listeners_active(self):
+        """両方のリスナーが動作中か確認"""
+        for watch in (self.population_watch, self.reservations_watch):
+            if not watch or not watch.is_active:
+                return False
+        return True
+    
+    def on_population_snapshot(self, generation, doc_snapshots, changes, read_time):
+        """待ち人数ドキュメントの変更通知"""
+        if generation != self.listen_generation:
+            return  # 解除済みの購読からの通知は無視
+        try:
+            old_population = self.now_population
+            self.now_population = 0
+            self.metrics.inc('signage_firestore_reads_total', len(doc_snapshots), call='listen_population')
+            for doc in doc_snapshots:
+                if doc.exists:
+                    self.now_population = doc.to_dict().get('now', 0)
+            logger.log(logging.INFO if old_population != self.now_population else logging.DEBUG,
+                       "待ち人数を更新: %s -> %s", old_population, self.now_population)
+            self.save_listen_state('population')
+            self.update_display()
+        except Exception as e:
+            logger.error(f"待ち人数通知の処理エラー: {e}")
+    
+    def on_reservations_snapshot(self, generation, doc_snapshots, changes, read_time):
+        """予約クエリの差分通知（ADDED/MODIFIED/REMOVED）"""
+        if generation != self.listen_generation:
+            return  # 解除済みの購読からの通知は無視
+        try:
+            with span('aggregate'):
+                for change in changes:
+                    doc = change.document
+                    self.slot_aggregator.apply_change(change.type.name, doc.id, doc.to_dict())
+                self.metrics.inc('signage_firestore_reads_total', len(changes), call='listen_reservations')
+                logger.debug("予約の差分を反映: %d件", len(changes))
+                self.refresh_upcoming_slots()
+            self.save_listen_state('reservations')
+            self.update_display()
+        except Exception as e:
+            logger.error(f"予約通知の処理エラー: {e}")
+    
+    def save_listen_state(self, kind):
+        """両方のリスナーから通知が届いてから取得成功として記録（片方だけでは古い・空のデータを記録しうるため）"""
+        self.listen_delivered.add(kind)
+        if self.listen_delivered >= {'population', 'reservations'}:
+            self.save_state()
+    
+    def refresh_upcoming_slots(self):
+        """集計済みの時間帯から現在時刻以降の上位件数を表示用に取り出す"""
+        self.day_slots.replace(self.listen_date, self.slot_aggregator.upcoming('', None))
+        self.reservations = self.day_slots.upcoming(self.clock.now(), MAX_SLOTS)
+    
+    async def run_sdk(self, func, *args):
+        """Firestoreの呼び出しを専用スレッドで実行し、続けてタイムアウトした回数を数える"""
+        try:
+            result = await self.core.run_isolated(func, *args, timeout=FETCH_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.consecutive_timeouts += 1
+            raise
+        except Exception:
+            self.consecutive_timeouts = 0
+            raise
+        self.consecutive_timeouts = 0
+        return result
+    
+    async def run_fetch(self, kind, fetch):
+        """取得処理を専用スレッドで実行（応答がない場合はFETCH_TIMEOUT秒で失敗として扱う）"""
+        try:
+            return await self.run_sdk(self.timed_fetch, kind, fetch)
+        except asyncio.TimeoutError:
+            logger.warning(f"取得がタイムアウトしました ({kind}, {FETCH_TIMEOUT}秒)")
+            self.metrics.inc('signage_fetch_total', kind=kind, result='timeout')
+            return False
+    
+    def timed_fetch(self, kind, fetch):
+        """取得処理の所要時間と結果を記録"""
+        with span('fetch'), self.metrics.timer('signage_fetch_seconds', kind=kind):
+            ok = fetch()
+        self.metrics.inc('signage_fetch_total', kind=kind, result='ok' if ok else 'error')
+        return ok
     
     def fetch_current_population(self):
-        """現在の待ち人数を取得"""
-        if not self.db:
-            print("Firebase未接続のため、テストデータを使用")
-            self.now_population = 5  # テスト用データ
-            return
+        """現在の待ち人数を取得（成功した場合True）"""
+        if not self.source:
+            if self.last_success_at is None:
+                logger.warning("Firebase未接続のため、テストデータを使用")
+                self.now_population = 5  # テスト用データ
+            return False
         
         try:
-            print("Firestoreから待ち人数を取得中...")
-            doc_ref = self.db.collection('now_population').document('signage')
-            doc = doc_ref.get()
-            if doc.exists:
-                data = doc.to_dict()
+            logger.debug("Firestoreから待ち人数を取得中...")
+            data = self.source.get_population()
+            self.metrics.inc('signage_firestore_reads_total', call='population')
+            if data is not None:
                 old_population = self.now_population
                 self.now_population = data.get('now', 0)
-                print(f"待ち人数を更新: {old_population} -> {self.now_population}")
-                print(f"取得データ: {data}")
+                logger.log(logging.INFO if old_population != self.now_population else logging.DEBUG,
+                           "待ち人数を更新: %s -> %s", old_population, self.now_population)
+                logger.debug("取得データ: %s", data)
             else:
-                print("signageドキュメントが存在しません")
+                logger.warning("signageドキュメントが存在しません")
                 self.now_population = 0
+            return True
         except Exception as e:
-            print(f"待ち人数取得エラー: {e}")
+            logger.error(f"待ち人数取得エラー: {e}")
             # エラー時は前回の値を維持
+            return False
     
     def fetch_reservations(self):
-        """予約情報を取得"""
-        if not self.db:
-            print("Firebase未接続のため、テストデータを使用")
-            self.reservations = [("09:00", 2), ("10:30", 1), ("14:00", 3)]
-            return
+        """予約情報を取得（成功した場合True）"""
+        if not self.source:
+            if self.last_success_at is None:
+                logger.warning("Firebase未接続のため、テストデータを使用")
+                self.day_slots.replace(self.clock.now().strftime("%Y-%m-%d"), [("09:00", 2), ("10:30", 1), ("14:00", 3)])
+                self.reservations = self.day_slots.upcoming(self.clock.now(), MAX_SLOTS)
+            return False
         
         try:
-            today = datetime.now().strftime("%Y-%m-%d")
-            current_time = datetime.now().strftime("%H:%M")
-            print(f"予約情報を取得中... 日付: {today}, 現在時刻: {current_time}")
+            now = self.clock.now()
+            today = now.strftime("%Y-%m-%d")
+            current_time = now.strftime("%H:%M")
+            logger.debug("予約情報を取得中... 日付: %s, 現在時刻: %s", today, current_time)
             
-            # 予約コレクションから本日分を取得
-            reservations_ref = self.db.collection('reservations')
-            docs = reservations_ref.where('date', '==', today).where('states', '==', 0).get()
+            if self.data_mode == 'query':
+                try:
+                    slots = self.fetch_reservations_shaped(today, current_time, MAX_SLOTS + SLOT_LOOKAHEAD)
+                    self.day_slots.replace(today, slots)
+                    self.reservations = self.day_slots.upcoming(now, MAX_SLOTS)
+                    logger.debug("処理後の予約情報: %s", self.reservations)
+                    return True
+                except Exception as e:
+                    # インデックス未作成（FAILED_PRECONDITION）などの場合は通常の取得で表示を継続
+                    if not self.shaped_query_warned:
+                        logger.warning(f"絞り込みクエリに失敗したため通常の取得を使用します（firestore.indexes.jsonのインデックスを確認してください）: {e}")
+                        self.shaped_query_warned = True
             
-            print(f"取得した予約数: {len(docs)}")
+            # 予約コレクションから本日分を取得
+            docs = self.source.get_reservations(today)
+            self.metrics.inc('signage_firestore_reads_total', len(docs), call='reservations')
             
-            # 時間別に集計
-            time_counts = {}
-            for doc in docs:
-                data = doc.to_dict()
-                time_slot = data.get('Time', '')
-                print(f"予約データ: {data}")
-                if time_slot >= current_time:  # 現在時刻以降のみ
-                    if time_slot in time_counts:
-                        time_counts[time_slot] += 1
-                    else:
-                        time_counts[time_slot] = 1
+            logger.debug("取得した予約数: %d", len(docs))
             
-            # 時間順にソートして上位5件を取得
-            sorted_times = sorted(time_counts.items())
-            self.reservations = sorted_times[:5]
-            print(f"処理後の予約情報: {self.reservations}")
+            with span('aggregate'):
+                # 時間別に集計
+                time_counts = {}
+                for data in docs:
+                    time_slot = data.get('Time', '')
+                    logger.debug("予約データ: %s", data)  # 件数分出力されるため無効時は文字列化しない
+                    if time_slot >= current_time:  # 現在時刻以降のみ
+                        if time_slot in time_counts:
+                            time_counts[time_slot] += 1
+                        else:
+                            time_counts[time_slot] = 1
+                
+                # 本日の時間帯をすべて保持し、時間順の上位5件を表示
+                self.day_slots.replace(today, time_counts.items())
+                self.reservations = self.day_slots.upcoming(now, MAX_SLOTS)
+            logger.debug("処理後の予約情報: %s", self.reservations)
+            return True
             
         except Exception as e:
-            print(f"予約情報取得エラー: {e}")
-            self.reservations = []
+            logger.error(f"予約情報取得エラー: {e}")
+            # エラー時は前回の値を維持
+            return False
+    
+    def fetch_reservations_shaped(self, today, current_time, slot_limit=MAX_SLOTS):
+        """時刻の絞り込み・並び替え・フィールド射影をサーバー側で行って予約を集計
+        
+        複合インデックス（date, states, Time）が必要: firestore.indexes.json を参照
+        """
+        # Time順に取得するため、slot_limit+1個目の時間帯が現れた時点で上位の集計は確定する
+        time_counts = {}
+        read_count = 0
+        cursor = None
+        while True:
+            times, cursor = self.source.get_reservation_times_page(
+                today, current_time, RESERVATION_PAGE_SIZE, cursor
+            )
+            read_count += len(times)
+            self.metrics.inc('signage_firestore_reads_total', len(times), call='reservations_shaped')
+            
+            for time_slot in times:
+                if time_slot not in time_counts:
+                    if len(time_counts) >= slot_limit:
+                        logger.debug("取得した予約数: %d (上位%d件で打ち切り)", read_count, slot_limit)
+                        return sorted(time_counts.items())
+                    time_counts[time_slot] = 0
+                time_counts[time_slot] += 1
+            
+            if len(times) < RESERVATION_PAGE_SIZE:
+                break
+        
+        logger.debug("取得した予約数: %d", read_count)
+        return sorted(time_counts.items())
+    
+    def display_snapshot(self):
+        """表示に使うデータのスナップショット"""
+        return {
+            'now_population': self.now_population,
+            'reservations': list(self.reservations),
+            'last_success_at': self.last_success_at,
+        }
     
     def update_display(self):
-        """表示を更新"""
+        """表示の更新を依頼（どのスレッドからでも呼べる）"""
+        self.dispatcher.submit('data', self.display_snapshot())
+    
+    def render_clock(self, time_str):
+        """時計を表示（メインスレッド専用）"""
+        if time_str != self.rendered_clock:
+            if self.compositor:
+                self.compositor.set_text('clock', time_str)
+            else:
+                self.datetime_label.config(text=time_str)
+            self.rendered_clock = time_str
+    
+    def arm_slot_expiry(self):
+        """次の時間帯が過ぎる時刻（なければ0時）にタイマーを設定（メインスレッド専用）"""
+        now = self.clock.now()
+        expiry = self.day_slots.next_expiry(now)
+        if self.expiry_timer is not None:
+            if expiry == self.expiry_at:
+                return
+            self.root.after_cancel(self.expiry_timer)
+        self.expiry_at = expiry
+        # 分の切り替わり直後に実行されるよう少し余裕を持たせる
+        delay_ms = max(0, int(self.clock.real_seconds((expiry - now).total_seconds()) * 1000)) + 50
+        self.expiry_timer = self.root.after(delay_ms, self.expire_slots)
+    
+    def expire_slots(self):
+        """時刻を過ぎた時間帯を表示から外して次の時間帯を繰り上げる（通信なし、メインスレッド専用）"""
+        self.expiry_timer = None
+        now = self.clock.now()
+        today = now.strftime("%Y-%m-%d")
+        if self.day_slots.date != today and self.reloaded_date != today:
+            # 日付が変わったら新しい日の予約を一度だけ取得し直す（listenモードでは再購読）
+            self.reloaded_date = today
+            logger.info(f"日付が変わったため予約を再取得: {today}")
+            self.request_refresh()
+        self.reservations = self.day_slots.upcoming(now, MAX_SLOTS)
+        self.render_display(self.display_snapshot())
+    
+    def render_display(self, snapshot):
+        """前回描画から変わったウィジェットだけを更新（メインスレッド専用）"""
+        # 表示中の時間帯が過ぎる時刻にタイマーを合わせる（画面が消えている間も動かす）
+        self.arm_slot_expiry()
+        if not self.display_on:
+            return  # 画面が消えている間は描画しない（再開時にまとめて反映）
         try:
-            # 待ち人数更新（数字のみ）
-            wait_text = f"{self.now_population}"
-            self.wait_count.config(text=wait_text)
-            print(f"待ち人数表示を更新: {wait_text}")
+            with span('render'):
+                start = time.perf_counter()
+                view = build_view_model(snapshot, self.clock.time())
+                changes = changed_fields(self.rendered_view, view)
+                
+                for key in changes:
+                    if self.compositor:
+                        # Canvas合成方式では変わった文字の画像だけを差し替える
+                        self.compositor.set_text(key, view[key])
+                    elif key == 'wait':
+                        # 待ち人数更新（数字のみ）
+                        self.wait_count.config(text=view['wait'])
+                        logger.info(f"待ち人数表示を更新: {view['wait']}")
+                    elif key == 'stale':
+                        if view['stale']:
+                            self.stale_label.config(text=view['stale'])
+                            self.place_stale_label()
+                        else:
+                            self.stale_label.place_forget()
+                    else:
+                        index = int(key[len('slot'):])
+                        self.reservation_labels[index].config(text=view[key])
+                        logger.debug("予約%d: %s", index + 1, view[key])
+                
+                self.rendered_view = view
+                self.metrics.observe('signage_render_seconds', time.perf_counter() - start)
+                self.metrics.inc('signage_render_widgets_total', len(changes))
             
-            # 予約情報更新（時間と人数のみ、「〇名」形式）
-            for i, label in enumerate(self.reservation_labels):
-                if i < len(self.reservations):
-                    time_slot, count = self.reservations[i]
-                    reservation_text = f"{time_slot}  {count}名"
-                    label.config(text=reservation_text)
-                    print(f"予約{i+1}: {reservation_text}")
-                else:
-                    label.config(text="")
+        except Exception as e:
+            logger.error(f"表示更新エラー: {e}")
+    
+    def check_loop_lag(self, expected_at=None):
+        """予定時刻からの遅れでTkのイベントループの詰まりを計測"""
+        now = time.monotonic()
+        if expected_at is not None:
+            self.metrics.observe('signage_ui_loop_lag_seconds', max(0.0, now - expected_at))
+        self.root.after(LOOP_LAG_PROBE_MS, self.check_loop_lag, now + LOOP_LAG_PROBE_MS / 1000)
+    
+    def collect_gauges(self):
+        """計測値の取得時に現在の状態を収集"""
+        gauges = []
+        for name, value in self.dispatcher.stats().items():
+            gauges.append((f'signage_ui_dispatcher_{name}', {}, value))
+        for name, value in self.backgrounds.cache.stats().items():
+            gauges.append((f'signage_background_cache_{name}', {}, value))
+        gauges.append(('signage_background_loads', {'source': 'pack'}, self.backgrounds.packed_loads))
+        gauges.append(('signage_background_loads', {'source': 'decode'}, self.backgrounds.decoded_loads))
+        gauges.append(('signage_population', {}, self.now_population))
+        gauges.append(('signage_poll_interval_seconds', {}, self.poll_interval))
+        gauges.append(('signage_display_on', {}, int(self.display_on)))
+        if self.last_success_at is not None:
+            gauges.append(('signage_last_success_timestamp_seconds', {}, self.last_success_at))
+        return gauges
+    
+    def start_control(self, control):
+        """操作用ソケットのコマンドを登録（単体で起動した場合はソケットも開始）"""
+        standalone = control is None
+        if standalone:
+            control = ControlServer()
+            control.register('ping', lambda: {'pid': os.getpid(), 'state': 'signage'})
+        control.register('force-refresh', self.request_refresh)
+        control.register('reload-background', self.reload_background)
+        control.register('reload-config', self.reload_config)
+        control.register('dump-state', self.dump_state)
+        control.register('dump-log', dump_recent_log)
+        control.register('record-start', self.start_recording)
+        control.register('record-stop', self.stop_recording)
+        if standalone:
+            control.start()
+        self.control = control
+    
+    def request_refresh(self):
+        """待ち時間を打ち切ってすぐに取得（listenモードでは再購読）"""
+        self.refresh_requested = True
+        self.refresh_event.set()
+        return {'data_mode': self.data_mode}
+    
+    def reload_background(self):
+        """プレイリストとアセットパックを読み直して背景を表示し直す"""
+        self.playlist = Playlist.from_config(self.config['playlist'])
+        self.backgrounds.reload_pack()
+        self.backgrounds.cache.clear()
+        image_name, _ = self.playlist.next_entry(self.clock.now())
+        image = self.prepare_background(image_name)
+        if image is not None:
+            self.front_background = image
+            self.dispatcher.submit('background', image)
+        return {'image': image_name, 'loaded': image is not None}
+    
+    def start_config_watch(self):
+        """設定ファイル（signage.jsonと従来のファイル）の変更を監視して反映"""
+        self.config_watcher = ConfigWatcher(self.core, lambda names: self.reload_config()).start()
+    
+    def reload_config(self):
+        """設定を読み直して、変わった設定の部分だけを作り直す（画面は消さない）"""
+        with self.config_lock:
+            old, self.config = self.config, load_config()
+            changed = []
             
-            # ウィジェットを最前面に持ってくる
-            self.bring_widgets_to_front()
+            rotation = self.read_rotation()
+            if rotation != self.rotation:
+                self.rotation = rotation
+                self.layout = load_layout(self.screen_size, rotation)
+                self.backgrounds.rotation = rotation
+                self.dispatcher.submit('layout', None)
+                self.reload_background()
+                changed.append('rotation')
+            elif self.config['playlist'] != old['playlist']:
+                self.reload_background()
+                changed.append('playlist')
             
-            # 強制的に画面を更新
-            self.root.update_idletasks()
+            render_backend = self.read_render_backend()
+            if render_backend != self.render_backend:
+                # 表示項目の作り直しはメインスレッドで行う
+                self.render_backend = render_backend
+                self.dispatcher.submit('renderer', render_backend)
+                changed.append('renderer')
             
+            data_mode = self.read_data_mode()
+            if data_mode != self.data_mode:
+                restart_monitoring = 'listen' in (data_mode, self.data_mode)
+                self.data_mode = data_mode
+                if restart_monitoring:
+                    # 定期取得とリアルタイム監視はタスクが異なるため、監視タスクを置き換える
+                    self.start_data_monitoring()
+                changed.append('data_mode')
+            
+            # 取得元が変わった時（未接続の場合は鍵ファイルが置かれた時）は作り直す
+            source_name = self.read_data_source()
+            if self.source is None or source_name != self.source.name:
+                self.init_firebase()
+                if self.source is not None:
+                    if self.data_mode == 'listen':
+                        self.start_data_monitoring()  # 新しい取得元で購読し直す
+                    changed.append('data_source')
+            
+            # 営業時間・取得間隔が変わった場合は作り直し、営業時間外の待機も計算し直させる
+            if self.config['schedule'] != old['schedule']:
+                self.hours, self.scheduler = schedule_from_config(self.config['schedule'])
+                changed.append('schedule')
+            self.refresh_event.set()
+            
+            if self.config['log_level'] != old['log_level']:
+                set_log_level(self.config['log_level'])
+                changed.append('log_level')
+            
+            if changed:
+                self.request_refresh()
+            logger.info(f"設定を再読み込み: 変更 {changed or 'なし'}")
+            return {'changed': changed, 'restart_required': []}
+    
+    def start_recording(self):
+        """待ち人数と本日の予約数の変化の記録を開始（traffic_replay.pyで再生できる）"""
+        if self.recorder is None:
+            path = os.path.join(TRACE_DIR, self.clock.now().strftime("trace-%Y%m%d-%H%M%S.jsonl"))
+            self.recorder = TrafficRecorder(path)
+            self.record_traffic()  # 記録開始時点の状態を最初の行にする
+        return {'path': self.recorder.path}
+    
+    def stop_recording(self):
+        """記録を終了"""
+        recorder, self.recorder = self.recorder, None
+        if recorder is None:
+            return {'path': None}
+        recorder.close()
+        return {'path': recorder.path, 'events': recorder.count}
+    
+    def record_traffic(self):
+        """記録中なら現在の待ち人数と本日の時間帯を記録（変わっていなければ何もしない）"""
+        recorder = self.recorder
+        if recorder is None:
+            return
+        try:
+            date, slots = self.day_slots.snapshot()
+            recorder.record(self.clock.time(), self.now_population, date, slots)
         except Exception as e:
-            print(f"表示更新エラー: {e}")
+            logger.error(f"トラフィックの記録エラー: {e}")
+    
+    def dump_state(self):
+        """表示中のデータと内部状態"""
+        state = {
+            'snapshot': self.display_snapshot(),
+            'rendered_view': dict(self.rendered_view),
+            'rendered_clock': self.rendered_clock,
+            'data_mode': self.data_mode,
+            'source': self.source.name if self.source else None,
+            'rotation': self.rotation,
+            'render_backend': self.render_backend,
+            'display_on': self.display_on,
+            'poll_interval': self.poll_interval,
+            'recording': self.recorder.path if self.recorder else None,
+            'screen_size': list(self.screen_size),
+            'slot_expiry_at': self.expiry_at.isoformat() if self.expiry_at else None,
+            'background_switch_at': self.background_switch_at.isoformat() if self.background_switch_at else None,
+            'dispatcher': self.dispatcher.stats(),
+            'tasks': self.core.task_names(),
+            'background_cache': self.backgrounds.cache.stats(),
+        }
+        if self.data_mode == 'listen':
+            state['listen_date'] = self.listen_date
+            state['listeners_active'] = self.listeners_active()
+        return state
     
     def run(self):
         """サイネージを実行"""
         self.root.mainloop()
 
 if __name__ == "__main__":
+    setup_logging()
+    install_signal_handler()
     app = SignageDisplay()
     app.run()
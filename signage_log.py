@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""ログの設定
+
+- 書き込みはQueueHandler経由で専用スレッドが行い、表示やデータ取得の処理を待たせない
+- signage.logは一定サイズで切り替え、古いものは決まった数だけ残す
+- 同じメッセージが続く場合は一定時間ごとに省略した回数だけを記録する
+- このリポジトリのモジュールの直近のデバッグログはファイルに書かずにメモリ上に保持し、
+  操作用ソケットから取り出せる（grpc・urllib3・PILなどのデバッグログは作成もしない）
+
+ログレベルは設定のlog_level（signage.jsonまたはloglevel.txt、DEBUG/INFO/WARNING/ERROR、既定はINFO）で
+指定し、動作中の変更はset_log_levelで反映する。
+"""
+
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from signage_config import load_config
+
+LOG_PATH = 'signage.log'
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+# メモリ上に保持する直近のログの行数
+RING_SIZE = 2000
+# 同じメッセージを省略する時間（秒）
+DUPLICATE_WINDOW = 300
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_listener = None
+_ring = None
+_level_handlers = []
+
+
+class RingBufferHandler(logging.Handler):
+    """直近のログをメモリ上に保持する"""
+
+    def __init__(self, capacity=RING_SIZE):
+        super().__init__(logging.DEBUG)
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        try:
+            self.records.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def lines(self, count=None):
+        lines = list(self.records)
+        return lines[-count:] if count else lines
+
+
+class DuplicateFilter(logging.Filter):
+    """同じメッセージは一定時間に1回だけ通し、省略した回数を次の出力に付ける"""
+
+    def __init__(self, window=DUPLICATE_WINDOW, clock=time.monotonic):
+        super().__init__()
+        self.window = window
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.seen = {}  # (ロガー名, レベル, メッセージ) -> [最後に出力した時刻, 省略した回数]
+
+    def filter(self, record):
+        message = record.getMessage()
+        key = (record.name, record.levelno, message)
+        now = self.clock()
+        with self.lock:
+            entry = self.seen.get(key)
+            if entry is not None and now - entry[0] < self.window:
+                entry[1] += 1
+                return False
+            if entry is not None and entry[1]:
+                record.msg = f"{message} (同じメッセージを{entry[1]}回省略)"
+                record.args = None
+            self.seen[key] = [now, 0]
+            if len(self.seen) > 1000:
+                # 時間が経ったものを削除（メッセージの種類が多い場合にも増え続けないように）
+                self.seen = {k: v for k, v in self.seen.items() if now - v[0] < self.window}
+        return True
+
+
+def read_log_level(path='loglevel.txt'):
+    """loglevel.txtからログレベルを読み込み"""
+    try:
+        with open(path, 'r') as f:
+            name = f.read().strip().upper()
+        if name in ('DEBUG', 'INFO', 'WARNING', 'ERROR'):
+            return getattr(logging, name)
+    except OSError:
+        pass
+    return logging.INFO
+
+
+def app_logger_names(directory=APP_DIR):
+    """このリポジトリのモジュールのロガー名（直近のログにデバッグログを残す対象）"""
+    names = {'__main__'}
+    for name in os.listdir(directory):
+        if name.endswith('.py'):
+            names.add(name[:-len('.py')])
+    return names
+
+
+def setup_logging(level=None, path=LOG_PATH, console=None):
+    """ログの出力先を設定（2回目以降の呼び出しでは何もしない）"""
+    global _listener, _ring
+    if _listener is not None:
+        return _ring
+    if level is None:
+        level = getattr(logging, load_config()['log_level'])
+    if console is None:
+        console = sys.stderr.isatty()
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8')
+    file_handler.setLevel(level)
+    file_handler.setFormatter(formatter)
+    file_handler.addFilter(DuplicateFilter())
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(level)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    # 直近のログもファイルと同じく専用スレッドで整形して保持する
+    _ring = RingBufferHandler()
+    _ring.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, *handlers, _ring, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    # ルートはファイルと同じレベルにし、デバッグログを作成するのはこのリポジトリのモジュールだけにする
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(QueueHandler(log_queue))
+    for name in app_logger_names():
+        logging.getLogger(name).setLevel(logging.DEBUG)
+    _level_handlers[:] = handlers
+    return _ring
+
+
+def set_log_level(name):
+    """ファイル・コンソールへの出力レベルを変更（このリポジトリのモジュールの直近のログは常にDEBUGから保持）"""
+    level = getattr(logging, name)
+    logging.getLogger().setLevel(level)
+    for handler in _level_handlers:
+        handler.setLevel(level)
+
+
+def recent_lines(count=None):
+    """直近のログ（デバッグを含む）"""
+    if _ring is None:
+        return []
+    return _ring.lines(count)
+
+
+def dump_recent_log():
+    """操作用ソケットのdump-logコマンド"""
+    return {'lines': recent_lines()}
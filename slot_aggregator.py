@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import threading
+from datetime import datetime, timedelta
+
+
+class SlotAggregator:
+    """予約ドキュメントの差分から時間帯ごとの予約数を保持する"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.doc_slots = {}    # ドキュメントID -> 時間帯
+        self.time_counts = {}  # 時間帯 -> 予約数
+
+    def clear(self):
+        """集計をリセット（日付が変わった時など）"""
+        with self.lock:
+            self.doc_slots.clear()
+            self.time_counts.clear()
+
+    def _add(self, time_slot):
+        self.time_counts[time_slot] = self.time_counts.get(time_slot, 0) + 1
+
+    def _remove(self, time_slot):
+        count = self.time_counts.get(time_slot, 0) - 1
+        if count > 0:
+            self.time_counts[time_slot] = count
+        else:
+            self.time_counts.pop(time_slot, None)
+
+    def apply_change(self, change_type, doc_id, data):
+        """ADDED/MODIFIED/REMOVEDの差分を1件反映"""
+        with self.lock:
+            old_slot = self.doc_slots.pop(doc_id, None)
+            if old_slot is not None:
+                self._remove(old_slot)
+
+            if change_type == 'REMOVED':
+                return
+
+            time_slot = (data or {}).get('Time', '')
+            self.doc_slots[doc_id] = time_slot
+            self._add(time_slot)
+
+    def upcoming(self, current_time, limit=5):
+        """現在時刻以降の時間帯を時間順に最大limit件返す"""
+        with self.lock:
+            slots = [item for item in self.time_counts.items() if item[0] >= current_time]
+        return sorted(slots)[:limit]
+
+
+class DaySlots:
+    """1日分の時間帯ごとの予約数を時間順に保持し、表示から外れる時刻を求める
+
+    時間帯は現在時刻（分単位）が時間帯の時刻を過ぎるまで表示するため、
+    "10:30"の時間帯は10:31になった時点で表示から外れる。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.date = None   # "YYYY-MM-DD"
+        self.times = []    # 時間順の時間帯
+        self.counts = {}   # 時間帯 -> 予約数
+
+    def replace(self, date, slots):
+        """その日の時間帯と予約数を入れ替え"""
+        counts = dict(slots)
+        with self.lock:
+            self.date = date
+            self.counts = counts
+            self.times = sorted(counts)
+
+    def snapshot(self):
+        """保持している日付と時間帯ごとの予約数 (日付, [(時間帯, 予約数), ...])"""
+        with self.lock:
+            return self.date, [(time_slot, self.counts[time_slot]) for time_slot in self.times]
+
+    def upcoming(self, now, limit=5):
+        """nowの時刻以降の時間帯を時間順に最大limit件（別の日のデータの場合は空）"""
+        with self.lock:
+            if now.strftime("%Y-%m-%d") != self.date:
+                return []
+            start = bisect.bisect_left(self.times, now.strftime("%H:%M"))
+            return [(time_slot, self.counts[time_slot]) for time_slot in self.times[start:start + limit]]
+
+    def next_expiry(self, now):
+        """次に表示が変わる時刻（先頭の時間帯が過ぎる時刻、なければ翌日の0時）"""
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        with self.lock:
+            if now.strftime("%Y-%m-%d") != self.date:
+                return midnight
+            start = bisect.bisect_left(self.times, now.strftime("%H:%M"))
+            if start == len(self.times):
+                return midnight
+            first = self.times[start]
+        try:
+            expiry = datetime.strptime(f"{self.date} {first}", "%Y-%m-%d %H:%M") + timedelta(minutes=1)
+        except ValueError:
+            return midnight  # 時刻の形式でない時間帯
+        return min(expiry, midnight)
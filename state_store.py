@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import sqlite3
+import threading
+import time
+
+# SDカードへの書き込みをまとめる間隔（秒）
+FLUSH_INTERVAL = 300
+
+
+class StateStore:
+    """最後に取得できたデータを保存する端末内のSQLiteジャーナル
+
+    記録は一旦メモリに保持し、FLUSH_INTERVALごとに最新値だけをまとめて書き込む
+    """
+
+    def __init__(self, path='signage_state.db', flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending = {}  # キー -> (JSON文字列, 取得時刻)
+        self.last_flush = time.time()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS state ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self.conn.commit()
+
+    def load(self, key):
+        """保存済みの値と取得時刻を返す（ない場合は (None, None)）"""
+        with self.lock:
+            if key in self.pending:
+                value, updated_at = self.pending[key]
+                return json.loads(value), updated_at
+            row = self.conn.execute(
+                'SELECT value, updated_at FROM state WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def record(self, key, value, updated_at=None):
+        """取得成功したデータを記録（書き込みは間隔ごとにまとめて行う）"""
+        if updated_at is None:
+            updated_at = time.time()
+        with self.lock:
+            self.pending[key] = (json.dumps(value, ensure_ascii=False), updated_at)
+            due = updated_at - self.last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """保留中の記録をまとめて書き込み"""
+        with self.lock:
+            self.last_flush = time.time()
+            if not self.pending:
+                return
+            rows = [(key, value, updated_at) for key, (value, updated_at) in self.pending.items()]
+            self.pending.clear()
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO state (key, value, updated_at) VALUES (?, ?, ?)', rows
+            )
+            self.conn.commit()
+
+    def close(self):
+        """保留中の記録を書き込んで閉じる"""
+        self.flush()
+        with self.lock:
+            self.conn.close()
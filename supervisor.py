@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""サイネージのプロセスを起動・監視・再起動するスーパーバイザー
+
+    python3 supervisor.py start    # バックグラウンドで開始（出力はsignage.out）
+    python3 supervisor.py stop     # サイネージごと停止
+    python3 supervisor.py status   # 動作状況と再起動の記録の集計
+    python3 supervisor.py run      # フォアグラウンドで実行（systemdなどから使う場合）
+
+main.pyを子プロセスとして起動し、heartbeat.pyのハートビートをパイプで受け取る。
+- 子プロセスが終了した場合（exit/crash）は再起動する
+- ハートビートが猶予を過ぎても届かない場合（hang）は、全スレッドのスタックを
+  hang_stacks.logに出力させてから停止し、再起動する
+- 短時間で再起動を繰り返す場合は待ち時間を倍々に延ばす（安定して動いた後は戻す）
+
+再起動のたびに原因をrestarts.jsonlに1行ずつ追記する。
+    {"time": "2026-10-18 09:12:03", "cause": "hang", "stale": ["ui"], "exit_code": -15,
+     "uptime": 5234.1, "restarts": 3, "backoff": 2, "stacks": {"path": "hang_stacks.log", "offset": 18231}}
+"""
+
+import argparse
+import json
+import logging
+import os
+import selectors
+import signal
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from heartbeat import HEARTBEAT_FD_ENV, RESTARTS_ENV, STACK_DUMP_ENV, STACK_DUMP_SIGNAL
+from signage_log import setup_logging
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PID_PATH = os.path.join(SCRIPT_DIR, 'supervisor.pid')
+RESTART_LOG = os.path.join(SCRIPT_DIR, 'restarts.jsonl')
+STACK_DUMP_PATH = os.path.join(SCRIPT_DIR, 'hang_stacks.log')
+OUTPUT_PATH = os.path.join(SCRIPT_DIR, 'signage.out')
+
+# 起動から最初のuiハートビートまでの猶予（秒）
+STARTUP_GRACE = 60
+# ハートビートの期限を確認する間隔（秒）
+CHECK_INTERVAL = 1
+# スタックの出力を指示してから停止するまで待つ秒数
+DUMP_WAIT = 2
+# SIGTERMで終了しない場合にSIGKILLするまでの秒数
+STOP_TIMEOUT = 10
+# 再起動の待ち時間（秒）: BACKOFF_BASE, 2倍, 4倍... BACKOFF_MAXまで
+BACKOFF_BASE = 2
+BACKOFF_MAX = 300
+# この秒数以上動いてから終了した場合は待ち時間を最初に戻す
+STABLE_SECONDS = 600
+
+
+class HeartbeatMonitor:
+    """ハートビートの行を読み、名前ごとの期限を管理する
+
+    requiredの名前は起動からstartup_grace秒以内に届く必要がある。
+    それ以外の名前は最初に届いた時点から監視する。
+    """
+
+    def __init__(self, started, startup_grace=STARTUP_GRACE, required=('ui',)):
+        self.deadlines = {name: started + startup_grace for name in required}
+        self.last = {}
+        self.buffer = b''
+
+    def feed(self, data, now):
+        """パイプから読んだバイト列を処理（行の途中で切れた分は次回に回す）"""
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b'\n')
+        for line in lines:
+            try:
+                name, within = line.decode('ascii').split()
+                within = float(within)
+            except ValueError:
+                logger.warning(f"不正なハートビートを無視します: {line!r}")
+                continue
+            self.deadlines[name] = now + within
+            self.last[name] = now
+
+    def stale(self, now):
+        """期限を過ぎた名前（なければ空のリスト）"""
+        return sorted(name for name, deadline in self.deadlines.items() if now > deadline)
+
+
+def backoff_seconds(failures, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+    """続けて失敗した回数に応じた再起動までの待ち時間"""
+    if failures <= 0:
+        return 0
+    return min(maximum, base * 2 ** (failures - 1))
+
+
+class Supervisor:
+    """子プロセスを起動し、終了・ハングを検知して再起動する"""
+
+    def __init__(self, command, restart_log=RESTART_LOG, stack_path=STACK_DUMP_PATH,
+                 startup_grace=STARTUP_GRACE, check_interval=CHECK_INTERVAL, dump_wait=DUMP_WAIT,
+                 stop_timeout=STOP_TIMEOUT, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX,
+                 stable_seconds=STABLE_SECONDS, clock=time.monotonic):
+        self.command = command
+        self.restart_log = restart_log
+        self.stack_path = stack_path
+        self.startup_grace = startup_grace
+        self.check_interval = check_interval
+        self.dump_wait = dump_wait
+        self.stop_timeout = stop_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_seconds = stable_seconds
+        self.clock = clock
+        self.restarts = 0
+        self.failures = 0
+        self.stopping = False
+
+    def stop(self, *args):
+        """監視を終了する（シグナルハンドラーとしても使う）"""
+        self.stopping = True
+
+    def run(self):
+        """停止を指示されるまで起動・再起動を繰り返す"""
+        while not self.stopping:
+            record = self.run_once()
+            if record is None:
+                break
+            self.sleep(record['backoff'])
+
+    def run_once(self):
+        """子プロセスを1回起動して終了・ハングまで監視し、記録を返す（停止を指示された場合None）"""
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(write_fd, False)
+        env = dict(os.environ)
+        env[HEARTBEAT_FD_ENV] = str(write_fd)
+        env[STACK_DUMP_ENV] = self.stack_path
+        env[RESTARTS_ENV] = str(self.restarts)
+        try:
+            process = subprocess.Popen(self.command, env=env, pass_fds=(write_fd,))
+        finally:
+            os.close(write_fd)
+        started = self.clock()
+        logger.info(f"起動しました: pid {process.pid}")
+
+        try:
+            cause, stale = self.watch(process, read_fd, HeartbeatMonitor(started, self.startup_grace))
+        finally:
+            os.close(read_fd)
+
+        stacks = None
+        if cause == 'hang':
+            logger.error(f"ハートビートが途絶えました: {', '.join(stale)}")
+            stacks = self.dump_stacks(process, stale)
+        exit_code = self.terminate(process)
+        if cause == 'stop':
+            return None
+
+        uptime = self.clock() - started
+        if uptime >= self.stable_seconds:
+            self.failures = 0
+        self.failures += 1
+        self.restarts += 1
+        record = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'cause': cause,
+            'stale': stale,
+            'exit_code': exit_code,
+            'uptime': round(uptime, 1),
+            'restarts': self.restarts,
+            'backoff': backoff_seconds(self.failures, self.backoff_base, self.backoff_max),
+        }
+        if stacks is not None:
+            record['stacks'] = stacks
+        logger.warning(f"再起動します（{cause}, 終了コード {exit_code}, {record['backoff']}秒後）")
+        self.write_record(record)
+        return record
+
+    def watch(self, process, read_fd, monitor):
+        """終了・ハング・停止の指示のいずれかまで待つ"""
+        with selectors.DefaultSelector() as selector:
+            selector.register(read_fd, selectors.EVENT_READ)
+            while True:
+                for key, _ in selector.select(self.check_interval):
+                    data = os.read(read_fd, 4096)
+                    if data:
+                        monitor.feed(data, self.clock())
+                    else:
+                        selector.unregister(read_fd)  # 子プロセスが書き込み側を閉じた
+                code = process.poll()
+                if code is not None:
+                    return ('exit' if code == 0 else 'crash'), []
+                if self.stopping:
+                    return 'stop', []
+                stale = monitor.stale(self.clock())
+                if stale:
+                    return 'hang', stale
+
+    def dump_stacks(self, process, stale):
+        """子プロセスに全スレッドのスタックを出力させ、出力先と位置を返す"""
+        try:
+            with open(self.stack_path, 'a') as f:
+                f.write(f"\n=== {time.strftime('%Y-%m-%d %H:%M:%S')} pid {process.pid} "
+                        f"ハートビートなし: {', '.join(stale)} ===\n")
+                offset = f.tell()
+            process.send_signal(STACK_DUMP_SIGNAL)
+            process.wait(self.dump_wait)
+        except subprocess.TimeoutExpired:
+            pass
+        except OSError as e:
+            logger.error(f"スタックを出力できません: {e}")
+            return None
+        return {'path': os.path.basename(self.stack_path), 'offset': offset}
+
+    def terminate(self, process):
+        """子プロセスを終了させて終了コードを返す"""
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(self.stop_timeout)
+            except subprocess.TimeoutExpired:
+                logger.warning("SIGTERMで終了しないため強制終了します")
+                process.kill()
+        return process.wait()
+
+    def write_record(self, record):
+        try:
+            with open(self.restart_log, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logger.error(f"再起動の記録エラー: {e}")
+
+    def sleep(self, seconds):
+        """停止の指示を確認しながら待つ"""
+        deadline = self.clock() + seconds
+        while not self.stopping and self.clock() < deadline:
+            time.sleep(min(self.check_interval, deadline - self.clock()))
+
+
+def load_records(path=RESTART_LOG):
+    """再起動の記録を読み込み（壊れた行は読み飛ばす）"""
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def summarize_records(records, recent=5):
+    """原因ごとの回数と直近の記録"""
+    return {
+        'total': len(records),
+        'causes': dict(Counter(record.get('cause') for record in records)),
+        'recent': records[-recent:],
+    }
+
+
+def read_pid(path=PID_PATH):
+    """動作中のスーパーバイザーのpid（動いていなければNone）"""
+    try:
+        with open(path, 'r') as f:
+            pid = int(f.read().strip())
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            if b'supervisor.py' not in f.read():
+                return None  # pidが別のプロセスに再利用されている
+        return pid
+    except (OSError, ValueError):
+        return None
+
+
+def run_foreground():
+    os.chdir(SCRIPT_DIR)
+    setup_logging(path=os.path.join(SCRIPT_DIR, 'supervisor.log'))
+    supervisor = Supervisor([sys.executable, os.path.join(SCRIPT_DIR, 'main.py')])
+    signal.signal(signal.SIGTERM, supervisor.stop)
+    signal.signal(signal.SIGINT, supervisor.stop)
+    with open(PID_PATH, 'w') as f:
+        f.write(str(os.getpid()))
+    try:
+        supervisor.run()
+    finally:
+        try:
+            os.unlink(PID_PATH)
+        except OSError:
+            pass
+    logger.info("スーパーバイザーを終了しました")
+    return 0
+
+
+def start_background():
+    pid = read_pid()
+    if pid is not None:
+        print(f"すでに動作中です（pid {pid}）")
+        return 0
+    with open(OUTPUT_PATH, 'a') as output:
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), 'run'],
+            cwd=SCRIPT_DIR, stdin=subprocess.DEVNULL, stdout=output, stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    print(f"開始しました（pid {process.pid}）")
+    return 0
+
+
+def stop_background():
+    pid = read_pid()
+    if pid is None:
+        print("動作していません")
+        return 0
+    os.kill(pid, signal.SIGTERM)
+    # 子プロセスの終了（SIGTERMで終わらなければSIGKILL）まで待つ
+    deadline = time.monotonic() + STOP_TIMEOUT + DUMP_WAIT + 5
+    while time.monotonic() < deadline:
+        if read_pid() is None:
+            print("停止しました")
+            return 0
+        time.sleep(0.2)
+    # startで開始した場合はプロセスグループごと（サイネージも含めて）終了させる
+    if os.getpgid(pid) == pid:
+        os.killpg(pid, signal.SIGKILL)
+    else:
+        os.kill(pid, signal.SIGKILL)
+    print("応答がないため強制終了しました")
+    return 1
+
+
+def show_status():
+    pid = read_pid()
+    print(json.dumps({
+        'running': pid is not None,
+        'pid': pid,
+        'restarts': summarize_records(load_records()),
+    }, ensure_ascii=False, indent=2))
+    return 0 if pid is not None else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='サイネージの起動・監視・再起動')
+    parser.add_argument('command', choices=('run', 'start', 'stop', 'status'))
+    args = parser.parse_args()
+    return {
+        'run': run_foreground,
+        'start': start_background,
+        'stop': stop_background,
+        'status': show_status,
+    }[args.command]()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,52 +3,74 @@
 # サイネージシステム制御スクリプト
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
-PROCESS_NAME="main.py"
+# 仮想環境が存在する場合はそのPythonを使用
+if [ -x "$SCRIPT_DIR/venv/bin/python" ]; then
+    PYTHON="$SCRIPT_DIR/venv/bin/python"
+else
+    PYTHON="python3"
+fi
 
 show_usage() {
-    echo "使用方法: $0 [start|stop|restart|status|reset|logs]"
+    echo "使用方法: $0 [start|stop|restart|status|reset|logs|restarts|refresh|reload-background|reload-config|dump-state|debug-log|record-start|record-stop|profile]"
     echo ""
-    echo "  start   - サイネージシステムを開始"
+    echo "  start   - サイネージシステムを開始（supervisor.pyが監視し、終了・ハング時は再起動）"
     echo "  stop    - サイネージシステムを停止"
     echo "  restart - サイネージシステムを再起動"
     echo "  status  - 現在の状態を確認"
+    echo "  restarts - 再起動の回数と原因を表示"
     echo "  reset   - 設定をリセット（初期設定から開始）"
     echo "  logs    - ログを表示"
+    echo "  debug-log - 直近のデバッグログを表示（ファイルには書かれない詳細）"
+    echo ""
+    echo "  動作中のサイネージへの操作（再起動なし）:"
+    echo "  refresh           - データをすぐに再取得"
+    echo "  reload-background - 背景画像・プレイリストを読み直す"
+    echo "  reload-config     - signage.json・rotate.txtなどの設定を読み直す（変更は自動でも反映される）"
+    echo "  dump-state        - 表示中のデータと内部状態を表示"
+    echo "  record-start      - 待ち人数・予約数の変化の記録を開始（traffic_replay.pyで再生）"
+    echo "  record-stop       - 記録を終了"
+    echo "  profile [秒数]    - プロファイルを計測してprofiles/に書き出す（計測中に再実行すると終了）"
 }
 
 start_system() {
     echo "サイネージシステムを開始しています..."
-    cd "$SCRIPT_DIR"
-    
-    # 仮想環境が存在する場合は使用
-    if [ -d "$SCRIPT_DIR/venv" ]; then
-        nohup "$SCRIPT_DIR/start_signage.sh" > signage.log 2>&1 &
-    else
-        nohup python3 main.py > signage.log 2>&1 &
-    fi
-    echo "システムが開始されました。"
+    (cd "$SCRIPT_DIR" && "$PYTHON" supervisor.py start)
 }
 
 stop_system() {
     echo "サイネージシステムを停止しています..."
-    pkill -f "$PROCESS_NAME"
-    pkill -f "setup_window.py"
-    pkill -f "signage_display.py"
-    echo "システムが停止されました。"
+    (cd "$SCRIPT_DIR" && "$PYTHON" supervisor.py stop)
 }
 
 restart_system() {
     stop_system
-    sleep 3
     start_system
 }
 
+profile_signage() {
+    # 計測する秒数は設定に保存（既定30秒）
+    if [ -n "$1" ]; then
+        (cd "$SCRIPT_DIR" && "$PYTHON" signage_config.py set profile_seconds "$1") || return 1
+    fi
+    if ! pid=$(send_control ping 2>/dev/null | "$PYTHON" -c 'import json, sys; print(json.load(sys.stdin)["pid"])'); then
+        echo "✗ サイネージシステムは停止中です（操作用ソケットの応答なし）"
+        return 1
+    fi
+    kill -USR1 "$pid"
+    echo "プロファイルの計測を開始・終了しました（pid $pid、結果は$SCRIPT_DIR/profiles/）"
+}
+
+send_control() {
+    # 動作中のプロセスの操作用ソケットにコマンドを送る
+    (cd "$SCRIPT_DIR" && "$PYTHON" control_socket.py "$1")
+}
+
 check_status() {
-    if pgrep -f "$PROCESS_NAME" > /dev/null; then
+    if ping_result=$(send_control ping 2>/dev/null); then
         echo "✓ サイネージシステムは動作中です"
-        echo "プロセスID: $(pgrep -f "$PROCESS_NAME")"
+        echo "$ping_result" | sed 's/^/  /'
     else
-        echo "✗ サイネージシステムは停止中です"
+        echo "✗ サイネージシステムは停止中です（操作用ソケットの応答なし）"
     fi
     
     echo ""
@@ -60,19 +82,15 @@ check_status() {
         echo "  初期設定: 設定ファイルが見つかりません"
     fi
     
-    if [ -f "$SCRIPT_DIR/rotate.txt" ]; then
-        rotate_status=$(cat "$SCRIPT_DIR/rotate.txt")
-        echo "  画面回転: $rotate_status (0=通常, 1=180度回転)"
-    else
-        echo "  画面回転: 設定ファイルが見つかりません"
-    fi
+    rotate_status=$(cd "$SCRIPT_DIR" && "$PYTHON" -c 'from signage_config import load_config; print(load_config()["rotation"])' 2>/dev/null)
+    echo "  画面回転: ${rotate_status:-不明} (0=通常, 1=180度回転)"
     
     echo ""
     echo "ネットワーク状況:"
-    if ping -c 1 google.com > /dev/null 2>&1; then
-        echo "  ✓ インターネット接続: 正常"
+    if connectivity_result=$(cd "$SCRIPT_DIR" && "$PYTHON" connectivity.py 2>/dev/null); then
+        echo "  ✓ インターネット接続: 正常 ($connectivity_result)"
     else
-        echo "  ✗ インターネット接続: 異常"
+        echo "  ✗ インターネット接続: 異常 ($connectivity_result)"
     fi
 }
 
@@ -82,10 +100,12 @@ reset_settings() {
     
     # 設定ファイルをリセット
     echo "0" > "$SCRIPT_DIR/setup.txt"
-    echo "0" > "$SCRIPT_DIR/rotate.txt"
+    (cd "$SCRIPT_DIR" && "$PYTHON" signage_config.py set rotation 0)
     
     # ログファイルをクリア
+    rm -f "$SCRIPT_DIR"/signage.log.*
     : > "$SCRIPT_DIR/signage.log"
+    : > "$SCRIPT_DIR/signage.out"
     
     echo "設定がリセットされました。次回起動時に初期設定が表示されます。"
 }
@@ -97,6 +117,12 @@ show_logs() {
     else
         echo "ログファイルが見つかりません。"
     fi
+    # ログ設定前の出力や異常終了時のトレースバック
+    if [ -s "$SCRIPT_DIR/signage.out" ]; then
+        echo ""
+        echo "=== 標準出力・標準エラー ==="
+        tail -20 "$SCRIPT_DIR/signage.out"
+    fi
 }
 
 # メイン処理
@@ -124,6 +150,21 @@ case "$1" in
     logs)
         show_logs
         ;;
+    restarts)
+        (cd "$SCRIPT_DIR" && "$PYTHON" supervisor.py status)
+        ;;
+    refresh)
+        send_control force-refresh
+        ;;
+    reload-background|reload-config|dump-state|record-start|record-stop)
+        send_control "$1"
+        ;;
+    debug-log)
+        send_control dump-log
+        ;;
+    profile)
+        profile_signage "$2"
+        ;;
     *)
         show_usage
         exit 1
@@ -0,0 +1,141 @@
+import os
+import tkinter as tk
+
+import pytest
+from PIL import Image
+
+from background import BackgroundLibrary, FrameCache, frame_bytes
+
+SMALL_SIZE = (108, 192)
+
+
+def make_images(directory, count=10):
+    for i in range(1, count + 1):
+        Image.new('RGB', (192, 108), (i * 20, 0, 0)).save(os.path.join(directory, f"{i}.png"))
+
+
+def read_rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def test_cache_evicts_least_recently_used_within_budget():
+    frame = Image.new('RGB', SMALL_SIZE)
+    cache = FrameCache(budget_bytes=frame_bytes(frame) * 2)
+    cache.put('a', frame)
+    cache.put('b', frame.copy())
+    assert cache.get('a') is frame  # aを最近使ったことにする
+    cache.put('c', frame.copy())
+
+    assert cache.get('b') is None
+    assert cache.get('a') is frame
+    assert cache.stats()['bytes'] <= cache.budget_bytes
+
+
+def test_cache_skips_frames_larger_than_budget():
+    cache = FrameCache(budget_bytes=10)
+    cache.put('big', Image.new('RGB', SMALL_SIZE))
+    assert cache.stats()['frames'] == 0
+
+
+def test_library_rotates_and_resizes(tmp_path):
+    make_images(str(tmp_path))
+    library = BackgroundLibrary(rotation=1, size=SMALL_SIZE, directory=str(tmp_path))
+    frame = library.frame_for_hour(13)
+
+    assert library.image_path(13).endswith('4.png')
+    assert frame.size == SMALL_SIZE
+    assert library.frame_for_hour(13) is frame  # 2回目はキャッシュから
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/statm'), reason='RSSを取得できない環境')
+def test_soak_rss_stays_flat_across_hour_changes(tmp_path):
+    make_images(str(tmp_path))
+    budget = frame_bytes(Image.new('RGB', SMALL_SIZE)) * 3
+    library = BackgroundLibrary(size=SMALL_SIZE, directory=str(tmp_path), cache=FrameCache(budget))
+
+    # 立ち上がりを除いてから計測
+    for hour in range(240):
+        library.frame_for_hour(hour % 24)
+    baseline = read_rss_bytes()
+
+    for hour in range(3000):
+        library.frame_for_hour(hour % 24)
+    growth = read_rss_bytes() - baseline
+
+    assert library.cache.stats()['frames'] <= 3
+    assert growth < 2 * 1024 * 1024
+
+
+@pytest.fixture
+def tk_root():
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        pytest.skip(f"Tkを起動できない環境: {e}")
+    yield root
+    root.destroy()
+
+
+def count_widgets(widget):
+    return sum(1 + count_widgets(child) for child in widget.winfo_children())
+
+
+@pytest.mark.parametrize('backend', ['label', 'canvas'])
+def test_soak_apply_background_reuses_widgets_and_images(tk_root, backend):
+    from canvas_compositor import CanvasCompositor
+    from signage_display import SignageDisplay
+
+    display = SignageDisplay.__new__(SignageDisplay)
+    display.main_frame = tk.Frame(tk_root)
+    display.compositor = CanvasCompositor(display.main_frame) if backend == 'canvas' else None
+    display.bg_label = None
+    display.background_photo = None
+    display.bring_widgets_to_front = lambda: None
+
+    # サイズの違う画像を交互に表示して、画像を作り直す経路も通す
+    frames = [Image.new('RGB', SMALL_SIZE, (i * 20, 0, 0)) for i in range(1, 6)]
+    frames += [Image.new('RGB', (SMALL_SIZE[0] + 2, SMALL_SIZE[1]), (0, i * 20, 0)) for i in range(1, 6)]
+
+    def rotate(count):
+        for i in range(count):
+            display.apply_background(frames[i % len(frames)])
+            tk_root.update_idletasks()
+
+    rotate(len(frames))
+    widgets = count_widgets(tk_root)
+    images = len(tk_root.image_names())
+
+    rotate(500)
+
+    assert count_widgets(tk_root) == widgets
+    assert len(tk_root.image_names()) == images
+
+
+def test_asset_pack_is_used_and_rebuilt_only_on_change(tmp_path):
+    import asset_pack
+
+    directory = str(tmp_path)
+    pack_dir = os.path.join(directory, asset_pack.PACK_DIR)
+    make_images(directory, count=2)
+
+    assert asset_pack.build_pack(directory, pack_dir, sizes=(SMALL_SIZE,)) == 4
+    assert asset_pack.build_pack(directory, pack_dir, sizes=(SMALL_SIZE,)) == 0
+
+    library = BackgroundLibrary(rotation=1, size=SMALL_SIZE, directory=directory)
+    packed = library.frame(os.path.join(directory, '1.png'))
+    decoded = BackgroundLibrary(rotation=1, size=SMALL_SIZE, directory=directory, use_pack=False).frame(
+        os.path.join(directory, '1.png')
+    )
+    assert library.packed_loads == 1 and library.decoded_loads == 0
+    assert packed.tobytes() == decoded.tobytes()
+
+    # 元画像を変更すると、パックを作り直すまでは元画像から加工する
+    Image.new('RGB', (192, 108), (0, 255, 0)).save(os.path.join(directory, '1.png'))
+    os.utime(os.path.join(directory, '1.png'), (1, 1))
+    stale = BackgroundLibrary(rotation=1, size=SMALL_SIZE, directory=directory)
+    stale.frame(os.path.join(directory, '1.png'))
+    assert stale.decoded_loads == 1
+
+    assert asset_pack.build_pack(directory, pack_dir, sizes=(SMALL_SIZE,)) == 2
+    assert len([name for name in os.listdir(pack_dir) if name.endswith('.rgb')]) == 4
@@ -0,0 +1,53 @@
+import pytest
+
+import bench_display
+from bench_display import compare_reports, count_widgets, flatten, median_of, summarize_soak
+
+
+class FakeWidget:
+    def __init__(self, *children):
+        self.children = children
+
+    def winfo_children(self):
+        return list(self.children)
+
+
+def test_count_widgets_walks_the_tree():
+    root = FakeWidget(FakeWidget(FakeWidget(), FakeWidget()), FakeWidget())
+    assert count_widgets(root) == 5
+
+
+def test_summarize_soak_reports_rates_after_warmup():
+    samples = [
+        {'trace_hours': h, 'cpu_seconds': 2.0 + h * 0.5, 'rss_kb': 50000 + (0 if h == 0 else 1000 + h * 10),
+         'widgets': 12, 'threads': 5, 'dispatcher_depth': 0}
+        for h in range(0, 49)
+    ]
+    summary = summarize_soak(samples)
+    assert summary['trace_hours'] == 48
+    assert summary['cpu_seconds_per_trace_hour'] == pytest.approx(0.5)
+    # 起動直後の増加（1時間目まで）は含めない
+    assert summary['rss_growth_kb_per_day'] == pytest.approx(240)
+    assert summary['widgets'] == {'start': 12, 'end': 12, 'max': 12}
+    assert summary['rss_kb']['max'] == 51480
+
+
+def test_compare_flags_regressions_only_above_threshold():
+    base = {'meta': {'git': 'a'}, 'startup': {'signage': {'first_frame_seconds': 1.0, 'widgets': 12}},
+            'soak': {'samples': [{'rss_kb': 1}], 'threads_max': 5}}
+    new = {'meta': {'git': 'b'}, 'startup': {'signage': {'first_frame_seconds': 1.05, 'widgets': 20}},
+           'soak': {'samples': [{'rss_kb': 2}], 'threads_max': 4}}
+    assert set(flatten(base)) == {'startup.signage.first_frame_seconds', 'startup.signage.widgets', 'soak.threads_max'}
+
+    worse = {name for name, _, _, _, regressed in compare_reports(base, new) if regressed}
+    assert worse == {'startup.signage.widgets'}
+
+
+def test_median_of_runs():
+    assert median_of([{'a': 1, 'b': 5}, {'a': 3, 'b': 1}, {'a': 2, 'b': 3}]) == {'a': 2, 'b': 3}
+
+
+def test_missing_xvfb_is_reported(monkeypatch):
+    monkeypatch.setattr(bench_display.shutil, 'which', lambda name: None)
+    with pytest.raises(RuntimeError, match='Xvfb'):
+        bench_display.start_xvfb()
@@ -0,0 +1,75 @@
+import json
+from datetime import datetime
+
+from business_hours import BusinessHours, PollScheduler, load_schedule
+
+WEEKDAYS = {day: ['09:00', '20:00'] for day in ('mon', 'tue', 'thu', 'fri')}
+
+
+def hours(**overrides):
+    config = dict(WEEKDAYS, wed=None, sat=['18:00', '02:00'], sun=None)
+    config.update(overrides)
+    return BusinessHours(config, busy=[['11:30', '13:30']], wake_before_minutes=30, sleep_after_minutes=15)
+
+
+def test_open_includes_wake_and_sleep_margins():
+    shop = hours()
+    # 2026-10-19は月曜日
+    assert not shop.is_open(datetime(2026, 10, 19, 8, 29))
+    assert shop.is_open(datetime(2026, 10, 19, 8, 30))
+    assert shop.is_open(datetime(2026, 10, 19, 20, 14))
+    assert not shop.is_open(datetime(2026, 10, 19, 20, 15))
+
+
+def test_overnight_hours_and_closed_days():
+    shop = hours()
+    # 土曜18:00～日曜2:00の営業（日曜は定休日）
+    assert shop.is_open(datetime(2026, 10, 25, 1, 30))
+    assert not shop.is_open(datetime(2026, 10, 25, 3, 0))
+    # 火曜閉店後から木曜の開店前まで（水曜は定休日）
+    assert shop.seconds_until_open(datetime(2026, 10, 20, 21, 0)) == (36 * 60 - 30) * 60
+
+
+def test_without_hours_is_always_open():
+    shop = BusinessHours()
+    assert shop.is_open(datetime(2026, 10, 21, 3, 0))
+    assert shop.seconds_until_open(datetime(2026, 10, 21, 3, 0)) == 0
+
+
+def test_busy_windows():
+    shop = hours()
+    assert shop.is_busy(datetime(2026, 10, 19, 12, 0))
+    assert not shop.is_busy(datetime(2026, 10, 19, 14, 0))
+
+
+def test_interval_grows_while_idle_and_resets_on_change():
+    scheduler = PollScheduler(fast_seconds=10, idle_seconds=60, growth=2)
+    assert [scheduler.next_interval(False, False) for _ in range(4)] == [20, 40, 60, 60]
+    assert scheduler.next_interval(True, False) == 10
+    scheduler.next_interval(False, False)
+    assert scheduler.next_interval(False, False, busy=True) == 10
+
+
+def test_error_backoff_is_capped_and_jittered():
+    scheduler = PollScheduler(error_base_seconds=10, error_max_seconds=60, rng=lambda: 1.0)
+    assert [scheduler.next_interval(False, True) for _ in range(5)] == [10, 20, 40, 60, 60]
+
+    low = PollScheduler(error_base_seconds=10, error_max_seconds=60, rng=lambda: 0.0)
+    assert [low.next_interval(False, True) for _ in range(3)] == [5, 10, 20]
+    # 成功したらバックオフを解除
+    low.next_interval(False, False)
+    assert low.next_interval(False, True) == 5
+
+
+def test_missing_config_keeps_legacy_ten_second_polling(tmp_path):
+    shop, scheduler = load_schedule(str(tmp_path / 'hours.json'))
+    assert shop.is_open(datetime(2026, 10, 21, 3, 0))
+    assert [scheduler.next_interval(False, False) for _ in range(3)] == [10, 10, 10]
+
+
+def test_config_file(tmp_path):
+    path = tmp_path / 'hours.json'
+    path.write_text(json.dumps({'hours': WEEKDAYS, 'poll': {'fast_seconds': 5, 'idle_seconds': 120}}))
+    shop, scheduler = load_schedule(str(path))
+    assert not shop.is_open(datetime(2026, 10, 21, 12, 0))
+    assert scheduler.fast_seconds == 5 and scheduler.idle_seconds == 120
@@ -0,0 +1,72 @@
+from canvas_compositor import GlyphAtlas, TextRun, find_font_path
+
+
+class FakeCanvas:
+    """Canvasへの操作を記録する"""
+
+    def __init__(self):
+        self.operations = []
+        self.next_id = 1
+
+    def create_image(self, x, y, image=None, anchor=None):
+        self.operations.append(('create', x, y, image))
+        self.next_id += 1
+        return self.next_id - 1
+
+    def itemconfig(self, item, **options):
+        self.operations.append(('config', item, options))
+
+    def coords(self, item, x, y):
+        self.operations.append(('coords', item, x, y))
+
+    def move(self, item, dx, dy):
+        self.operations.append(('move', item, dx, dy))
+
+
+def make_atlas(size=40):
+    atlas = GlyphAtlas(find_font_path(), size, '#ffffff')
+    # PhotoImageはTkが必要なため文字そのものを代わりに使う
+    atlas.photo = lambda char: char
+    return atlas
+
+
+def test_atlas_prerenders_charset_with_transparent_background():
+    atlas = make_atlas()
+    assert '名' in atlas.glyphs and '0' in atlas.glyphs
+    image, advance = atlas.glyph('8')
+    assert image.mode == 'RGBA'
+    assert image.getpixel((0, 0))[3] == 0
+    assert advance > 0
+
+
+def test_atlas_adds_missing_glyph_on_demand():
+    atlas = make_atlas()
+    assert 'X' not in atlas.glyphs
+    atlas.layout('X1')
+    assert 'X' in atlas.glyphs
+
+
+def test_text_run_only_replaces_changed_glyphs():
+    canvas = FakeCanvas()
+    run = TextRun(canvas, make_atlas(), 200, 600)
+    run.set_text('10:00  2名')
+    canvas.operations.clear()
+
+    run.set_text('10:00  3名')
+
+    configs = [op for op in canvas.operations if op[0] == 'config']
+    assert configs == [('config', 8, {'image': '3', 'state': 'normal'})]
+
+
+def test_text_run_hides_extra_glyphs_when_text_shrinks():
+    canvas = FakeCanvas()
+    run = TextRun(canvas, make_atlas(), 0, 0)
+    run.set_text('12')
+    canvas.operations.clear()
+
+    run.set_text('1')
+    assert canvas.operations == [('config', 2, {'state': 'hidden'})]
+
+    canvas.operations.clear()
+    run.set_text('1')
+    assert canvas.operations == []
@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import pytest
+
+import connectivity
+
+
+@pytest.fixture(autouse=True)
+def reset_cache(monkeypatch):
+    monkeypatch.setattr(connectivity, '_cached_result', None)
+    monkeypatch.setattr(connectivity, '_cached_at', 0.0)
+    monkeypatch.setattr(connectivity, 'has_default_route', lambda: True)
+    monkeypatch.setattr(connectivity, 'can_resolve', lambda *args, **kwargs: True)
+
+
+def test_race_returns_on_first_success(monkeypatch):
+    def probe(url, timeout):
+        if url == 'slow':
+            time.sleep(1.0)
+            return False
+        return True
+
+    monkeypatch.setattr(connectivity, 'probe_url', probe)
+    start = time.monotonic()
+    assert connectivity.race_probes(['slow', 'fast'], timeout=2) is True
+    assert time.monotonic() - start < 0.5
+
+
+def test_race_fails_when_all_probes_fail(monkeypatch):
+    monkeypatch.setattr(connectivity, 'probe_url', lambda url, timeout: False)
+    assert connectivity.race_probes(['a', 'b'], timeout=1) is False
+
+
+def test_no_default_route_skips_probes(monkeypatch):
+    calls = []
+    monkeypatch.setattr(connectivity, 'has_default_route', lambda: False)
+    monkeypatch.setattr(connectivity, 'race_probes', lambda urls, timeout: calls.append(urls) or True)
+    assert connectivity.check_connectivity() is False
+    assert calls == []
+
+
+def test_success_is_cached(monkeypatch):
+    calls = []
+    monkeypatch.setattr(connectivity, 'race_probes', lambda urls, timeout: calls.append(urls) or True)
+    assert connectivity.check_connectivity() is True
+    assert connectivity.check_connectivity() is True
+    assert len(calls) == 1
+    assert connectivity.check_connectivity(use_cache=False) is True
+    assert len(calls) == 2
+
+
+def test_async_race_cancels_slow_probes(monkeypatch):
+    cancelled = []
+
+    async def probe(url, timeout):
+        if url == 'slow':
+            try:
+                await asyncio.sleep(1.0)
+            except asyncio.CancelledError:
+                cancelled.append(url)
+                raise
+            return False
+        return True
+
+    monkeypatch.setattr(connectivity, 'probe_url_async', probe)
+
+    async def race():
+        result = await connectivity.race_probes_async(['slow', 'fast'], timeout=2)
+        await asyncio.sleep(0)  # キャンセルが反映されるまで待つ
+        return result
+
+    start = time.monotonic()
+    assert asyncio.run(race()) is True
+    assert time.monotonic() - start < 0.5
+    assert cancelled == ['slow']
+
+
+def test_async_check_shares_the_cache(monkeypatch):
+    calls = []
+
+    async def race(urls, timeout):
+        calls.append(urls)
+        return True
+
+    async def resolve(*args, **kwargs):
+        return True
+
+    monkeypatch.setattr(connectivity, 'getproxies', lambda: {})
+    monkeypatch.setattr(connectivity, 'can_resolve_async', resolve)
+    monkeypatch.setattr(connectivity, 'race_probes_async', race)
+    assert asyncio.run(connectivity.check_connectivity_async()) is True
+    assert connectivity.check_connectivity() is True
+    assert len(calls) == 1
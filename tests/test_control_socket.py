@@ -0,0 +1,88 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from control_socket import ControlServer, send_command
+from core_loop import CoreLoop
+
+
+def start_server(tmp_path, core=None):
+    server = ControlServer(str(tmp_path / 'signage.sock'), core=core)
+    server.register('ping', lambda: {'state': 'signage'})
+    server.register('broken', lambda: 1 / 0)
+    assert server.start()
+    return server
+
+
+def test_command_round_trip(tmp_path):
+    server = start_server(tmp_path)
+    try:
+        assert send_command('ping', server.path) == {'ok': True, 'state': 'signage'}
+    finally:
+        server.close()
+
+
+def test_unknown_and_failing_commands_report_errors(tmp_path):
+    server = start_server(tmp_path)
+    try:
+        unknown = send_command('reboot', server.path)
+        assert unknown['ok'] is False
+        assert unknown['commands'] == ['broken', 'ping']
+
+        broken = send_command('broken', server.path)
+        assert broken['ok'] is False
+        assert 'division' in broken['error']
+
+        # 処理が失敗しても受付は続く
+        assert send_command('ping', server.path)['ok'] is True
+    finally:
+        server.close()
+
+
+def test_leftover_socket_file_is_replaced(tmp_path):
+    path = tmp_path / 'signage.sock'
+    leftover = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    leftover.bind(str(path))
+    leftover.close()
+
+    server = start_server(tmp_path)
+    try:
+        assert send_command('ping', server.path)['ok'] is True
+    finally:
+        server.close()
+    assert not path.exists()
+
+
+def test_second_server_does_not_steal_a_live_socket(tmp_path):
+    server = start_server(tmp_path)
+    try:
+        assert ControlServer(server.path).start() is False
+        assert send_command('ping', server.path)['ok'] is True
+    finally:
+        server.close()
+
+
+def test_no_server_returns_none(tmp_path):
+    assert send_command('ping', str(tmp_path / 'missing.sock'), timeout=1) is None
+
+
+def test_ping_answers_while_fetches_hang(tmp_path):
+    core = CoreLoop().start()
+    server = start_server(tmp_path, core)
+    release = threading.Event()
+
+    async def hung_fetches():
+        for _ in range(2):
+            with pytest.raises(asyncio.TimeoutError):
+                await core.run_isolated(release.wait, 30, timeout=0.1)
+
+    try:
+        # 応答のない取得が2件タイムアウトした後も、操作コマンドは受け付ける
+        core.submit(hung_fetches()).result(5)
+        assert send_command('ping', server.path, timeout=2) == {'ok': True, 'state': 'signage'}
+    finally:
+        release.set()
+        server.close()
+        core.stop()
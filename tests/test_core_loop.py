@@ -0,0 +1,154 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from core_loop import CoreLoop, WakeEvent, run_command
+
+
+@pytest.fixture
+def core():
+    core = CoreLoop().start()
+    yield core
+    core.stop()
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_spawn_replaces_task_with_same_name(core):
+    started = []
+    cancelled = []
+
+    async def work(label):
+        started.append(label)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(label)
+            raise
+
+    core.spawn('data', work, 'first')
+    assert wait_until(lambda: started == ['first'])
+    core.spawn('data', work, 'second')
+    assert wait_until(lambda: started == ['first', 'second'])
+    assert cancelled == ['first']
+    assert core.task_names() == ['data']
+
+    core.cancel('data')
+    assert wait_until(lambda: core.task_names() == [])
+    assert cancelled == ['first', 'second']
+
+
+def test_failed_task_is_logged_and_forgotten(core, caplog):
+    async def broken():
+        raise RuntimeError('boom')
+
+    core.spawn('broken', broken)
+    # spawnはイベントループのスレッドでタスクを作成するため、ログが出るまで待つ
+    assert wait_until(lambda: 'boom' in caplog.text)
+    assert wait_until(lambda: core.task_names() == [])
+
+
+def test_run_blocking_times_out(core):
+    async def slow():
+        await core.run_blocking(time.sleep, 0.5, timeout=0.05)
+
+    with pytest.raises(asyncio.TimeoutError):
+        core.submit(slow()).result(2)
+
+
+def test_run_blocking_limits_concurrency(core):
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def blocking():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+
+    async def many():
+        await asyncio.gather(*(core.run_blocking(blocking) for _ in range(6)))
+
+    core.submit(many()).result(5)
+    assert max(peak) <= core.blocking_workers
+
+
+def test_hung_isolated_calls_do_not_block_the_pool(core):
+    release = threading.Event()
+
+    async def hang_then_trivial():
+        for _ in range(core.blocking_workers + 1):
+            with pytest.raises(asyncio.TimeoutError):
+                await core.run_isolated(release.wait, 10, timeout=0.05)
+        return await core.run_blocking(lambda: 'ok', timeout=1)
+
+    try:
+        assert core.submit(hang_then_trivial()).result(5) == 'ok'
+    finally:
+        release.set()
+
+
+def test_isolated_calls_are_refused_over_the_limit():
+    core = CoreLoop(isolated_limit=2).start()
+    release = threading.Event()
+    started = []
+
+    async def hang_three():
+        for _ in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                await core.run_isolated(lambda: started.append(1) or release.wait(10), timeout=0.05)
+
+    try:
+        core.submit(hang_three()).result(5)
+        assert len(started) == 2
+        release.set()
+        assert wait_until(lambda: core.isolated_running == 0)
+        assert core.submit(core.run_isolated(lambda: 'ok', timeout=1)).result(2) == 'ok'
+    finally:
+        release.set()
+        core.stop()
+
+
+def test_wake_event_is_woken_from_another_thread(core):
+    event = WakeEvent(core)
+
+    async def wait():
+        return await event.wait(5)
+
+    future = core.submit(wait())
+    time.sleep(0.05)
+    start = time.monotonic()
+    event.set()
+    assert future.result(2) is True
+    assert time.monotonic() - start < 1
+    assert not event.is_set()
+
+
+def test_wake_event_times_out():
+    event = WakeEvent()
+    assert asyncio.run(event.wait(0.01)) is False
+
+
+def test_run_command_returns_output():
+    result = asyncio.run(run_command([sys.executable, '-c', 'print("ok")'], timeout=5))
+    assert result.returncode == 0
+    assert result.stdout.strip() == 'ok'
+
+
+def test_run_command_kills_on_timeout():
+    with pytest.raises(subprocess.TimeoutExpired):
+        asyncio.run(run_command([sys.executable, '-c', 'import time; time.sleep(5)'], timeout=0.2))
@@ -0,0 +1,56 @@
+import json
+
+import asset_pack
+import layout
+from layout import LAYOUT_VERSION, REFERENCE_SIZE, known_screen_sizes, load_layout, resolve_layout
+
+
+def test_reference_size_matches_original_positions():
+    normal = resolve_layout(REFERENCE_SIZE, 0)
+    assert (normal['clock']['x'], normal['clock']['y'], normal['clock']['font']) == (50, 50, 80)
+    assert (normal['wait']['x'], normal['wait']['y']) == (650, 150)
+    assert (normal['slots']['x'], normal['slots']['y'], normal['slots']['gap']) == (200, 600, 8)
+    assert (normal['stale']['x'], normal['stale']['y']) == (50, 1920 - 150)
+
+    rotated = resolve_layout(REFERENCE_SIZE, 1)
+    assert (rotated['clock']['x'], rotated['clock']['y']) == (1080 - 350, 1920 - 150)
+    assert (rotated['wait']['x'], rotated['wait']['y']) == (50, 1920 - 350)
+    assert (rotated['slots']['x'], rotated['slots']['y']) == (200, 200)
+    assert (rotated['stale']['x'], rotated['stale']['y']) == (50, 50)
+
+
+def test_smaller_panel_scales_positions_and_fonts():
+    small = resolve_layout((720, 1280), 1)
+    assert small['scale'] == 720 / 1080
+    assert small['wait']['font'] == round(128 * 720 / 1080)
+    # 右端・下端からの距離で指定した項目は画面内に収まる
+    assert small['clock']['x'] == 720 - round(350 * 720 / 1080)
+    assert small['clock']['y'] == 1280 - round(150 * 720 / 1080)
+
+
+def test_layout_is_cached_per_resolution(tmp_path, monkeypatch):
+    path = str(tmp_path / 'layout_cache.json')
+    first = load_layout((720, 1280), 0, path)
+
+    calls = []
+    monkeypatch.setattr(layout, 'resolve_layout', lambda size, rotation: calls.append(size))
+    assert load_layout((720, 1280), 0, path) == first
+    assert calls == []
+
+    load_layout((1080, 1920), 0, path)
+    assert calls == [(1080, 1920)]
+
+
+def test_cache_from_older_spec_is_ignored(tmp_path):
+    path = tmp_path / 'layout_cache.json'
+    path.write_text(json.dumps({'version': 'old', 'layouts': {'720x1280_r0': {'size': [720, 1280]}}}))
+    assert known_screen_sizes(str(path)) == []
+    assert load_layout((720, 1280), 0, str(path))['clock']['font'] == round(80 * 720 / 1080)
+    assert json.loads(path.read_text())['version'] == LAYOUT_VERSION
+
+
+def test_pack_targets_known_screen_sizes(tmp_path, monkeypatch):
+    path = str(tmp_path / 'layout_cache.json')
+    load_layout((720, 1280), 0, path)
+    monkeypatch.setattr(asset_pack, 'known_screen_sizes', lambda: known_screen_sizes(path))
+    assert asset_pack.target_sizes((1440, 2560)) == [(720, 1280), (1080, 1920), (1440, 2560)]
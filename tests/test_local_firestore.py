@@ -0,0 +1,129 @@
+import os
+import threading
+
+import pytest
+
+from data_sources import DATA_SOURCES, LocalSource, create_data_source
+from local_firestore import LocalFirestore, LocalFirestoreError
+from slot_aggregator import SlotAggregator
+
+FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'fixtures', 'local_firestore.json')
+
+
+def make_source(**options):
+    db = LocalFirestore(**options)
+    return LocalSource(db=db), db
+
+
+def add_reservation(db, doc_id, date, time_slot, states=0):
+    db.collection('reservations').document(doc_id).set({'date': date, 'Time': time_slot, 'states': states})
+
+
+def test_registered_and_needs_no_key(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert DATA_SOURCES['local'] is LocalSource
+    source = create_data_source('local', str(tmp_path / 'missing-key.json'))
+    assert source.name == 'local'
+    # 設定ファイルがない場合も生成データで表示できる
+    assert source.get_population() is not None
+
+
+def test_population_and_filtered_reservations():
+    source, db = make_source()
+    db.collection('now_population').document('signage').set({'now': 7})
+    add_reservation(db, 'a', '2026-10-18', '10:00')
+    add_reservation(db, 'b', '2026-10-18', '11:00', states=1)
+    add_reservation(db, 'c', '2026-10-19', '10:00')
+
+    assert source.get_population() == {'now': 7}
+    assert [doc['Time'] for doc in source.get_reservations('2026-10-18')] == ['10:00']
+
+
+def test_shaped_query_pages_in_time_order_with_projection():
+    source, db = make_source()
+    for i, time_slot in enumerate(['12:00', '09:00', '10:00', '10:00', '11:00', '13:00']):
+        add_reservation(db, f'doc{i}', '2026-10-18', time_slot)
+
+    times, cursor = source.get_reservation_times_page('2026-10-18', '10:00', 2)
+    assert times == ['10:00', '10:00']
+    assert set(cursor.to_dict()) == {'Time'}
+
+    times, cursor = source.get_reservation_times_page('2026-10-18', '10:00', 2, cursor)
+    assert times == ['11:00', '12:00']
+    times, _ = source.get_reservation_times_page('2026-10-18', '10:00', 2, cursor)
+    assert times == ['13:00']
+
+
+def test_query_listener_reports_added_modified_removed():
+    source, db = make_source()
+    add_reservation(db, 'a', '2026-10-18', '10:00')
+    aggregator = SlotAggregator()
+    received = []
+
+    def on_snapshot(docs, changes, read_time):
+        received.append([change.type.name for change in changes])
+        for change in changes:
+            aggregator.apply_change(change.type.name, change.document.id, change.document.to_dict())
+
+    watch = source.listen_reservations('2026-10-18', on_snapshot)
+    db.flush()
+    add_reservation(db, 'b', '2026-10-18', '11:00')
+    db.collection('reservations').document('a').update({'Time': '12:00'})
+    db.collection('reservations').document('b').update({'states': 1})
+    db.flush()
+
+    assert received == [['ADDED'], ['ADDED'], ['MODIFIED'], ['REMOVED']]
+    assert aggregator.upcoming('00:00') == [('12:00', 1)]
+
+    watch.unsubscribe()
+    add_reservation(db, 'c', '2026-10-18', '13:00')
+    db.flush()
+    assert len(received) == 4
+    assert not watch.is_active
+
+
+def test_document_listener_fires_initially_even_when_missing():
+    source, db = make_source()
+    snapshots = []
+    done = threading.Event()
+
+    def on_snapshot(docs, changes, read_time):
+        snapshots.append(docs[0].to_dict() if docs[0].exists else None)
+        if len(snapshots) == 2:
+            done.set()
+
+    source.listen_population(on_snapshot)
+    db.collection('now_population').document('signage').set({'now': 2})
+    assert done.wait(5)
+    assert snapshots == [None, {'now': 2}]
+
+
+def test_error_and_latency_injection():
+    source, db = make_source(error_rate=1.0, seed=1)
+    with pytest.raises(LocalFirestoreError):
+        source.get_population()
+
+    source, db = make_source()
+    db.fail_next(2)
+    for _ in range(2):
+        with pytest.raises(LocalFirestoreError):
+            source.get_reservations('2026-10-18')
+    assert source.get_reservations('2026-10-18') == []
+    assert db.calls == 3
+
+
+def test_fixture_dates_and_synthetic_seed(tmp_path):
+    from datetime import datetime
+
+    db = LocalFirestore(seed=3)
+    db.load_fixture(FIXTURE, today=datetime(2026, 10, 18))
+    source = LocalSource(db=db)
+    assert len(source.get_reservations('2026-10-18')) == 7
+    assert len(source.get_reservations('2026-10-19')) == 1
+
+    db = LocalFirestore(seed=3)
+    db.seed_synthetic(5000, today=datetime(2026, 10, 18))
+    docs = LocalSource(db=db).get_reservations('2026-10-18')
+    # 2日分に振り分け、約1割は処理済み（states == 1）として除外される
+    assert 2000 < len(docs) < 2500
+    assert all('09:00' <= doc['Time'] < '21:00' for doc in docs)
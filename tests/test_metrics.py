@@ -0,0 +1,57 @@
+import urllib.request
+
+from metrics import MetricsRegistry, start_metrics_server
+
+
+def test_counters_and_histograms_render_in_prometheus_format():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.inc('signage_fetch_total', kind='population', result='ok')
+    registry.inc('signage_fetch_total', kind='population', result='ok')
+    registry.observe('signage_fetch_seconds', 0.05, kind='population')
+    registry.observe('signage_fetch_seconds', 0.5, kind='population')
+    registry.add_collector(lambda: [('signage_ui_dispatcher_depth', {}, 3)])
+
+    text = registry.render()
+    assert '# TYPE signage_fetch_total counter' in text
+    assert 'signage_fetch_total{kind="population",result="ok"} 2' in text
+    assert 'signage_fetch_seconds_bucket{kind="population",le="0.1"} 1' in text
+    assert 'signage_fetch_seconds_bucket{kind="population",le="1.0"} 2' in text
+    assert 'signage_fetch_seconds_bucket{kind="population",le="+Inf"} 2' in text
+    assert 'signage_fetch_seconds_count{kind="population"} 2' in text
+    assert '# TYPE signage_ui_dispatcher_depth gauge' in text
+    assert 'signage_ui_dispatcher_depth 3' in text
+
+
+def test_timer_records_even_when_the_block_raises():
+    registry = MetricsRegistry()
+    try:
+        with registry.timer('signage_render_seconds'):
+            raise ValueError
+    except ValueError:
+        pass
+    assert registry.histogram_count('signage_render_seconds') == 1
+
+
+def test_collector_errors_do_not_break_the_endpoint():
+    registry = MetricsRegistry()
+    registry.inc('signage_fetch_error_sleeps_total')
+
+    def broken():
+        raise RuntimeError('boom')
+
+    registry.add_collector(broken)
+    assert 'signage_fetch_error_sleeps_total 1' in registry.render()
+
+
+def test_metrics_server_serves_registry():
+    registry = MetricsRegistry()
+    registry.inc('signage_firestore_reads_total', 7, call='reservations')
+    server = start_metrics_server(registry, port=0)
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+        opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+        with opener.open(url, timeout=5) as response:
+            body = response.read().decode('utf-8')
+        assert 'signage_firestore_reads_total{call="reservations"} 7' in body
+    finally:
+        server.server_close()
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from PIL import Image
+
+from playlist import Playlist, run_crossfade
+
+
+def test_default_playlist_keeps_hourly_rotation():
+    playlist = Playlist()
+    image, duration = playlist.next_entry(datetime(2026, 10, 18, 13, 45))
+    assert image == '4.png'
+    assert duration == 15 * 60
+
+
+def test_items_cycle_with_per_image_durations():
+    playlist = Playlist(items=[{'image': 'a.png', 'duration': 60}, 'b.png'], default_duration=300)
+    now = datetime(2026, 10, 18, 9, 0)
+    assert playlist.next_entry(now) == ('a.png', 60)
+    assert playlist.next_entry(now) == ('b.png', 300)
+    assert playlist.next_entry(now) == ('a.png', 60)
+
+
+def test_time_of_day_rules_override_items():
+    playlist = Playlist(
+        items=['a.png'],
+        rules=[
+            {'start': '11:00', 'end': '14:00', 'images': ['lunch.png']},
+            {'start': '22:00', 'end': '06:00', 'images': ['night.png']},
+        ],
+    )
+    assert playlist.next_entry(datetime(2026, 10, 18, 12, 0))[0] == 'lunch.png'
+    assert playlist.next_entry(datetime(2026, 10, 18, 23, 30))[0] == 'night.png'
+    assert playlist.next_entry(datetime(2026, 10, 18, 3, 0))[0] == 'night.png'
+    assert playlist.next_entry(datetime(2026, 10, 18, 15, 0))[0] == 'a.png'
+
+
+def test_playlist_load_reads_json(tmp_path):
+    path = tmp_path / 'playlist.json'
+    path.write_text('{"default_duration": 120, "crossfade_seconds": 2, "items": ["x.png"]}')
+    playlist = Playlist.load(str(path))
+    assert playlist.crossfade_seconds == 2
+    assert playlist.next_entry(datetime(2026, 10, 18, 9, 0)) == ('x.png', 120)
+    assert Playlist.load(str(tmp_path / 'missing.json')).items == []
+
+
+class FakeClock:
+    def __init__(self, step):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_crossfade_ends_on_back_frame_and_blends_in_between():
+    front = Image.new('RGB', (4, 4), (0, 0, 0))
+    back = Image.new('RGB', (4, 4), (200, 200, 200))
+    frames = []
+    clock = FakeClock(step=0.001)
+
+    count = run_crossfade(front, back, 1.0, frames.append, fps=10, clock=clock, sleep=clock.sleep)
+
+    assert frames[-1] is back
+    assert 8 <= count <= 10
+    levels = [frame.getpixel((0, 0))[0] for frame in frames[:-1]]
+    assert levels == sorted(levels)
+
+
+def test_crossfade_drops_frames_when_blending_is_slow():
+    front = Image.new('RGB', (4, 4))
+    back = Image.new('RGB', (4, 4), (255, 255, 255))
+    frames = []
+    # 1回の時刻取得ごとに0.3秒進む＝合成がフレーム間隔より遅い
+    clock = FakeClock(step=0.3)
+
+    count = run_crossfade(front, back, 1.0, frames.append, fps=10, clock=clock, sleep=clock.sleep)
+
+    assert count < 10
+    assert frames[-1] is back
+
+
+def test_crossfade_disabled_submits_back_only():
+    back = Image.new('RGB', (4, 4))
+    frames = []
+    assert run_crossfade(Image.new('RGB', (4, 4)), back, 0, frames.append) == 0
+    assert frames == [back]
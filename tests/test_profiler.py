@@ -0,0 +1,79 @@
+import json
+import threading
+import time
+
+import profiler
+from profiler import SamplingProfiler, read_profile_seconds, span, start_profile, toggle_profile
+
+
+def test_span_is_shared_noop_when_idle():
+    assert profiler._active is None
+    assert span('fetch') is span('render')
+    with span('fetch'):
+        pass
+
+
+def stuck_in_fetch(entered, release):
+    with span('fetch'):
+        entered.set()
+        release.wait(5)
+
+
+def test_samples_are_grouped_under_spans(tmp_path):
+    entered = threading.Event()
+    release = threading.Event()
+    active = start_profile(seconds=5, interval=0.005, directory=str(tmp_path))
+    try:
+        worker = threading.Thread(target=stuck_in_fetch, args=(entered, release), name='worker')
+        worker.start()
+        assert entered.wait(2)
+        time.sleep(0.1)
+    finally:
+        release.set()
+        worker.join()
+        toggle_profile()  # 計測中に送ると途中で終了
+        active.thread.join(2)
+
+    assert profiler._active is None
+    with open(active.path) as f:
+        folded = f.read().splitlines()
+    worker_lines = [line for line in folded if line.startswith('worker;[fetch];')]
+    assert worker_lines
+    assert any('stuck_in_fetch (test_profiler.py)' in line for line in worker_lines)
+    assert all(int(line.rsplit(' ', 1)[1]) > 0 for line in folded)
+
+    with open(active.path.replace('.folded', '.spans.json')) as f:
+        spans = json.load(f)
+    assert spans['spans']['fetch']['count'] == 1
+    assert spans['spans']['fetch']['max_seconds'] >= 0.1
+    assert spans['samples'] == active.sample_count
+
+
+def test_profile_is_not_started_twice(tmp_path):
+    first = start_profile(seconds=5, interval=0.005, directory=str(tmp_path))
+    try:
+        assert start_profile(seconds=5, directory=str(tmp_path)) is None
+    finally:
+        first.stop()
+        first.thread.join(2)
+    assert profiler._active is None
+
+
+def test_nested_spans_restore_outer_span():
+    active = SamplingProfiler()
+    with active.span('fetch'):
+        with active.span('aggregate'):
+            assert active.spans[threading.get_ident()] == ('fetch', 'aggregate')
+        assert active.spans[threading.get_ident()] == ('fetch',)
+    assert threading.get_ident() not in active.spans
+    assert active.span_summary()['aggregate']['count'] == 1
+
+
+def test_profile_seconds_setting(tmp_path):
+    assert read_profile_seconds(str(tmp_path)) == 30
+    (tmp_path / 'profile.txt').write_text('120\n')
+    assert read_profile_seconds(str(tmp_path)) == 120
+    (tmp_path / 'profile.txt').write_text('100000')
+    assert read_profile_seconds(str(tmp_path)) == 30
+    (tmp_path / 'signage.json').write_text('{"profile_seconds": 45}')
+    assert read_profile_seconds(str(tmp_path)) == 45
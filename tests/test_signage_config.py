@@ -0,0 +1,95 @@
+import json
+import struct
+import time
+
+import pytest
+
+import data_sources
+import signage_config
+from core_loop import CoreLoop
+from signage_config import (
+    DEFAULTS, ConfigWatcher, load_config, parse_events, save_setting,
+)
+
+
+def test_defaults_without_any_file(tmp_path):
+    assert load_config(str(tmp_path)) == DEFAULTS
+
+
+def test_legacy_files_are_read(tmp_path):
+    (tmp_path / 'rotate.txt').write_text('1\n')
+    (tmp_path / 'datamode.txt').write_text('listen')
+    (tmp_path / 'loglevel.txt').write_text('debug')
+    (tmp_path / 'hours.json').write_text(json.dumps({'poll': {'fast_seconds': 5}}))
+    config = load_config(str(tmp_path))
+    assert config['rotation'] == 1
+    assert config['data_mode'] == 'listen'
+    assert config['log_level'] == 'DEBUG'
+    assert config['schedule'] == {'poll': {'fast_seconds': 5}}
+
+
+def test_structured_file_takes_precedence(tmp_path):
+    (tmp_path / 'rotate.txt').write_text('1')
+    (tmp_path / 'renderer.txt').write_text('canvas')
+    (tmp_path / 'signage.json').write_text(json.dumps({'rotation': 0, 'playlist': {'items': ['a.png']}}))
+    config = load_config(str(tmp_path))
+    assert config['rotation'] == 0
+    assert config['renderer'] == 'canvas'  # signage.jsonにない項目は従来のファイルから
+    assert config['playlist'] == {'items': ['a.png']}
+
+
+def test_invalid_values_fall_back_to_defaults(tmp_path):
+    (tmp_path / 'rotate.txt').write_text('sideways')
+    (tmp_path / 'signage.json').write_text(json.dumps({'data_mode': 'push', 'profile_seconds': 'long'}))
+    config = load_config(str(tmp_path))
+    assert config['rotation'] == 0
+    assert config['data_mode'] == 'poll'
+    assert config['profile_seconds'] == 30
+
+
+def test_broken_structured_file_keeps_legacy_settings(tmp_path):
+    (tmp_path / 'signage.json').write_text('{"rotation": ')
+    (tmp_path / 'rotate.txt').write_text('1')
+    assert load_config(str(tmp_path))['rotation'] == 1
+
+
+def test_save_setting_writes_both_files(tmp_path):
+    (tmp_path / 'signage.json').write_text(json.dumps({'data_mode': 'query'}))
+    save_setting('rotation', 1, str(tmp_path))
+    assert json.loads((tmp_path / 'signage.json').read_text()) == {'data_mode': 'query', 'rotation': 1}
+    assert (tmp_path / 'rotate.txt').read_text() == '1'
+    assert load_config(str(tmp_path))['rotation'] == 1
+
+    with pytest.raises(ValueError):
+        save_setting('rotation', 2, str(tmp_path))
+
+
+def test_data_source_names_match_registry():
+    assert set(signage_config.DATA_SOURCE_NAMES) == set(data_sources.DATA_SOURCES)
+
+
+def test_parse_events_extracts_names():
+    def event(name):
+        padded = name.encode() + b'\0' * (16 - len(name))
+        return struct.pack('iIII', 1, signage_config.IN_CLOSE_WRITE, 0, len(padded)) + padded
+
+    assert parse_events(event('rotate.txt') + event('signage.json')) == ['rotate.txt', 'signage.json']
+
+
+@pytest.mark.parametrize('inotify', [True, False])
+def test_watcher_reports_changed_files(tmp_path, monkeypatch, inotify):
+    if not inotify:
+        monkeypatch.setattr(signage_config, 'open_inotify', lambda directory: None)
+    core = CoreLoop().start()
+    calls = []
+    try:
+        ConfigWatcher(core, calls.append, str(tmp_path), debounce=0.05, poll_seconds=0.05).start()
+        time.sleep(0.2)
+        (tmp_path / 'unrelated.txt').write_text('x')
+        save_setting('rotation', 1, str(tmp_path))
+        deadline = time.monotonic() + 3
+        while len({name for names in calls for name in names}) < 2 and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        core.stop()
+    assert {name for names in calls for name in names} == {'rotate.txt', 'signage.json'}
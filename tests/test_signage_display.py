@@ -0,0 +1,435 @@
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+import signage_display
+from business_hours import schedule_from_config
+from core_loop import WakeEvent
+from heartbeat import Heartbeat
+from metrics import MetricsRegistry
+from signage_clock import SystemClock
+from signage_config import DEFAULTS, save_setting
+from signage_display import SignageDisplay
+from slot_aggregator import DaySlots
+from supervisor import HeartbeatMonitor
+from ui_dispatcher import UiDispatcher
+
+
+class FakeListenSource:
+    """購読時のコールバックを保持するだけの取得元"""
+
+    def __init__(self):
+        self.population_callbacks = []
+        self.reservation_callbacks = []
+
+    def listen_population(self, callback):
+        self.population_callbacks.append(callback)
+        return SimpleNamespace(is_active=True, unsubscribe=lambda: None)
+
+    def listen_reservations(self, today, callback):
+        self.reservation_callbacks.append(callback)
+        return SimpleNamespace(is_active=True, unsubscribe=lambda: None)
+
+
+class FixedClock(SystemClock):
+    """moment[0]の時刻を返す時計"""
+
+    def __init__(self, moment):
+        self.moment = moment
+
+    def now(self):
+        return self.moment[0]
+
+    def time(self):
+        return self.moment[0].timestamp()
+
+
+class FakeCore:
+    """開始したタスクの名前と関数を記録するだけのイベントループ"""
+
+    def __init__(self):
+        self.spawned = []
+
+    def spawn(self, name, coroutine_function, *args):
+        self.spawned.append((name, coroutine_function.__name__))
+
+
+def make_display(source, clock=None):
+    """Tkを起動せずにデータ処理部分だけを持つSignageDisplayを作成"""
+    display = SignageDisplay.__new__(SignageDisplay)
+    display.clock = clock if clock is not None else SystemClock()
+    display.recorder = None
+    display.source = source
+    display.now_population = 0
+    display.reservations = []
+    display.listen_date = None
+    display.listen_generation = 0
+    display.data_mode = 'query'
+    display.shaped_query_warned = False
+    display.population_watch = None
+    display.reservations_watch = None
+    display.update_display = lambda: None
+    display.metrics = MetricsRegistry()
+    display.core = FakeCore()
+    display.refresh_event = WakeEvent()
+    display.heartbeat = Heartbeat()
+    display.consecutive_timeouts = 0
+    display.refresh_requested = False
+    display.config = dict(DEFAULTS)
+    display.config_lock = threading.Lock()
+    display.rotation = 0
+    display.render_backend = 'label'
+    display.hours, display.scheduler = schedule_from_config({})
+    display.day_slots = DaySlots()
+    display.last_success_at = None
+    return display
+
+
+def change(change_type, doc_id, time_slot):
+    doc = SimpleNamespace(id=doc_id, to_dict=lambda: {'Time': time_slot})
+    return SimpleNamespace(type=SimpleNamespace(name=change_type), document=doc)
+
+
+def test_stale_listener_callbacks_are_ignored(monkeypatch):
+    monkeypatch.setattr(SignageDisplay, 'refresh_upcoming_slots', lambda self: None)
+    source = FakeListenSource()
+    display = make_display(source)
+
+    display.start_listeners('2026-10-17')
+    old_callback = source.reservation_callbacks[-1]
+    display.stop_listeners()
+    display.start_listeners('2026-10-18')
+    new_callback = source.reservation_callbacks[-1]
+
+    old_callback([], [change('ADDED', 'old', '10:00')], None)
+    new_callback([], [change('ADDED', 'new', '11:00')], None)
+
+    assert display.slot_aggregator.upcoming('00:00') == [('11:00', 1)]
+
+
+class FakePagedSource:
+    """Time順の予約をカーソル付きで返す取得元"""
+
+    def __init__(self, times, fail_shaped=False):
+        self.times = sorted(times)
+        self.fail_shaped = fail_shaped
+        self.page_calls = []
+
+    def get_reservation_times_page(self, today, current_time, limit, cursor=None):
+        if self.fail_shaped:
+            raise RuntimeError('400 FAILED_PRECONDITION: The query requires an index')
+        self.page_calls.append(cursor)
+        matching = [t for t in self.times if t >= current_time]
+        start = 0 if cursor is None else cursor
+        page = matching[start:start + limit]
+        return page, start + len(page)
+
+    def get_reservations(self, today):
+        return [{'Time': t} for t in self.times]
+
+
+def test_shaped_stops_when_sixth_slot_appears_mid_page(monkeypatch):
+    monkeypatch.setattr(signage_display, 'RESERVATION_PAGE_SIZE', 4)
+    times = ['10:00', '10:00', '11:00', '12:00', '13:00', '14:00', '15:00', '16:00', '17:00']
+    source = FakePagedSource(times)
+    display = make_display(source)
+
+    result = display.fetch_reservations_shaped('2026-10-18', '09:00')
+
+    assert result == [('10:00', 2), ('11:00', 1), ('12:00', 1), ('13:00', 1), ('14:00', 1)]
+    # 2ページ目の途中で6つ目の時間帯（15:00）が現れるため3ページ目は取得しない
+    assert source.page_calls == [None, 4]
+
+
+def test_shaped_continues_slot_across_pages(monkeypatch):
+    monkeypatch.setattr(signage_display, 'RESERVATION_PAGE_SIZE', 3)
+    times = ['10:00'] * 7 + ['11:00']
+    source = FakePagedSource(times)
+    display = make_display(source)
+
+    result = display.fetch_reservations_shaped('2026-10-18', '09:00')
+
+    assert result == [('10:00', 7), ('11:00', 1)]
+    assert source.page_calls == [None, 3, 6]
+    assert display.metrics.counter_value('signage_firestore_reads_total', call='reservations_shaped') == 8
+
+
+def test_timed_fetch_records_latency_and_result():
+    display = make_display(None)
+
+    assert display.timed_fetch('population', lambda: False) is False
+    display.timed_fetch('population', lambda: True)
+
+    assert display.metrics.histogram_count('signage_fetch_seconds', kind='population') == 2
+    assert display.metrics.counter_value('signage_fetch_total', kind='population', result='ok') == 1
+    assert display.metrics.counter_value('signage_fetch_total', kind='population', result='error') == 1
+
+
+def test_shaped_exactly_full_final_page(monkeypatch):
+    monkeypatch.setattr(signage_display, 'RESERVATION_PAGE_SIZE', 3)
+    times = ['10:00', '11:00', '11:00', '12:00', '12:00', '13:00']
+    source = FakePagedSource(times)
+    display = make_display(source)
+
+    result = display.fetch_reservations_shaped('2026-10-18', '09:00')
+
+    assert result == [('10:00', 1), ('11:00', 2), ('12:00', 2), ('13:00', 1)]
+    # 最終ページがちょうど満杯なので空ページを1回取得して終了する
+    assert source.page_calls == [None, 3, 6]
+
+
+def test_shaped_failure_falls_back_to_full_fetch(caplog):
+    source = FakePagedSource(['10:00', '11:00', '11:00', '12:00'], fail_shaped=True)
+    display = make_display(source, FixedClock([datetime(2026, 10, 18, 10, 30)]))
+
+    display.fetch_reservations()
+    display.fetch_reservations()
+
+    assert display.reservations == [('11:00', 2), ('12:00', 1)]
+    # 切り替えの警告は1回だけ出力する
+    assert sum('絞り込みクエリに失敗' in record.getMessage() for record in caplog.records) == 1
+
+
+def test_fetch_failure_keeps_last_known_reservations():
+    class FailingSource:
+        def get_reservations(self, today):
+            raise RuntimeError('unreachable')
+
+    display = make_display(FailingSource())
+    display.data_mode = 'poll'
+    display.reservations = [('11:00', 2)]
+
+    assert display.fetch_reservations() is False
+    assert display.reservations == [('11:00', 2)]
+
+
+def test_view_model_formats_slots_and_pads_empty_rows():
+    view = signage_display.build_view_model(
+        {'now_population': 3, 'reservations': [('10:00', 2)], 'last_success_at': 1000.0},
+        now=1010.0,
+    )
+    assert view['wait'] == '3'
+    assert view['slot0'] == '10:00  2名'
+    assert [view[f'slot{i}'] for i in range(1, signage_display.MAX_SLOTS)] == [''] * 4
+    assert view['stale'] == ''
+
+
+def test_view_model_marks_stale_data():
+    view = signage_display.build_view_model(
+        {'now_population': 0, 'reservations': [], 'last_success_at': 1000.0},
+        now=1000.0 + signage_display.STALE_SECONDS + 1,
+    )
+    assert view['stale'].startswith('最終更新 ')
+
+
+def test_changed_fields_only_reports_differences():
+    snapshot = {'now_population': 3, 'reservations': [('10:00', 2), ('11:00', 1)], 'last_success_at': 1000.0}
+    old = signage_display.build_view_model(snapshot, now=1000.0)
+    snapshot['reservations'] = [('10:00', 3), ('11:00', 1)]
+    new = signage_display.build_view_model(snapshot, now=1000.0)
+
+    assert signage_display.changed_fields(old, new) == ['slot0']
+    assert signage_display.changed_fields(new, new) == []
+    assert set(signage_display.changed_fields({}, new)) == set(new)
+
+
+def test_reload_config_switches_data_modes_live(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    display = make_display(SimpleNamespace(name='grpc', supports_listen=True))
+    display.data_mode = 'poll'
+
+    (tmp_path / 'signage.json').write_text(json.dumps({'data_mode': 'query'}))
+    assert display.reload_config() == {'changed': ['data_mode'], 'restart_required': []}
+    assert display.data_mode == 'query'
+    # 変更を反映したらすぐに取得し直す
+    assert display.refresh_requested and display.refresh_event.is_set()
+
+    # 定期取得とリアルタイム監視の切り替えは監視タスクを置き換える
+    assert display.core.spawned == []
+    save_setting('data_mode', 'listen')
+    assert display.reload_config() == {'changed': ['data_mode'], 'restart_required': []}
+    assert display.data_mode == 'listen'
+    assert display.core.spawned == [('data', 'monitor_listeners')]
+
+    # signage.jsonにない項目は従来のファイルから読む
+    (tmp_path / 'signage.json').unlink()
+    (tmp_path / 'datamode.txt').write_text('poll\n')
+    display.reload_config()
+    assert display.core.spawned[-1] == ('data', 'monitor_data')
+
+
+def test_reload_config_rebuilds_only_changed_parts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    display = make_display(SimpleNamespace(name='grpc', supports_listen=True))
+    display.data_mode = 'poll'
+    display.dispatcher = UiDispatcher(None)
+    reloaded = []
+    monkeypatch.setattr(SignageDisplay, 'reload_background', lambda self: reloaded.append(True))
+
+    assert display.reload_config()['changed'] == []
+    scheduler = display.scheduler
+
+    (tmp_path / 'hours.json').write_text(json.dumps({'poll': {'fast_seconds': 5, 'idle_seconds': 30}}))
+    (tmp_path / 'renderer.txt').write_text('canvas')
+    assert display.reload_config()['changed'] == ['renderer', 'schedule']
+    assert display.scheduler is not scheduler and display.scheduler.fast_seconds == 5
+    assert list(display.dispatcher.pending) == ['renderer']
+    assert display.dispatcher.pending['renderer'][0] == 'canvas'
+    assert reloaded == []
+
+    (tmp_path / 'playlist.json').write_text(json.dumps({'items': ['1.png']}))
+    assert display.reload_config()['changed'] == ['playlist']
+    assert reloaded == [True]
+
+
+class FakeRoot:
+    """afterで登録したタイマーを保持するだけのroot"""
+
+    def __init__(self):
+        self.timers = {}
+        self.next_id = 0
+
+    def after(self, delay_ms, callback):
+        self.next_id += 1
+        self.timers[self.next_id] = (delay_ms, callback)
+        return self.next_id
+
+    def after_cancel(self, timer_id):
+        del self.timers[timer_id]
+
+
+def make_expiring_display(moment):
+    display = make_display(None, FixedClock(moment))
+    display.root = FakeRoot()
+    display.expiry_timer = None
+    display.expiry_at = None
+    display.reloaded_date = None
+    display.display_on = True
+    display.rendered = []
+    display.render_display = lambda snapshot: (display.rendered.append(snapshot['reservations']),
+                                               display.arm_slot_expiry())
+    return display
+
+
+def test_expired_slot_drops_off_at_its_boundary_without_fetching(monkeypatch):
+    moment = [datetime(2026, 10, 18, 10, 29, 30)]
+    display = make_expiring_display(moment)
+    display.day_slots.replace('2026-10-18', [('10:30', 2)] + [(f'1{i}:00', 1) for i in range(1, 7)])
+
+    display.arm_slot_expiry()
+    (delay_ms, callback), = display.root.timers.values()
+    # 10:30の時間帯は10:31になった時点で外れる
+    assert delay_ms == 90 * 1000 + 50
+    assert display.expiry_at == datetime(2026, 10, 18, 10, 31)
+
+    moment[0] = datetime(2026, 10, 18, 10, 31, 0, 50000)
+    callback()
+    assert display.rendered[-1] == [('11:00', 1), ('12:00', 1), ('13:00', 1), ('14:00', 1), ('15:00', 1)]
+    assert display.expiry_at == datetime(2026, 10, 18, 11, 1)
+    assert len(display.root.timers) == 2  # 実行済みのタイマーと新しいタイマー
+    assert not display.refresh_event.is_set()
+
+
+def test_midnight_clears_old_day_and_reloads_once(monkeypatch):
+    moment = [datetime(2026, 10, 18, 23, 59, 0)]
+    display = make_expiring_display(moment)
+    display.day_slots.replace('2026-10-18', [('09:00', 1)])
+
+    display.arm_slot_expiry()
+    assert display.expiry_at == datetime(2026, 10, 19, 0, 0)
+
+    moment[0] = datetime(2026, 10, 19, 0, 0, 0, 50000)
+    display.expire_slots()
+    # 前日の時間帯は表示せず、新しい日の予約を一度だけ取得し直す
+    assert display.rendered[-1] == []
+    assert display.refresh_requested and display.refresh_event.is_set()
+
+    display.refresh_event.clear()
+    display.expire_slots()
+    assert not display.refresh_event.is_set()
+
+
+class HangingCore(FakeCore):
+    """Firestoreの呼び出しがすべてタイムアウトするイベントループ"""
+
+    def __init__(self):
+        super().__init__()
+        self.hanging = True
+
+    async def run_isolated(self, func, *args, timeout):
+        if self.hanging:
+            raise asyncio.TimeoutError()
+        return func(*args)
+
+
+def test_data_heartbeat_stops_while_fetches_keep_timing_out():
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(read_fd, False)
+    display = make_display(None)
+    display.heartbeat = Heartbeat(write_fd)
+    display.core = HangingCore()
+    monitor = HeartbeatMonitor(started=0, startup_grace=0)
+
+    def fetch_and_wait():
+        async def cycle():
+            ok = await display.run_fetch('population', lambda: True)
+            await display.wait_for_refresh(0)
+            return ok
+        return asyncio.run(cycle())
+
+    def data_beats():
+        try:
+            data = os.read(read_fd, 4096)
+        except BlockingIOError:
+            return 0
+        monitor.feed(data, now=0)
+        return data.count(b'data ')
+
+    try:
+        beats = []
+        for _ in range(signage_display.DATA_HANG_TIMEOUTS + 1):
+            assert fetch_and_wait() is False
+            beats.append(data_beats())
+        # タイムアウトが続く間はハートビートを止め、監視プロセスにハングとして検知させる
+        assert beats == [1] * (signage_display.DATA_HANG_TIMEOUTS - 1) + [0, 0]
+        assert 'data' in monitor.stale(signage_display.DATA_HEARTBEAT_GRACE + 1)
+
+        # 取得が応答すれば（成功・失敗を問わず）再び送る
+        display.core.hanging = False
+        assert fetch_and_wait() is True
+        assert data_beats() == 1
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+def test_listen_state_is_saved_only_after_both_listeners_deliver(tmp_path, monkeypatch):
+    from state_store import StateStore
+
+    monkeypatch.setattr(SignageDisplay, 'refresh_upcoming_slots', lambda self: None)
+    source = FakeListenSource()
+    display = make_display(source)
+    display.state_store = StateStore(str(tmp_path / 'state.db'))
+    population = SimpleNamespace(exists=True, to_dict=lambda: {'now': 3})
+    try:
+        display.start_listeners('2026-10-18')
+        source.population_callbacks[-1]([population], [], None)
+        # 予約がまだ届いていないため、空の予約を取得成功として記録しない
+        assert display.last_success_at is None
+        assert display.state_store.load('reservations') == (None, None)
+
+        source.reservation_callbacks[-1]([], [change('ADDED', 'a', '11:00')], None)
+        assert display.last_success_at is not None
+        assert display.state_store.load('now_population')[0] == 3
+
+        # 再購読した後も、両方が届くまでは記録しない
+        display.last_success_at = None
+        display.stop_listeners()
+        display.start_listeners('2026-10-19')
+        source.reservation_callbacks[-1]([], [], None)
+        assert display.last_success_at is None
+    finally:
+        display.state_store.close()
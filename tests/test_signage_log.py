@@ -0,0 +1,88 @@
+import atexit
+import logging
+
+import pytest
+
+import signage_log
+from signage_log import DuplicateFilter, RingBufferHandler, read_log_level, setup_logging
+
+
+def make_record(message, level=logging.INFO, name='signage_display'):
+    return logging.LogRecord(name, level, __file__, 1, message, None, None)
+
+
+def test_duplicates_are_suppressed_within_the_window_and_counted():
+    now = [0.0]
+    dedup = DuplicateFilter(window=60, clock=lambda: now[0])
+
+    assert dedup.filter(make_record('データを取得中...'))
+    now[0] = 10
+    assert not dedup.filter(make_record('データを取得中...'))
+    assert not dedup.filter(make_record('データを取得中...'))
+    # 別のメッセージ・別のレベルは省略しない
+    assert dedup.filter(make_record('待ち人数を更新: 3 -> 4'))
+    assert dedup.filter(make_record('データを取得中...', level=logging.WARNING))
+
+    now[0] = 61
+    record = make_record('データを取得中...')
+    assert dedup.filter(record)
+    assert record.getMessage() == 'データを取得中... (同じメッセージを2回省略)'
+
+
+def test_ring_buffer_keeps_only_recent_lines():
+    ring = RingBufferHandler(capacity=3)
+    for i in range(5):
+        ring.handle(make_record(f'予約データ: {i}', level=logging.DEBUG))
+    assert ring.lines() == ['予約データ: 2', '予約データ: 3', '予約データ: 4']
+    assert ring.lines(1) == ['予約データ: 4']
+
+
+def test_log_level_file(tmp_path):
+    path = tmp_path / 'loglevel.txt'
+    assert read_log_level(str(path)) == logging.INFO
+    path.write_text('debug\n')
+    assert read_log_level(str(path)) == logging.DEBUG
+    path.write_text('verbose')
+    assert read_log_level(str(path)) == logging.INFO
+
+
+class CountingArgument:
+    """文字列に変換された回数を数える（ログのメッセージが作成されたか確認する）"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        self.count += 1
+        return 'value'
+
+
+@pytest.fixture
+def logging_state(monkeypatch):
+    root = logging.getLogger()
+    saved = (root.level, list(root.handlers))
+    monkeypatch.setattr(signage_log, '_listener', None)
+    monkeypatch.setattr(signage_log, '_ring', None)
+    monkeypatch.setattr(signage_log, '_level_handlers', [])
+    yield
+    # テストの中で停止済みのため終了時には停止しない
+    atexit.unregister(signage_log._listener.stop)
+    root.setLevel(saved[0])
+    root.handlers[:] = saved[1]
+
+
+def test_third_party_debug_is_never_formatted(tmp_path, logging_state):
+    ring = setup_logging(logging.INFO, path=str(tmp_path / 'signage.log'), console=False)
+    third_party = CountingArgument()
+    own = CountingArgument()
+    logging.getLogger('urllib3.connectionpool').debug('接続: %s', third_party)
+    logging.getLogger('signage_display').debug('取得: %s', own)
+    logging.getLogger('signage_display').info('表示を更新')
+    signage_log._listener.stop()  # キューに残ったログを書き出す
+
+    assert third_party.count == 0
+    assert own.count >= 1
+    assert [line.split(' ', 3)[3] for line in ring.lines()] == [
+        'signage_display: 取得: value', 'signage_display: 表示を更新',
+    ]
+    assert (tmp_path / 'signage.log').read_text(encoding='utf-8').count('\n') == 1
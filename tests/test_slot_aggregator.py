@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from slot_aggregator import DaySlots, SlotAggregator
+
+
+def test_added_counts_per_slot():
+    agg = SlotAggregator()
+    agg.apply_change('ADDED', 'a', {'Time': '10:00'})
+    agg.apply_change('ADDED', 'b', {'Time': '10:00'})
+    agg.apply_change('ADDED', 'c', {'Time': '11:00'})
+    assert agg.upcoming('00:00') == [('10:00', 2), ('11:00', 1)]
+
+
+def test_modified_moves_doc_between_slots():
+    agg = SlotAggregator()
+    agg.apply_change('ADDED', 'a', {'Time': '10:00'})
+    agg.apply_change('ADDED', 'b', {'Time': '10:00'})
+    agg.apply_change('MODIFIED', 'a', {'Time': '11:00'})
+    assert agg.upcoming('00:00') == [('10:00', 1), ('11:00', 1)]
+
+
+def test_modified_without_slot_change_keeps_count():
+    agg = SlotAggregator()
+    agg.apply_change('ADDED', 'a', {'Time': '10:00'})
+    agg.apply_change('MODIFIED', 'a', {'Time': '10:00', 'name': 'x'})
+    assert agg.upcoming('00:00') == [('10:00', 1)]
+
+
+def test_removed_drops_slot_when_count_reaches_zero():
+    agg = SlotAggregator()
+    agg.apply_change('ADDED', 'a', {'Time': '10:00'})
+    agg.apply_change('ADDED', 'b', {'Time': '11:00'})
+    agg.apply_change('REMOVED', 'a', {'Time': '10:00'})
+    assert agg.upcoming('00:00') == [('11:00', 1)]
+    assert '10:00' not in agg.time_counts
+
+
+def test_removed_unknown_doc_is_ignored():
+    agg = SlotAggregator()
+    agg.apply_change('REMOVED', 'missing', {'Time': '10:00'})
+    assert agg.upcoming('00:00') == []
+
+
+def test_upcoming_filters_past_slots_and_truncates():
+    agg = SlotAggregator()
+    for i, slot in enumerate(['09:00', '10:00', '11:00', '12:00', '13:00', '14:00', '15:00']):
+        agg.apply_change('ADDED', str(i), {'Time': slot})
+    assert agg.upcoming('10:00', 3) == [('10:00', 1), ('11:00', 1), ('12:00', 1)]
+    assert [slot for slot, _ in agg.upcoming('10:30')] == ['11:00', '12:00', '13:00', '14:00', '15:00']
+
+
+def test_clear_resets_counts():
+    agg = SlotAggregator()
+    agg.apply_change('ADDED', 'a', {'Time': '10:00'})
+    agg.clear()
+    assert agg.upcoming('00:00') == []
+
+
+def test_day_slots_upcoming_and_next_expiry():
+    slots = DaySlots()
+    slots.replace('2026-10-18', {'11:00': 1, '09:30': 2, '10:00': 3})
+
+    now = datetime(2026, 10, 18, 9, 45)
+    assert slots.upcoming(now) == [('10:00', 3), ('11:00', 1)]
+    assert slots.next_expiry(now) == datetime(2026, 10, 18, 10, 1)
+    # 時刻ちょうどの時間帯はまだ表示する
+    assert slots.upcoming(datetime(2026, 10, 18, 10, 0, 59), limit=1) == [('10:00', 3)]
+
+
+def test_day_slots_from_another_day_are_not_shown():
+    slots = DaySlots()
+    slots.replace('2026-10-17', [('23:00', 1)])
+    now = datetime(2026, 10, 18, 0, 5)
+    assert slots.upcoming(now) == []
+    assert slots.next_expiry(now) == datetime(2026, 10, 19)
+
+
+def test_day_slots_last_slot_expires_no_later_than_midnight():
+    slots = DaySlots()
+    slots.replace('2026-10-18', [('23:59', 1)])
+    assert slots.next_expiry(datetime(2026, 10, 18, 23, 0)) == datetime(2026, 10, 19)
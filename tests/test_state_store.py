@@ -0,0 +1,34 @@
+from state_store import StateStore
+
+
+def test_record_is_buffered_until_flush(tmp_path):
+    path = str(tmp_path / 'state.db')
+    store = StateStore(path, flush_interval=300)
+    store.record('now_population', 4, updated_at=store.last_flush + 1)
+
+    # 書き込み前でも同じプロセスからは最新値が読める
+    assert store.load('now_population')[0] == 4
+    other = StateStore(path)
+    assert other.load('now_population') == (None, None)
+
+    store.flush()
+    assert other.load('now_population')[0] == 4
+
+
+def test_record_flushes_after_interval(tmp_path):
+    path = str(tmp_path / 'state.db')
+    store = StateStore(path, flush_interval=300)
+    store.record('reservations', [['10:00', 2]], updated_at=store.last_flush + 301)
+
+    assert StateStore(path).load('reservations')[0] == [['10:00', 2]]
+
+
+def test_close_persists_and_reopen_uses_wal(tmp_path):
+    path = str(tmp_path / 'state.db')
+    store = StateStore(path)
+    store.record('now_population', 7, updated_at=123.0)
+    store.close()
+
+    reopened = StateStore(path)
+    assert reopened.load('now_population') == (7, 123.0)
+    assert reopened.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
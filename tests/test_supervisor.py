@@ -0,0 +1,96 @@
+import json
+import os
+import sys
+
+from supervisor import HeartbeatMonitor, Supervisor, backoff_seconds, load_records, summarize_records
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(code):
+    """heartbeat.pyを読み込める子プロセスのコマンド"""
+    return [sys.executable, '-c', f"import sys; sys.path.insert(0, {REPO_DIR!r})\n" + code]
+
+
+def make_supervisor(tmp_path, command, **kwargs):
+    options = dict(startup_grace=5, check_interval=0.05, dump_wait=2, stop_timeout=2)
+    options.update(kwargs)
+    return Supervisor(
+        command,
+        restart_log=str(tmp_path / 'restarts.jsonl'),
+        stack_path=str(tmp_path / 'hang_stacks.log'),
+        **options,
+    )
+
+
+def test_monitor_tracks_deadlines_per_name():
+    monitor = HeartbeatMonitor(started=0, startup_grace=60)
+    assert monitor.stale(59) == []
+    assert monitor.stale(61) == ['ui']
+
+    monitor.feed(b'ui 10.0\nda', now=50)
+    monitor.feed(b'ta 100\n', now=55)
+    assert monitor.stale(60) == []
+    assert monitor.stale(61) == ['ui']
+    assert monitor.stale(156) == ['data', 'ui']
+
+
+def test_monitor_ignores_malformed_lines():
+    monitor = HeartbeatMonitor(started=0, startup_grace=60)
+    monitor.feed(b'garbage\nui ten\nui 5\n', now=1)
+    assert monitor.deadlines == {'ui': 6}
+
+
+def test_backoff_doubles_up_to_the_limit():
+    assert [backoff_seconds(n, base=2, maximum=20) for n in range(6)] == [0, 2, 4, 8, 16, 20]
+
+
+def test_crash_is_recorded(tmp_path):
+    supervisor = make_supervisor(tmp_path, child("sys.exit(3)"))
+    record = supervisor.run_once()
+    assert record['cause'] == 'crash'
+    assert record['exit_code'] == 3
+    assert record['restarts'] == 1
+    assert record['backoff'] == 2
+    assert load_records(str(tmp_path / 'restarts.jsonl')) == [json.loads(json.dumps(record))]
+
+    record = supervisor.run_once()
+    assert record['restarts'] == 2
+    assert record['backoff'] == 4
+
+
+def test_hang_dumps_stacks_then_restarts(tmp_path):
+    code = (
+        "import time\n"
+        "from heartbeat import enable_stack_dump, get_heartbeat\n"
+        "enable_stack_dump()\n"
+        "get_heartbeat().beat('ui', 0.3)\n"
+        "def stuck_in_render():\n"
+        "    time.sleep(30)\n"
+        "stuck_in_render()\n"
+    )
+    supervisor = make_supervisor(tmp_path, child(code))
+    record = supervisor.run_once()
+    assert record['cause'] == 'hang'
+    assert record['stale'] == ['ui']
+    assert record['uptime'] < 10
+
+    with open(tmp_path / 'hang_stacks.log') as f:
+        f.seek(record['stacks']['offset'])
+        stacks = f.read()
+    assert 'stuck_in_render' in stacks
+
+
+def test_missing_first_heartbeat_is_a_hang(tmp_path):
+    supervisor = make_supervisor(tmp_path, child("import time; time.sleep(30)"), startup_grace=0.3)
+    record = supervisor.run_once()
+    assert record['cause'] == 'hang'
+    assert record['stale'] == ['ui']
+
+
+def test_summary_counts_causes():
+    records = [{'cause': 'hang'}, {'cause': 'crash'}, {'cause': 'hang'}]
+    summary = summarize_records(records, recent=2)
+    assert summary['total'] == 3
+    assert summary['causes'] == {'hang': 2, 'crash': 1}
+    assert summary['recent'] == records[-2:]
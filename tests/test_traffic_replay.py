@@ -0,0 +1,107 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from local_firestore import LocalFirestore
+from signage_clock import VirtualClock
+from traffic_replay import ReplayStats, TrafficPlayer, percentiles
+from traffic_trace import TrafficRecorder, load_trace
+
+from test_signage_display import FixedClock, make_display
+
+
+class FakeMonotonic:
+    def __init__(self):
+        self.value = 100.0
+
+    def __call__(self):
+        return self.value
+
+
+def event(moment, population, slots, date='2026-10-18'):
+    return {'t': moment.timestamp(), 'date': date, 'now_population': population, 'slots': slots}
+
+
+def test_virtual_clock_runs_at_speed():
+    monotonic = FakeMonotonic()
+    clock = VirtualClock(datetime(2026, 10, 18, 9, 0), speed=20, monotonic=monotonic)
+    monotonic.value += 3
+    assert clock.now() == datetime(2026, 10, 18, 9, 1)
+    assert clock.real_seconds(60) == 3
+    with pytest.raises(ValueError):
+        VirtualClock(datetime(2026, 10, 18), speed=0)
+
+
+def test_recorder_skips_unchanged_state_and_round_trips(tmp_path):
+    path = tmp_path / 'traces' / 'trace.jsonl'
+    recorder = TrafficRecorder(str(path))
+    assert recorder.record(1.0, 3, '2026-10-18', [('10:00', 2)])
+    assert not recorder.record(2.0, 3, '2026-10-18', [('10:00', 2)])
+    assert recorder.record(3.0, 4, '2026-10-18', [('10:00', 2)])
+    recorder.close()
+    assert not recorder.record(4.0, 5, '2026-10-18', [])
+
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('壊れた行\n')
+    events = load_trace(str(path))
+    assert [e['now_population'] for e in events] == [3, 4]
+    assert events[0]['slots'] == [('10:00', 2)]
+
+
+def test_display_records_on_successful_fetch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    display = make_display(None, FixedClock([datetime(2026, 10, 18, 10, 0)]))
+    display.state_store = None
+    display.day_slots.replace('2026-10-18', [('10:30', 2)])
+    display.now_population = 4
+
+    path = display.start_recording()['path']
+    display.save_state()  # 変化がないため追記しない
+    display.now_population = 5
+    display.save_state()
+    assert display.stop_recording() == {'path': path, 'events': 2}
+
+    lines = [json.loads(line) for line in open(path, encoding='utf-8')]
+    assert [line['now_population'] for line in lines] == [4, 5]
+    assert lines[0]['slots'] == [['10:30', 2]]
+
+
+def test_player_writes_only_changed_documents():
+    db = LocalFirestore()
+    player = TrafficPlayer(db)
+    assert player.apply(event(datetime(2026, 10, 18, 9, 0), 2, [('09:30', 2), ('11:00', 1)])) == 4
+    # 人数だけ変わった行は1件の書き込み
+    assert player.apply(event(datetime(2026, 10, 18, 9, 5), 3, [('09:30', 2), ('11:00', 1)])) == 1
+    # 09:30を過ぎて記録から外れた時間帯は残し、まだ来ていない11:00は削除する
+    assert player.apply(event(datetime(2026, 10, 18, 9, 40), 3, [('12:00', 1)])) == 2
+
+    docs = db.collection('reservations').where('date', '==', '2026-10-18').get()
+    assert sorted(doc.get('Time') for doc in docs) == ['09:30', '09:30', '12:00']
+    assert db.collection('now_population').document('signage').get().to_dict() == {'now': 3}
+    assert player.writes == 7
+
+
+def test_stats_measure_latency_supersession_and_redundant_renders():
+    monotonic = FakeMonotonic()
+    clock = FixedClock([datetime(2026, 10, 18, 10, 0)])
+    clock.speed = 10
+    stats = ReplayStats(clock, monotonic)
+
+    stats.written(event(datetime(2026, 10, 18, 9, 59), 2, [('10:30', 1)]))
+    monotonic.value += 0.5
+    stats.written(event(datetime(2026, 10, 18, 10, 0), 3, [('10:30', 1)]))
+    monotonic.value += 1.0
+    stats.rendered({'now_population': 3, 'reservations': [('10:30', 1)]}, 1)
+    stats.rendered({'now_population': 3, 'reservations': [('10:30', 1)]}, 0)
+
+    latency, renders = stats.report()
+    assert latency['count'] == 1 and latency['superseded'] == 1 and latency['pending'] == 0
+    assert latency['real_seconds']['max'] == pytest.approx(1.0)
+    assert latency['trace_seconds']['max'] == pytest.approx(10.0)
+    assert renders == {'total': 2, 'redundant': 1, 'widget_updates': 1}
+
+
+def test_percentiles():
+    assert percentiles([]) == {'p50': None, 'p95': None, 'max': None}
+    assert percentiles(list(range(1, 101))) == {'p50': 50, 'p95': 95, 'max': 100}
@@ -0,0 +1,72 @@
+from ui_dispatcher import UiDispatcher
+
+
+class FakeRoot:
+    """afterで登録された処理を保持するだけのroot"""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+
+
+def test_pending_updates_collapse_into_one_pass():
+    root = FakeRoot()
+    dispatcher = UiDispatcher(root)
+    rendered = []
+    dispatcher.register('data', rendered.append)
+
+    dispatcher.submit('data', 1)
+    dispatcher.submit('data', 2)
+    dispatcher.submit('data', 3)
+    dispatcher.drain()
+
+    assert rendered == [3]
+    stats = dispatcher.stats()
+    assert stats['submitted'] == 3
+    assert stats['coalesced'] == 2
+    assert stats['dispatched'] == 1
+    assert stats['render_passes'] == 1
+    assert stats['depth'] == 0
+
+
+def test_handlers_run_in_registration_order():
+    root = FakeRoot()
+    dispatcher = UiDispatcher(root)
+    calls = []
+    dispatcher.register('background', lambda s: calls.append(('background', s)))
+    dispatcher.register('data', lambda s: calls.append(('data', s)))
+
+    dispatcher.submit('data', 'd')
+    dispatcher.submit('background', 'b')
+    dispatcher.drain()
+
+    assert calls == [('background', 'b'), ('data', 'd')]
+    assert dispatcher.stats()['max_depth'] == 2
+
+
+def test_handler_error_does_not_stop_other_updates():
+    root = FakeRoot()
+    dispatcher = UiDispatcher(root)
+    rendered = []
+
+    def broken(snapshot):
+        raise RuntimeError('boom')
+
+    dispatcher.register('clock', broken)
+    dispatcher.register('data', rendered.append)
+    dispatcher.submit('clock', '10:00')
+    dispatcher.submit('data', 5)
+    dispatcher.drain()
+
+    assert rendered == [5]
+
+
+def test_start_reschedules_drain_on_main_loop():
+    root = FakeRoot()
+    dispatcher = UiDispatcher(root)
+    dispatcher.start()
+    assert root.scheduled == [dispatcher.drain]
+    root.scheduled.pop()()
+    assert root.scheduled == [dispatcher.drain]
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""記録したトラフィック（traffic_trace.py）をローカルの取得元に流してサイネージを再生する
+
+    python3 traffic_replay.py traces/trace-20261017-090000.jsonl --speed 20
+    python3 traffic_replay.py TRACE --speed 100 --mode listen --output report.json
+
+記録の時刻から--speed倍（1〜100倍）で進む仮想の時計でSignageDisplayを動かし、
+記録の各行をその時刻にlocal_firestoreへ書き込む。取得間隔・時計の表示・時間帯が
+過ぎる時刻はすべて仮想の時計に従う。端末の保存データと操作用ソケットは使わない。
+
+終了時に次の結果をJSONで出力する。
+- update_latency: 書き込みから画面に反映されるまでの時間（記録の時間と実時間）
+- renders: 描画の回数と、表示が何も変わらなかった描画の回数
+- cpu: 再生全体で使ったCPU時間と、記録1時間あたりのCPU時間
+"""
+
+import argparse
+import json
+import logging
+import resource
+import sys
+import threading
+import time
+from datetime import datetime
+
+from data_sources import LocalSource
+from local_firestore import LocalFirestore
+from signage_clock import VirtualClock
+from signage_display import MAX_SLOTS, SignageDisplay, changed_fields
+from signage_log import setup_logging
+from slot_aggregator import DaySlots
+from traffic_trace import load_trace
+
+logger = logging.getLogger(__name__)
+
+# 最後の行を書き込んだ後に再生を続ける時間（記録の時間、秒）
+DEFAULT_TAIL_SECONDS = 120
+MAX_SPEED = 100
+
+
+class TrafficPlayer:
+    """記録の各行をローカルのFirestoreに書き込む（変わったドキュメントだけ）
+
+    予約は時間帯ごとに "日付-時刻-番号" のIDのドキュメントとして書き込む。poll/queryモードの
+    記録には過ぎた時間帯が含まれないため、行にない時間帯は時刻を過ぎていれば残し、
+    まだ来ていない時間帯だけ削除する。
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.population = None
+        self.counts = {}  # (日付, 時間帯) -> 書き込み済みの予約数
+        self.writes = 0
+
+    def apply(self, event):
+        """1行分を書き込んで、書き込んだドキュメント数を返す"""
+        writes = 0
+        if event['now_population'] != self.population:
+            self.population = event['now_population']
+            self.db.collection('now_population').document('signage').set({'now': self.population})
+            writes += 1
+
+        date = event['date']
+        current_time = datetime.fromtimestamp(event['t']).strftime("%H:%M")
+        current_date = datetime.fromtimestamp(event['t']).strftime("%Y-%m-%d")
+        slots = dict(event['slots'])
+        for (slot_date, time_slot), written in list(self.counts.items()):
+            if slot_date == date and time_slot in slots:
+                continue
+            if slot_date == current_date and time_slot < current_time:
+                continue  # 過ぎた時間帯は記録から外れても残す
+            writes += self.resize(slot_date, time_slot, 0)
+        for time_slot, count in slots.items():
+            writes += self.resize(date, time_slot, count)
+
+        self.writes += writes
+        return writes
+
+    def resize(self, date, time_slot, count):
+        """時間帯の予約ドキュメントをcount件に増減"""
+        written = self.counts.get((date, time_slot), 0)
+        reservations = self.db.collection('reservations')
+        for i in range(written, count):
+            reservations.document(f"{date}-{time_slot}-{i}").set({'date': date, 'Time': time_slot, 'states': 0})
+        for i in range(count, written):
+            reservations.document(f"{date}-{time_slot}-{i}").delete()
+        if count:
+            self.counts[(date, time_slot)] = count
+        else:
+            self.counts.pop((date, time_slot), None)
+        return abs(count - written)
+
+
+def percentiles(values):
+    """p50・p95・最大値（値がない場合はNone）"""
+    if not values:
+        return {'p50': None, 'p95': None, 'max': None}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p * len(ordered))) - 1))]
+
+    return {'p50': rank(0.5), 'p95': rank(0.95), 'max': ordered[-1]}
+
+
+class ReplayStats:
+    """書き込みから画面に反映されるまでの時間と描画の回数"""
+
+    def __init__(self, clock, monotonic=time.monotonic):
+        self.clock = clock
+        self.monotonic = monotonic
+        self.lock = threading.Lock()
+        self.pending = []    # [(書き込んだ時刻, 行)]
+        self.latencies = []  # 実時間（秒）
+        self.superseded = 0  # 反映される前に次の行で上書きされた行
+        self.renders = 0
+        self.redundant_renders = 0
+        self.widget_updates = 0
+
+    def written(self, event):
+        with self.lock:
+            self.pending.append((self.monotonic(), event))
+
+    def rendered(self, snapshot, changes):
+        """描画した内容に反映された行の遅れを記録"""
+        now = self.clock.now()
+        shown = (snapshot['now_population'], [tuple(slot) for slot in snapshot['reservations']])
+        at = self.monotonic()
+        with self.lock:
+            self.renders += 1
+            self.widget_updates += changes
+            if changes == 0:
+                self.redundant_renders += 1
+            for index in range(len(self.pending) - 1, -1, -1):
+                written_at, event = self.pending[index]
+                if expected_view(event, now) == shown:
+                    self.latencies.append(at - written_at)
+                    self.superseded += index
+                    del self.pending[:index + 1]
+                    break
+
+    def report(self):
+        with self.lock:
+            speed = self.clock.speed
+            real = percentiles(self.latencies)
+            return {
+                'count': len(self.latencies),
+                'superseded': self.superseded,
+                'pending': len(self.pending),
+                'trace_seconds': {key: value * speed if value is not None else None for key, value in real.items()},
+                'real_seconds': real,
+            }, {
+                'total': self.renders,
+                'redundant': self.redundant_renders,
+                'widget_updates': self.widget_updates,
+            }
+
+
+def expected_view(event, now):
+    """行の内容をnowの時刻に表示した場合の (待ち人数, 時間帯)"""
+    slots = DaySlots()
+    slots.replace(event['date'], event['slots'])
+    return event['now_population'], slots.upcoming(now, MAX_SLOTS)
+
+
+def counter_total(registry, name):
+    """ラベルを問わずカウンターを合計"""
+    with registry.lock:
+        return sum(registry.counters.get(name, {}).values())
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class ReplayDisplay(SignageDisplay):
+    """ローカルの取得元と仮想の時計で動かすサイネージ（保存データ・操作用ソケット・設定ファイルの監視は使わない）
+
+    statsがNoneの場合は描画を数えない（bench_display.pyから使用）。
+    """
+
+    def __init__(self, source, clock, stats=None, data_mode='poll'):
+        self.replay_source = source
+        self.replay_mode = data_mode
+        self.stats = stats
+        super().__init__(clock=clock)
+
+    def init_firebase(self):
+        self.source = self.replay_source
+
+    def read_data_mode(self):
+        return self.replay_mode
+
+    def open_state_store(self):
+        return None
+
+    def start_control(self, control):
+        self.control = None
+
+    def start_config_watch(self):
+        self.config_watcher = None
+
+    def render_display(self, snapshot):
+        before = self.rendered_view
+        super().render_display(snapshot)
+        # 描画しなかった場合（画面が消えている間）は数えない
+        if self.stats is not None and self.display_on and self.rendered_view is not before:
+            self.stats.rendered(snapshot, len(changed_fields(before, self.rendered_view)))
+
+
+def feed(events, player, stats, clock, tail_seconds, done):
+    """記録の時刻に合わせて書き込み、最後の行から一定時間後にdoneを呼ぶ"""
+    try:
+        for event in events:
+            wait = event['t'] - clock.time()
+            if wait > 0:
+                time.sleep(clock.real_seconds(wait))
+            player.apply(event)
+            stats.written(event)
+        time.sleep(clock.real_seconds(tail_seconds))
+    except Exception as e:
+        logger.error(f"再生エラー: {e}")
+    finally:
+        done()
+
+
+def replay(events, speed=10, data_mode='poll', latency=0.0, tail_seconds=DEFAULT_TAIL_SECONDS):
+    """記録を再生して結果の辞書を返す"""
+    db = LocalFirestore(latency=latency)
+    player = TrafficPlayer(db)
+    # 最初の行は起動前に書き込んでおき、起動時の取得で表示させる
+    player.apply(events[0])
+    clock = VirtualClock(datetime.fromtimestamp(events[0]['t']), speed)
+    stats = ReplayStats(clock)
+    stats.written(events[0])
+
+    cpu_start = cpu_seconds()
+    real_start = time.monotonic()
+    display = ReplayDisplay(LocalSource(db=db), clock, stats, data_mode)
+    display.dispatcher.register('quit', lambda _: display.root.quit())
+    threading.Thread(
+        target=feed,
+        args=(events[1:], player, stats, clock, tail_seconds, lambda: display.dispatcher.submit('quit', None)),
+        daemon=True,
+    ).start()
+    display.run()
+
+    cpu = cpu_seconds() - cpu_start
+    real = time.monotonic() - real_start
+    trace_seconds = real * speed
+    latency_report, render_report = stats.report()
+    return {
+        'events': len(events),
+        'speed': speed,
+        'data_mode': data_mode,
+        'trace_start': datetime.fromtimestamp(events[0]['t']).isoformat(),
+        'trace_seconds': round(trace_seconds, 1),
+        'real_seconds': round(real, 3),
+        'update_latency': latency_report,
+        'renders': render_report,
+        'fetches': counter_total(display.metrics, 'signage_fetch_total'),
+        'firestore_reads': counter_total(display.metrics, 'signage_firestore_reads_total'),
+        'firestore_writes': player.writes,
+        'cpu': {
+            'seconds': round(cpu, 3),
+            'seconds_per_trace_hour': round(cpu / trace_seconds * 3600, 3) if trace_seconds else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='記録したトラフィックの再生')
+    parser.add_argument('trace', help='traffic_trace.pyで記録したファイル')
+    parser.add_argument('--speed', type=float, default=10, help=f'再生速度（1〜{MAX_SPEED}倍）')
+    parser.add_argument('--mode', choices=('poll', 'query', 'listen'), default='poll', help='データ取得モード')
+    parser.add_argument('--latency-ms', type=float, default=0, help='取得元の呼び出しごとの遅延')
+    parser.add_argument('--tail', type=float, default=DEFAULT_TAIL_SECONDS, help='最後の行の後に再生を続ける秒数（記録の時間）')
+    parser.add_argument('--output', help='結果のJSONを書き込むファイル（省略時は標準出力）')
+    args = parser.parse_args()
+    if not 1 <= args.speed <= MAX_SPEED:
+        parser.error(f"--speedは1〜{MAX_SPEED}で指定してください")
+
+    setup_logging(level=logging.WARNING, path='replay.log')
+    events = load_trace(args.trace)
+    if not events:
+        print("記録が空です", file=sys.stderr)
+        return 1
+
+    report = dict({'trace': args.trace}, **replay(events, args.speed, args.mode, args.latency_ms / 1000, args.tail))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
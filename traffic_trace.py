@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""サイネージが受け取った待ち人数・予約数の変化の記録
+
+動作中のサイネージで記録を開始・終了する:
+    ./system_control.sh record-start
+    ./system_control.sh record-stop
+
+traces/trace-YYYYmmdd-HHMMSS.jsonl に、取得・通知で表示内容のもとになるデータが
+変わるたびに1行ずつ追記する（変わらない定期取得は記録しない）。
+    {"t": 1792290000.0, "date": "2026-10-18", "now_population": 4, "slots": [["10:00", 2], ["11:30", 1]]}
+
+slotsはその時点で保持している本日の時間帯ごとの予約数。記録はtraffic_replay.pyで再生できる。
+"""
+
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+TRACE_DIR = 'traces'
+
+
+class TrafficRecorder:
+    """変化があった時だけ1行ずつ書き込む"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.last = None
+        self.count = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+        logger.info(f"トラフィックの記録を開始: {path}")
+
+    def record(self, t, now_population, date, slots):
+        """前回と内容が違う場合に記録（記録した場合True）"""
+        slots = [[time_slot, count] for time_slot, count in slots]
+        state = (now_population, date, slots)
+        with self.lock:
+            if self.file is None or state == self.last:
+                return False
+            self.last = state
+            event = {'t': round(t, 3), 'date': date, 'now_population': now_population, 'slots': slots}
+            self.file.write(json.dumps(event, ensure_ascii=False) + '\n')
+            self.file.flush()
+            self.count += 1
+        return True
+
+    def close(self):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.close()
+            self.file = None
+        logger.info(f"トラフィックの記録を終了: {self.path} ({self.count}件)")
+
+
+def load_trace(path):
+    """記録を時刻順に読み込み（壊れた行は読み飛ばす）"""
+    events = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                event = json.loads(line)
+                events.append({
+                    't': float(event['t']),
+                    'date': event['date'],
+                    'now_population': event['now_population'],
+                    'slots': [(time_slot, count) for time_slot, count in event['slots']],
+                })
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"記録の{number}行目を読み飛ばします: {e}")
+    events.sort(key=lambda event: event['t'])
+    return events
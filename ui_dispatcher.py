@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# メインスレッドで保留中の更新を確認する間隔（ミリ秒）
+DRAIN_INTERVAL_MS = 100
+# 遅延の統計に使う直近のサンプル数
+LATENCY_SAMPLES = 200
+
+
+class UiDispatcher:
+    """ワーカースレッドからの表示更新をメインスレッドでまとめて反映する
+
+    ワーカースレッドはTkに触れずsubmit()で状態のスナップショットを渡すだけにする。
+    同じキーの更新が複数たまった場合は最新のものだけを1回の描画で反映する。
+    """
+
+    def __init__(self, root, interval_ms=DRAIN_INTERVAL_MS):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.lock = threading.Lock()
+        self.handlers = {}  # キー -> メインスレッドで呼ぶ関数（登録順に反映）
+        self.pending = {}   # キー -> (スナップショット, 最初の投入時刻)
+        self.running = False
+
+        # 計測用
+        self.submitted = 0
+        self.coalesced = 0
+        self.dispatched = 0
+        self.render_passes = 0
+        self.max_depth = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def register(self, key, handler):
+        """キーごとの反映処理を登録"""
+        self.handlers[key] = handler
+
+    def submit(self, key, snapshot=None):
+        """更新を依頼（どのスレッドからでも呼べる）"""
+        now = time.monotonic()
+        with self.lock:
+            self.submitted += 1
+            if key in self.pending:
+                # 未反映の更新は最新の内容で上書きし、遅延は最初の投入から測る
+                self.coalesced += 1
+                now = self.pending[key][1]
+            self.pending[key] = (snapshot, now)
+            self.max_depth = max(self.max_depth, len(self.pending))
+
+    def start(self):
+        """メインスレッドでの定期反映を開始"""
+        if not self.running:
+            self.running = True
+            self.root.after(self.interval_ms, self.drain)
+
+    def stop(self):
+        self.running = False
+
+    def drain(self):
+        """保留中の更新をまとめて反映（メインスレッド専用）"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+
+        if pending:
+            self.render_passes += 1
+            for key, handler in self.handlers.items():
+                if key not in pending:
+                    continue
+                snapshot, submitted_at = pending[key]
+                try:
+                    handler(snapshot)
+                except Exception as e:
+                    logger.error(f"表示更新エラー ({key}): {e}")
+                self.dispatched += 1
+                self.latencies.append(time.monotonic() - submitted_at)
+
+        if self.running:
+            self.root.after(self.interval_ms, self.drain)
+
+    def stats(self):
+        """キューの深さと反映までの遅延の統計"""
+        with self.lock:
+            depth = len(self.pending)
+        latencies = list(self.latencies)
+        return {
+            'depth': depth,
+            'max_depth': self.max_depth,
+            'submitted': self.submitted,
+            'coalesced': self.coalesced,
+            'dispatched': self.dispatched,
+            'render_passes': self.render_passes,
+            'latency_avg_ms': (sum(latencies) / len(latencies) * 1000) if latencies else 0.0,
+            'latency_max_ms': max(latencies) * 1000 if latencies else 0.0,
+        }